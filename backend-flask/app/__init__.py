@@ -1,17 +1,18 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from datetime import datetime
 
 from app.config.config import get_config
 from app.middlewares.error_middleware import handle_error, APIError
+from app.middlewares.rate_limit_middleware import limiter
 from app.routes.auth_routes import auth_bp
 from app.routes.other_routes import (
     admin_bp, patient_bp, doctor_bp, ambulance_bp,
     appointment_bp, prescription_bp, test_bp, reminder_bp, user_bp
 )
 from app.services.ai_service import ai_service
+from app.services.password_hasher import password_hasher
+from app.services.maintenance_service import maintenance_service
 import os
 
 config = get_config()
@@ -37,13 +38,8 @@ def create_app(config_class=None):
     else:
         CORS(app, resources={r"/api/*": {"origins": origins}}, supports_credentials=True)
     
-    # Rate limiting
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=["200 per day", "50 per hour"],
-        storage_uri=config.RATELIMIT_STORAGE_URL
-    )
+    # Rate limiting (counters shared by all workers on the node, see RATELIMIT_STORAGE_URL)
+    limiter.init_app(app)
     
     # Error handlers
     app.register_error_handler(APIError, handle_error)
@@ -78,6 +74,13 @@ def create_app(config_class=None):
             'message': f'Route {error.description} not found'
         }), 404
 
+    # Pick the bcrypt cost for this machine once, before the first login
+    password_hasher.calibrate()
+    
+    # Embedded maintenance sweeper (off by default; see scripts/cleanup_tokens.py)
+    if config.MAINTENANCE_INTERVAL > 0 and not app.config.get('TESTING'):
+        maintenance_service.start(config.MAINTENANCE_INTERVAL)
+    
     # Optionally start model training or ensure model is loaded
     try:
         auto_train = os.environ.get('AUTO_TRAIN_MODEL', 'false').lower() in ('1', 'true', 'yes')
@@ -1,11 +1,34 @@
 import os
-from datetime import timedelta
+import tempfile
+from datetime import datetime, timedelta
 
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET', 'jwt-secret-key-change-in-production')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
+    # Access tokens carry the claims auth_required needs and are checked without the
+    # database; refresh tokens are exchanged at /api/auth/refresh for new ones
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 7)))
+    # Per-worker cache of verified token claims (entries expire with the token)
+    JWT_VERIFY_CACHE_SIZE = int(os.environ.get('JWT_VERIFY_CACHE_SIZE', 10000))
+    # How often each worker re-reads the shared revocation list (seconds)
+    REVOCATION_SYNC_INTERVAL = float(os.environ.get('REVOCATION_SYNC_INTERVAL', 1.0))
+
+    # Node-local state shared by all workers on a host (SQLite files). Must be private
+    # to the app's user (created 0700; a directory owned by anyone else is refused)
+    RUNTIME_DIR = os.environ.get('RUNTIME_DIR') or (
+        os.path.join(os.environ['XDG_RUNTIME_DIR'], 'healhub') if os.environ.get('XDG_RUNTIME_DIR')
+        else os.path.join(tempfile.gettempdir(), f"healhub-{os.getuid() if hasattr(os, 'getuid') else 'app'}")
+    )
+    # Tokens without a 'typ' claim predate the access/refresh split and lived 7 days.
+    # None are issued any more, so every one has expired 7 days after the deploy; by
+    # default they are honoured until 7 days after this process started. Set
+    # LEGACY_TOKEN_CUTOFF (UTC date/time) to reject them sooner
+    LEGACY_TOKEN_LIFETIME = timedelta(days=7)
+    LEGACY_TOKEN_CUTOFF = os.environ.get('LEGACY_TOKEN_CUTOFF') or (
+        datetime.utcnow() + LEGACY_TOKEN_LIFETIME
+    ).isoformat(timespec='seconds')
     
     # CORS: allow comma-separated list via FRONTEND_URL or FRONTEND_URLS, default to dev ports
     _frontends = os.environ.get('FRONTEND_URLS') or os.environ.get('FRONTEND_URL') or 'http://localhost:5173'
@@ -20,6 +43,13 @@ class Config:
     SUPABASE_ANON_KEY = os.environ.get('SUPABASE_ANON_KEY')
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
     SUPABASE_PROFILE_BUCKET = os.environ.get('SUPABASE_PROFILE_BUCKET', 'profile-images')
+    # HTTP pool per worker for the PostgREST/storage clients (HTTP/2 needs the h2 package)
+    SUPABASE_HTTP_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_HTTP_MAX_CONNECTIONS', 20))
+    SUPABASE_HTTP_MAX_KEEPALIVE = int(os.environ.get('SUPABASE_HTTP_MAX_KEEPALIVE', 10))
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_HTTP_KEEPALIVE_EXPIRY', 60))
+    SUPABASE_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_CONNECT_TIMEOUT', 5))
+    SUPABASE_HTTP_READ_TIMEOUT = float(os.environ.get('SUPABASE_HTTP_READ_TIMEOUT', 30))
+    SUPABASE_HTTP2 = os.environ.get('SUPABASE_HTTP2', 'true').lower() in ('1', 'true', 'yes')
     
     # Email
     EMAIL_HOST = os.environ.get('EMAIL_HOST')
@@ -31,11 +61,75 @@ class Config:
     APP_NAME = os.environ.get('APP_NAME', 'HealHub')
     APP_URL = os.environ.get('APP_URL', 'http://localhost:3000')
 
+    # One-time reset/change codes: 'local' keeps them in a SQLite file shared by the
+    # node's workers (database as fallback); use 'database' when running on several hosts
+    CODE_STORE = os.environ.get('CODE_STORE', 'local').lower()
+    CODE_MAX_ATTEMPTS = int(os.environ.get('CODE_MAX_ATTEMPTS', 5))
+
+    # Maintenance sweep of expired/used tokens: MAINTENANCE_INTERVAL > 0 runs it inside
+    # the app every N seconds (one worker per node); otherwise schedule
+    # scripts/cleanup_tokens.py. Deletes go in paced batches.
+    MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL', 0))
+    MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE', 500))
+    MAINTENANCE_BATCH_PAUSE = float(os.environ.get('MAINTENANCE_BATCH_PAUSE', 0.5))
+
+    # Per-worker cache of the user fields auth_required checks (role, is_active, nonce)
+    AUTH_USER_CACHE_TTL = float(os.environ.get('AUTH_USER_CACHE_TTL', 30))
+    AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+    # Seconds a worker caches departments and other reference data
+    REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', 300))
+    # Seconds a worker caches admin dashboard role counts (its own writes adjust them)
+    ROLE_COUNTS_TTL = float(os.environ.get('ROLE_COUNTS_TTL', 60))
+    # Per-worker index of free slots per doctor-day (its own bookings update it)
+    SLOT_INDEX_TTL = float(os.environ.get('SLOT_INDEX_TTL', 10))
+    SLOT_CHANGE_SYNC_INTERVAL = float(os.environ.get('SLOT_CHANGE_SYNC_INTERVAL', 1.0))
+    SLOT_INDEX_SIZE = int(os.environ.get('SLOT_INDEX_SIZE', 20000))
+
+    # Password hashing: bcrypt cost is calibrated per process to BCRYPT_TARGET_MS
+    # (never below 10 rounds) unless BCRYPT_ROUNDS pins it
+    BCRYPT_ROUNDS = int(os.environ['BCRYPT_ROUNDS']) if os.environ.get('BCRYPT_ROUNDS') else None
+    BCRYPT_TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+    BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 4))
+    BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', 64))
+
     # Validation
     MIN_USER_AGE = int(os.environ.get('MIN_USER_AGE', 13))
     
-    # Rate limiting
-    RATELIMIT_STORAGE_URL = 'memory://'
+    # AI similar-case index storage: float32 searches fastest (BLAS), float16 halves
+    # memory/disk at the cost of widening each block during search
+    SIMILARITY_INDEX_DTYPE = os.environ.get('SIMILARITY_INDEX_DTYPE', 'float32')
+    # Unconfirmed detections indexed per model version; later ones are not indexed
+    # (confirmed feedback cases are always added)
+    SIMILARITY_MAX_UNCONFIRMED = int(os.environ.get('SIMILARITY_MAX_UNCONFIRMED', 100000))
+
+    # AI near-duplicate cache: perceptual-hash Hamming distance (of 64 bits) under which
+    # a re-uploaded image reuses the earlier detection; a sample of hits is re-verified
+    AI_DEDUP_ENABLED = os.environ.get('AI_DEDUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AI_DEDUP_MAX_DISTANCE = int(os.environ.get('AI_DEDUP_MAX_DISTANCE', 6))
+    AI_DEDUP_CAPACITY = int(os.environ.get('AI_DEDUP_CAPACITY', 4096))
+    AI_DEDUP_SAMPLE_RATE = float(os.environ.get('AI_DEDUP_SAMPLE_RATE', 0.02))
+
+    # AI shadow evaluation: fraction of detections also run on a loaded candidate model
+    AI_SHADOW_SAMPLE_RATE = float(os.environ.get('AI_SHADOW_SAMPLE_RATE', 0.1))
+    AI_SHADOW_MAX_PENDING = int(os.environ.get('AI_SHADOW_MAX_PENDING', 32))
+
+    # Compute budgets: units each user may spend per window on expensive routes
+    # (inference, retraining), by role. Routes declare their cost with compute_cost.
+    COMPUTE_BUDGETS = {
+        role.strip(): int(units)
+        for role, units in (
+            pair.split('=') for pair in os.environ.get(
+                'COMPUTE_BUDGETS', 'patient=200,doctor=600,ambulance_staff=200,admin=2000'
+            ).split(',') if '=' in pair
+        )
+    }
+    COMPUTE_BUDGET_WINDOW = os.environ.get('COMPUTE_BUDGET_WINDOW', '1 hour')
+
+    # Rate limiting: the default SQLite file is shared by all workers on the node;
+    # use redis://... for limits across hosts, memory:// for per-process counters
+    RATELIMIT_STORAGE_URL = os.environ.get(
+        'RATELIMIT_STORAGE_URL', f"sqlite://{os.path.join(RUNTIME_DIR, 'ratelimit.sqlite3')}"
+    )
 
 
 class DevelopmentConfig(Config):
@@ -1,7 +1,17 @@
 from flask import request, jsonify
 from app.services.supabase_service import supabase_service
+from app.services.async_supabase_service import async_supabase_service
 from app.services.auth_service import auth_service
 from app.services.email_service import email_service
+from app.services.password_hasher import password_hasher
+from app.services.maintenance_service import maintenance_service
+from app.utils.pagination import InvalidCursor, page_size
+
+# Upper bound on user ids per bulk delete request
+BULK_DELETE_MAX = 500
+# Admin user listing page sizes (?limit=)
+USERS_PAGE_DEFAULT = 50
+USERS_PAGE_MAX = 200
 
 class AdminController:
     """Admin endpoints for user management"""
@@ -9,9 +19,16 @@ class AdminController:
     @staticmethod
     def list_users():
         role = request.args.get('role')
+        limit = page_size(request.args.get('limit'), default=USERS_PAGE_DEFAULT, maximum=USERS_PAGE_MAX)
         try:
-            users = supabase_service.list_users(role=role)
-            return jsonify({'status': 'success', 'data': users}), 200
+            users, next_cursor = supabase_service.list_users_page(role=role, limit=limit, cursor=request.args.get('cursor'))
+            return jsonify({
+                'status': 'success',
+                'data': users,
+                'pagination': {'limit': limit, 'nextCursor': next_cursor, 'hasMore': next_cursor is not None},
+            }), 200
+        except InvalidCursor as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
@@ -19,62 +36,26 @@ class AdminController:
     def list_departments():
         try:
             depts = supabase_service.list_departments()
-            normalized = []
-            for d in (depts or []):
-                if not isinstance(d, dict):
-                    continue
-                dept_id = d.get('id') or d.get('department_id')
-                dept_name = d.get('name') or d.get('department_name') or d.get('department')
-                normalized.append({
-                    **d,
-                    'id': dept_id,
-                    'name': dept_name,
-                })
-            return jsonify({'status': 'success', 'data': normalized}), 200
+            return jsonify({'status': 'success', 'data': depts}), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    @staticmethod
+    def refresh_departments():
+        try:
+            supabase_service.invalidate_reference_data()
+            depts = supabase_service.list_departments()
+            return jsonify({'status': 'success', 'data': depts}), 200
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
     @staticmethod
     def get_user(user_id):
         try:
-            user = supabase_service.find_user_by_id(user_id)
+            user = supabase_service.get_user_profile(user_id)
             if not user:
                 return jsonify({'status': 'error', 'message': 'User not found'}), 404
-
-            role = user.get('role')
-            # UI compatibility
-            if role == 'ambulance':
-                user['role'] = 'ambulance_staff'
-
-            profile = {}
-            if role == 'doctor':
-                doctor = supabase_service.get_doctor_by_user_id(user_id)
-                if doctor:
-                    days = supabase_service.get_doctor_available_days(doctor.get('id'))
-                    profile['doctor'] = {
-                        'departmentId': doctor.get('department_id'),
-                        'specialization': doctor.get('specialization'),
-                        'hospitalName': doctor.get('hospital_name'),
-                        'licenseNumber': doctor.get('license_number'),
-                        'availableFrom': doctor.get('available_from'),
-                        'availableTo': doctor.get('available_to'),
-                        'availableDays': days,
-                    }
-
-            if role in ['ambulance', 'ambulance_staff']:
-                staff = supabase_service.get_ambulance_staff_by_user_id(user_id)
-                if staff:
-                    days = supabase_service.get_ambulance_staff_available_days(staff.get('id'))
-                    profile['ambulance'] = {
-                        'staffType': staff.get('staff_type'),
-                        'vehicleRegistration': staff.get('vehicle_registration_number'),
-                        'assignedCity': staff.get('assigned_city'),
-                        'assignedState': staff.get('assigned_state'),
-                        'shiftType': staff.get('shift_type'),
-                        'availableDays': days,
-                    }
-
-            return jsonify({'status': 'success', 'data': {**user, **profile}}), 200
+            return jsonify({'status': 'success', 'data': user}), 200
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
@@ -141,7 +122,7 @@ class AdminController:
             role_in = data.get('role') or data.get('role_key') or data.get('role_key'.replace('_', ''))
             role_in = role_in or data.get('role')
             if not role_in:
-                existing = supabase_service.find_user_by_id(user_id)
+                existing = supabase_service.find_user_by_id(user_id, projection='auth')
                 role_in = (existing or {}).get('role')
 
             role_db = 'ambulance' if role_in == 'ambulance_staff' else role_in
@@ -159,7 +140,7 @@ class AdminController:
             if role_db:
                 updates['role'] = role_db
 
-            user = supabase_service.update_user(user_id, updates) if updates else supabase_service.find_user_by_id(user_id)
+            user = supabase_service.update_user(user_id, updates) if updates else supabase_service.find_user_by_id(user_id, projection='profile')
 
             # Role-specific profile updates (partial merge)
             if role_db == 'doctor' and isinstance(data.get('doctor'), dict):
@@ -176,13 +157,29 @@ class AdminController:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
     @staticmethod
-    def delete_user(user_id):
+    async def delete_user(user_id):
         try:
-            supabase_service.delete_user_cascade(user_id)
+            await async_supabase_service.delete_user_cascade(user_id)
             return jsonify({'status': 'success', 'message': 'User deleted'}), 200
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
+    @staticmethod
+    async def bulk_delete_users():
+        try:
+            data = request.get_json() or {}
+            user_ids = data.get('userIds') or data.get('user_ids')
+            if not isinstance(user_ids, list) or not user_ids or not all(isinstance(u, str) and u for u in user_ids):
+                return jsonify({'status': 'error', 'message': 'userIds must be a non-empty list of ids'}), 400
+            if len(user_ids) > BULK_DELETE_MAX:
+                return jsonify({'status': 'error', 'message': f'At most {BULK_DELETE_MAX} users can be deleted per request'}), 400
+            if request.user['id'] in user_ids:
+                return jsonify({'status': 'error', 'message': 'You cannot delete your own account'}), 400
+            deleted = await async_supabase_service.delete_users_cascade(user_ids)
+            return jsonify({'status': 'success', 'message': 'Users deleted', 'data': {'deleted': deleted}}), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
     @staticmethod
     def user_counts():
         try:
@@ -191,4 +188,19 @@ class AdminController:
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)}), 400
 
+    @staticmethod
+    def metrics():
+        try:
+            return jsonify({'status': 'success', 'data': {
+                'auth_user_cache': supabase_service.auth_cache_stats(),
+                'reference_cache': supabase_service.reference_cache_stats(),
+                'slot_index': supabase_service.slot_index_stats(),
+                'supabase_http': {**supabase_service.http_pool_stats(), 'async': async_supabase_service.http_stats()},
+                'token_verify_cache': auth_service.token_cache_stats(),
+                'password_hasher': password_hasher.stats(),
+                'maintenance': maintenance_service.last_report,
+            }}), 200
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
 admin_controller = AdminController()
@@ -2,6 +2,8 @@ from flask import request, jsonify
 from app.services.auth_service import auth_service
 from app.services.email_service import email_service
 from app.services.supabase_service import supabase_service
+from app.services.async_supabase_service import async_supabase_service
+from app.services.password_hasher import HasherBusy
 
 class AuthController:
     """Controller for authentication endpoints"""
@@ -103,10 +105,18 @@ class AuthController:
                 'data': {
                     'user': result['user'],
                     'token': result['token'],
+                    'refreshToken': result['refresh_token'],
+                    'expiresIn': result['expires_in'],
                     'dashboard': dashboard_info
                 }
             }), 200
         
+        except HasherBusy as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 503
+        
         except Exception as e:
             return jsonify({
                 'status': 'error',
@@ -238,11 +248,11 @@ class AuthController:
             }), 400
     
     @staticmethod
-    def get_profile():
+    async def get_profile():
         """Get user profile"""
         try:
             user_id = request.user['user_id']
-            user = supabase_service.find_user_by_id(user_id)
+            user = await async_supabase_service.get_user_profile(user_id, role_hint=request.user.get('role'))
             
             if not user:
                 return jsonify({
@@ -250,43 +260,6 @@ class AuthController:
                     'message': 'User not found'
                 }), 404
             
-            # Remove sensitive data
-            user.pop('password_hash', None)
-            user.pop('verification_code', None)
-
-            role = user.get('role')
-            # UI compatibility
-            if role == 'ambulance':
-                user['role'] = 'ambulance_staff'
-
-            # Include role-specific profile data
-            if role == 'doctor':
-                doctor = supabase_service.get_doctor_by_user_id(user_id)
-                if doctor:
-                    days = supabase_service.get_doctor_available_days(doctor.get('id'))
-                    user['doctor'] = {
-                        'departmentId': doctor.get('department_id'),
-                        'specialization': doctor.get('specialization'),
-                        'hospitalName': doctor.get('hospital_name'),
-                        'licenseNumber': doctor.get('license_number'),
-                        'availableFrom': doctor.get('available_from'),
-                        'availableTo': doctor.get('available_to'),
-                        'availableDays': days,
-                    }
-
-            if role in ['ambulance', 'ambulance_staff']:
-                staff = supabase_service.get_ambulance_staff_by_user_id(user_id)
-                if staff:
-                    days = supabase_service.get_ambulance_staff_available_days(staff.get('id'))
-                    user['ambulance'] = {
-                        'staffType': staff.get('staff_type'),
-                        'vehicleRegistration': staff.get('vehicle_registration_number'),
-                        'assignedCity': staff.get('assigned_city'),
-                        'assignedState': staff.get('assigned_state'),
-                        'shiftType': staff.get('shift_type'),
-                        'availableDays': days,
-                    }
-            
             return jsonify({
                 'status': 'success',
                 'data': user
@@ -370,7 +343,7 @@ class AuthController:
 
             result = auth_service.request_email_change(user_id, new_email)
 
-            user = supabase_service.find_user_by_id(user_id)
+            user = supabase_service.find_user_by_id(user_id, projection='auth')
             if user:
                 try:
                     email_service.send_email_change_code(new_email, result['code'], user.get('first_name', 'User'))
@@ -419,7 +392,7 @@ class AuthController:
                 return jsonify({'status': 'error', 'message': 'New phone is required'}), 400
 
             result = auth_service.request_phone_change(user_id, new_phone)
-            user = supabase_service.find_user_by_id(user_id)
+            user = supabase_service.find_user_by_id(user_id, projection='auth')
             if user and user.get('email'):
                 try:
                     email_service.send_phone_change_code(user['email'], result['code'], new_phone, user.get('first_name', 'User'))
@@ -520,9 +493,40 @@ class AuthController:
                 'message': str(e)
             }), 400
     
+    @staticmethod
+    def refresh():
+        """Exchange a refresh token for a new access token (and a replacement refresh token)"""
+        try:
+            data = request.get_json(silent=True) or {}
+            refresh_token = data.get('refreshToken')
+            if not refresh_token:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'refreshToken is required'
+                }), 400
+            
+            result = auth_service.refresh(refresh_token)
+            
+            return jsonify({
+                'status': 'success',
+                'data': {
+                    'token': result['token'],
+                    'refreshToken': result['refresh_token'],
+                    'expiresIn': result['expires_in']
+                }
+            }), 200
+        
+        except Exception as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 401
+    
     @staticmethod
     def logout():
         """Logout user"""
+        data = request.get_json(silent=True) or {}
+        auth_service.logout(data.get('refreshToken'))
         return jsonify({
             'status': 'success',
             'message': 'Logged out successfully'
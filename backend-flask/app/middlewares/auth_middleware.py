@@ -1,7 +1,8 @@
 from functools import wraps
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from app.services.auth_service import auth_service
 from app.services.supabase_service import supabase_service
+from app.services.revocation_service import revocation_list
 
 def auth_required(f):
     """Middleware to protect routes with JWT authentication"""
@@ -21,21 +22,38 @@ def auth_required(f):
             # Verify token
             decoded = auth_service.verify_token(token)
             
-            # Get fresh user data from database
-            user = supabase_service.find_user_by_id(decoded['user_id'])
-            if not user:
+            token_type = decoded.get('typ')
+            if token_type == 'access':
+                # Claims are authoritative for the token's short lifetime unless the
+                # user's sessions were revoked after it was issued
+                if revocation_list.is_user_revoked(decoded['user_id'], decoded.get('iat', 0)):
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Session has been invalidated. Please login again.'
+                    }), 401
+                user = {**decoded, 'id': decoded['user_id']}
+            elif token_type is None and auth_service.legacy_tokens_accepted():
+                # Legacy tokens (issued before access/refresh split): check the user row
+                user = supabase_service.get_auth_user(decoded['user_id'])
+                if not user:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'User no longer exists'
+                    }), 401
+                
+                # Check session nonce to validate token hasn't been invalidated by logout-all
+                token_nonce = decoded.get('session_nonce', 0)
+                user_nonce = user.get('session_nonce', 0)
+                if token_nonce != user_nonce:
+                    return jsonify({
+                        'status': 'error',
+                        'message': 'Session has been invalidated. Please login again.'
+                    }), 401
+            else:
+                # Refresh tokens are only accepted by /api/auth/refresh; legacy ones not after the cutoff
                 return jsonify({
                     'status': 'error',
-                    'message': 'User no longer exists'
-                }), 401
-            
-            # Check session nonce to validate token hasn't been invalidated by logout-all
-            token_nonce = decoded.get('session_nonce', 0)
-            user_nonce = user.get('session_nonce', 0)
-            if token_nonce != user_nonce:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Session has been invalidated. Please login again.'
+                    'message': 'Not authorized, invalid token'
                 }), 401
             
             if not user.get('is_active'):
@@ -57,7 +75,7 @@ def auth_required(f):
                 'full_name': f"{user.get('first_name')} {user.get('last_name')}"
             }
             
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         except Exception as e:
             return jsonify({
                 'status': 'error',
@@ -76,7 +94,7 @@ def admin_required(f):
                 'status': 'error',
                 'message': 'Access denied. Admin only area'
             }), 403
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -90,7 +108,7 @@ def patient_required(f):
                 'status': 'error',
                 'message': 'Access denied. Patient only area'
             }), 403
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -104,7 +122,7 @@ def doctor_required(f):
                 'status': 'error',
                 'message': 'Access denied. Doctor only area'
             }), 403
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -119,7 +137,7 @@ def ambulance_staff_required(f):
                 'status': 'error',
                 'message': 'Access denied. Ambulance staff only area'
             }), 403
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -134,6 +152,6 @@ def roles_required(*roles):
                     'status': 'error',
                     'message': f'Access denied. Required roles: {", ".join(roles)}'
                 }), 403
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return decorated_function
     return decorator
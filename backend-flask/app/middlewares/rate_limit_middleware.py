@@ -0,0 +1,95 @@
+import time
+from functools import wraps
+from flask import current_app, request, jsonify, make_response, g
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from app.config.config import get_config
+# Importing the storage registers the sqlite:// scheme with limits
+from app.utils.rate_limit_storage import SQLiteStorage  # noqa: F401
+
+config = get_config()
+
+# Shared limiter; create_app binds it with init_app so routes can also declare limits
+limiter = Limiter(
+    key_func=get_remote_address,
+    default_limits=["200 per day", "50 per hour"],
+    storage_uri=config.RATELIMIT_STORAGE_URL
+)
+
+
+def compute_budget(role):
+    """Compute units a user of ``role`` may spend per COMPUTE_BUDGET_WINDOW."""
+    budgets = config.COMPUTE_BUDGETS
+    if role == 'ambulance':
+        role = 'ambulance_staff'
+    return budgets.get(role, budgets.get('patient', 100))
+
+
+def rejected_input(message, status=400):
+    """Error response for input rejected before any expensive work ran.
+
+    compute_cost refunds the units charged for these; other errors keep the charge.
+    """
+    g.compute_refund = True
+    return jsonify({'status': 'error', 'message': message}), status
+
+
+def _refund(key, expiry, units):
+    """Give back ``units`` in the current window without taking the counter below zero.
+
+    If the window rolled over while the request ran there is nothing to refund.
+    """
+    storage = limiter.storage
+    if hasattr(storage, 'refund'):
+        storage.refund(key, units)
+        return
+    spent = storage.get(key)
+    if spent > 0:
+        storage.incr(key, expiry, amount=-min(units, spent))
+
+
+def compute_cost(cost):
+    """Middleware to charge an expensive route against the user's compute budget.
+
+    ``cost`` is an int, or a dict of role -> cost (with an optional 'default').
+    Budgets are per user and per role (COMPUTE_BUDGETS) and live in the limiter's
+    storage, so they are shared across workers. Must be placed after auth_required.
+    Input rejected with rejected_input is refunded. Responses carry X-Compute-Budget-Limit,
+    -Remaining and -Reset headers.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user = getattr(request, 'user', None) or {}
+            role = user.get('role')
+            units = cost.get(role, cost.get('default', 1)) if isinstance(cost, dict) else cost
+            budget = compute_budget(role)
+            item = parse(f"{budget}/{config.COMPUTE_BUDGET_WINDOW}")
+            identity = ('compute', str(user.get('user_id') or get_remote_address()))
+            strategy = FixedWindowRateLimiter(limiter.storage)
+
+            if units > 0 and (not strategy.test(item, *identity, cost=units) or not strategy.hit(item, *identity, cost=units)):
+                stats = strategy.get_window_stats(item, *identity)
+                retry_after = max(1, int(stats.reset_time - time.time()))
+                response = make_response(jsonify({
+                    'status': 'error',
+                    'message': f'Compute budget exhausted for this period. Try again in {retry_after} seconds.'
+                }), 429)
+                response.headers['Retry-After'] = str(retry_after)
+            else:
+                g.pop('compute_refund', None)
+                response = make_response(current_app.ensure_sync(f)(*args, **kwargs))
+                if units > 0 and g.pop('compute_refund', False):
+                    # Rejected input did no expensive work; give the units back
+                    _refund(item.key_for(*identity), item.get_expiry(), units)
+                stats = strategy.get_window_stats(item, *identity)
+
+            response.headers['X-Compute-Budget-Limit'] = str(budget)
+            response.headers['X-Compute-Budget-Remaining'] = str(max(0, stats.remaining))
+            response.headers['X-Compute-Budget-Reset'] = str(int(stats.reset_time))
+            response.headers['X-Compute-Cost'] = str(units)
+            return response
+        return decorated_function
+    return decorator
@@ -1,4 +1,4 @@
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from functools import wraps
 from email_validator import validate_email, EmailNotValidError
 import re
@@ -12,7 +12,7 @@ def validate_request_json(f):
                 'status': 'error',
                 'message': 'Request must be JSON'
             }), 400
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     return decorated_function
 
 
@@ -73,7 +73,7 @@ def validate_register(f):
                 'errors': errors
             }), 400
         
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -103,7 +103,7 @@ def validate_login(f):
                 'errors': errors
             }), 400
         
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -133,7 +133,7 @@ def validate_email_verification(f):
                 'errors': errors
             }), 400
         
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -157,7 +157,7 @@ def validate_forgot_password(f):
                 'errors': ['Email is required']
             }), 400
         
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -197,7 +197,7 @@ def validate_reset_password(f):
                 'errors': errors
             }), 400
         
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     
     return decorated_function
 
@@ -223,7 +223,7 @@ def validate_change_email_request(f):
         if errors:
             return jsonify({'status': 'error', 'message': 'Validation failed', 'errors': errors}), 400
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
     return decorated_function
 
@@ -252,7 +252,7 @@ def validate_change_email_verify(f):
         if errors:
             return jsonify({'status': 'error', 'message': 'Validation failed', 'errors': errors}), 400
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
     return decorated_function
 
@@ -275,7 +275,7 @@ def validate_change_phone_request(f):
         if errors:
             return jsonify({'status': 'error', 'message': 'Validation failed', 'errors': errors}), 400
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
     return decorated_function
 
@@ -301,6 +301,6 @@ def validate_change_phone_verify(f):
         if errors:
             return jsonify({'status': 'error', 'message': 'Validation failed', 'errors': errors}), 400
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
     return decorated_function
@@ -52,11 +52,16 @@ def reset_password():
     return auth_controller.reset_password()
 
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    return auth_controller.refresh()
+
+
 # Protected routes
 @auth_bp.route('/profile', methods=['GET'])
 @auth_required
-def get_profile():
-    return auth_controller.get_profile()
+async def get_profile():
+    return await auth_controller.get_profile()
 
 
 @auth_bp.route('/profile', methods=['PUT'])
@@ -5,9 +5,12 @@ from app.middlewares.auth_middleware import (
     patient_required,
     doctor_required,
     ambulance_staff_required,
+    roles_required,
 )
+from app.middlewares.rate_limit_middleware import compute_cost, rejected_input
 from app.controllers.admin_controller import admin_controller
-from app.services.supabase_service import supabase_service
+from app.services.supabase_service import supabase_service, MAX_CALENDAR_DAYS, MAX_CALENDAR_DOCTORS
+from app.services.async_supabase_service import async_supabase_service
 from app.services.ai_service import ai_service
 from app.services.ai_service import ai_service
 
@@ -26,17 +29,7 @@ user_bp = Blueprint('user', __name__, url_prefix='/api/user')
 def list_departments_for_users():
     try:
         depts = supabase_service.list_departments()
-        # normalize to {id,name} for UI
-        normalized = []
-        for d in (depts or []):
-            if not isinstance(d, dict):
-                continue
-            normalized.append({
-                **d,
-                'id': d.get('id') or d.get('department_id'),
-                'name': d.get('name') or d.get('department_name') or d.get('department'),
-            })
-        return jsonify({'status': 'success', 'data': normalized}), 200
+        return jsonify({'status': 'success', 'data': depts}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
@@ -57,6 +50,7 @@ def patient_dashboard():
 @patient_bp.route('/detect', methods=['POST'])
 @auth_required
 @patient_required
+@compute_cost(10)
 def detect_skin_issue():
     try:
         # Accept file upload
@@ -72,10 +66,17 @@ def detect_skin_issue():
                 img = base64.b64decode(img_b64)
 
         if not img:
-            return jsonify({'status': 'error', 'message': 'No image provided'}), 400
+            return rejected_input('No image provided')
 
         result = ai_service.detect(img)
 
+        # Grad-CAM overlay is computed in the background; fetch it via /detect/explanation/<id>
+        try:
+            if result.get('model_used'):
+                result['explanation_id'] = ai_service.request_explanation(img, result.get('label'), getattr(request, 'user', {}).get('id'))
+        except Exception:
+            pass
+
         # Find doctors that match the recommended specialization
         specialization = result.get('specialization')
         doctors = []
@@ -117,6 +118,12 @@ def ambulance_dashboard():
 def list_departments():
     return admin_controller.list_departments()
 
+@admin_bp.route('/departments/refresh', methods=['POST'])
+@auth_required
+@admin_required
+def refresh_departments():
+    return admin_controller.refresh_departments()
+
 @admin_bp.route('/users', methods=['GET'])
 @auth_required
 @admin_required
@@ -144,8 +151,58 @@ def update_user(user_id):
 @admin_bp.route('/users/<user_id>', methods=['DELETE'])
 @auth_required
 @admin_required
-def delete_user(user_id):
-    return admin_controller.delete_user(user_id)
+async def delete_user(user_id):
+    return await admin_controller.delete_user(user_id)
+
+@admin_bp.route('/users/bulk-delete', methods=['POST'])
+@auth_required
+@admin_required
+async def bulk_delete_users():
+    return await admin_controller.bulk_delete_users()
+
+# Shadow evaluation of a candidate AI model (admin)
+@admin_bp.route('/ai/shadow', methods=['GET'])
+@auth_required
+@admin_required
+def ai_shadow_status():
+    try:
+        return jsonify({'status': 'success', 'data': {
+            'live_version': ai_service.model_version(),
+            'candidate': ai_service.candidate_info(),
+            'stats': ai_service.shadow_stats.summary(),
+        }}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+@admin_bp.route('/ai/shadow', methods=['POST'])
+@auth_required
+@admin_required
+@compute_cost(50)
+def ai_shadow_load():
+    try:
+        import os
+        from app.services.ai_service import AI_DIR
+        payload = request.get_json() or {}
+        rel = payload.get('path')
+        if not rel:
+            return rejected_input('path is required')
+        path = os.path.realpath(os.path.join(AI_DIR, rel))
+        if not path.startswith(os.path.realpath(AI_DIR) + os.sep) or not os.path.isfile(path):
+            return rejected_input('Candidate model not found', 404)
+        info = ai_service.load_candidate(path)
+        return jsonify({'status': 'success', 'data': info}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+@admin_bp.route('/ai/shadow', methods=['DELETE'])
+@auth_required
+@admin_required
+def ai_shadow_unload():
+    ai_service.unload_candidate()
+    return jsonify({'status': 'success', 'message': 'Candidate unloaded'}), 200
+
 
 @admin_bp.route('/user-counts', methods=['GET'])
 @auth_required
@@ -153,6 +210,12 @@ def delete_user(user_id):
 def user_counts():
     return admin_controller.user_counts()
 
+@admin_bp.route('/metrics', methods=['GET'])
+@auth_required
+@admin_required
+def metrics():
+    return admin_controller.metrics()
+
 
 # Appointment booking (patient)
 @appointment_bp.route('/book', methods=['POST'])
@@ -211,12 +274,12 @@ def book_appointment():
 # Reminders: list and create for authenticated user
 @reminder_bp.route('/', methods=['GET'])
 @auth_required
-def list_reminders():
+async def list_reminders():
     try:
         user = getattr(request, 'user', None)
         if not user:
             return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
-        reminders = supabase_service.get_reminders_for_user(user.get('id'))
+        reminders = await async_supabase_service.get_reminders_for_user(user.get('id'))
         return jsonify({'status': 'success', 'data': reminders}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
@@ -240,14 +303,21 @@ def create_reminder():
 @patient_bp.route('/detect', methods=['POST'])
 @auth_required
 @patient_required
+@compute_cost(10)
 def detect_image():
     try:
         if 'image' not in request.files:
-            return jsonify({'status': 'error', 'message': 'No image provided'}), 400
+            return rejected_input('No image provided')
         f = request.files['image']
         data = f.read()
         detection = ai_service.detect(data)
 
+        try:
+            if detection.get('model_used'):
+                detection['explanation_id'] = ai_service.request_explanation(data, detection.get('label'), getattr(request, 'user', {}).get('id'))
+        except Exception:
+            pass
+
         # find doctors by specialization
         doctors = []
         try:
@@ -272,16 +342,50 @@ def ai_status():
             'ready': getattr(ai_service, '_ready', False),
             'has_model': ai_service.model is not None,
             'classes': ai_service.classes or [],
+            'near_duplicate_cache': ai_service.near_duplicates.stats() if ai_service.near_duplicates else None,
         }
+        ev = ai_service.last_evaluation
+        if ev:
+            st['last_evaluation'] = {k: ev.get(k) for k in ('model_version', 'accuracy', 'macro_f1', 'num_images', 'evaluated_at')}
         return jsonify({'status': 'success', 'data': st}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
 
+# Heatmap overlay for a detection: PNG when ready, 202 while it is still being computed
+@patient_bp.route('/detect/explanation/<explanation_id>', methods=['GET'])
+@auth_required
+def detect_explanation(explanation_id):
+    try:
+        import re
+        if not re.fullmatch(r'[0-9a-f]{64}', explanation_id or ''):
+            return jsonify({'status': 'error', 'message': 'Invalid explanation id'}), 400
+
+        # only the uploader (or an admin) may see a heatmap of their image
+        user = getattr(request, 'user', {}) or {}
+        if user.get('role') != 'admin' and not ai_service.explanation_visible_to(explanation_id, user.get('id')):
+            return jsonify({'status': 'error', 'message': 'Explanation not found'}), 404
+
+        exp = ai_service.get_explanation(explanation_id)
+        if exp['state'] == 'ready':
+            from flask import send_file
+            resp = send_file(exp['path'], mimetype='image/png', max_age=86400)
+            resp.headers['X-Model-Version'] = exp['model_version']
+            return resp
+        if exp['state'] == 'pending':
+            return jsonify({'status': 'pending', 'message': 'Explanation is still being computed'}), 202
+        if exp['state'] == 'failed':
+            return jsonify({'status': 'error', 'message': f"Explanation failed: {exp.get('error')}"}), 500
+        return jsonify({'status': 'error', 'message': 'Explanation not found'}), 404
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
 # Raw probabilities endpoint for debugging: returns classes and probabilities
 @patient_bp.route('/detect/raw', methods=['POST'])
 @auth_required
 @patient_required
+@compute_cost(10)
 def detect_raw():
     try:
         img = None
@@ -296,7 +400,7 @@ def detect_raw():
                 img = base64.b64decode(img_b64)
 
         if not img:
-            return jsonify({'status': 'error', 'message': 'No image provided'}), 400
+            return rejected_input('No image provided')
 
         classes, probs = ai_service.predict_proba(img)
         return jsonify({'status': 'success', 'data': {'classes': classes, 'probs': probs}}), 200
@@ -307,6 +411,7 @@ def detect_raw():
 @patient_bp.route('/detect/all', methods=['POST'])
 @auth_required
 @patient_required
+@compute_cost(40)
 def detect_all():
     try:
         img = None
@@ -321,7 +426,7 @@ def detect_all():
                 img = base64.b64decode(img_b64)
 
         if not img:
-            return jsonify({'status': 'error', 'message': 'No image provided'}), 400
+            return rejected_input('No image provided')
 
         res = ai_service.detect_all(img)
 
@@ -348,6 +453,7 @@ def detect_all():
 @patient_bp.route('/detect/feedback', methods=['POST'])
 @auth_required
 @patient_required
+@compute_cost(100)
 def detect_feedback():
     try:
         img = None
@@ -370,7 +476,7 @@ def detect_feedback():
             label = request.form.get('correctLabel')
 
         if not img or not label:
-            return jsonify({'status': 'error', 'message': 'image and correct_label required'}), 400
+            return rejected_input('image and correct_label required')
 
         # save image to dataset/train/<label>/ with unique name
         import os, uuid
@@ -405,6 +511,12 @@ def detect_feedback():
                 ai_service._load_model()
             except Exception:
                 pass
+
+            # index the confirmed image so it shows up in similar-case searches
+            try:
+                ai_service.record_feedback_case(img, label, fpath)
+            except Exception as e:
+                print('Similarity index update failed:', e)
         except Exception as e:
             return jsonify({'status': 'error', 'message': f'retraining failed: {str(e)}'}), 500
 
@@ -434,31 +546,117 @@ def detect_feedback():
 # Get available slots for a doctor on a date
 @appointment_bp.route('/slots', methods=['GET'])
 @auth_required
-def get_slots():
+async def get_slots():
     try:
         doctor_id = request.args.get('doctorId') or request.args.get('doctor_id')
         date = request.args.get('date')
         if not doctor_id or not date:
             return jsonify({'status': 'error', 'message': 'doctorId and date required'}), 400
-        slots = supabase_service.get_available_slots(doctor_id, date)
+        slots = await async_supabase_service.get_available_slots(doctor_id, date)
         return jsonify({'status': 'success', 'data': slots}), 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
 
+# Free slots for several doctors over a date range (week/month views)
+@appointment_bp.route('/calendar', methods=['GET'])
+@auth_required
+async def get_calendar():
+    try:
+        raw_ids = request.args.get('doctorIds') or request.args.get('doctor_ids') or ''
+        doctor_ids = list(dict.fromkeys(d.strip() for d in raw_ids.split(',') if d.strip()))
+        date_from = request.args.get('from')
+        date_to = request.args.get('to') or date_from
+        if not doctor_ids or not date_from:
+            return jsonify({'status': 'error', 'message': 'doctorIds and from required'}), 400
+        if len(doctor_ids) > MAX_CALENDAR_DOCTORS:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_CALENDAR_DOCTORS} doctors per request'}), 400
+        slots = await async_supabase_service.get_availability_calendar(doctor_ids, date_from, date_to)
+        return jsonify({'status': 'success', 'data': {'from': date_from, 'to': date_to, 'slots': slots}}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+# Earliest free slot of a doctor at or after a date/time (defaults to now), looking ahead `days` days
+@appointment_bp.route('/next-free', methods=['GET'])
+@auth_required
+async def get_next_free_slot():
+    try:
+        from datetime import datetime
+
+        doctor_id = request.args.get('doctorId') or request.args.get('doctor_id')
+        after = request.args.get('after') or datetime.now().replace(microsecond=0).isoformat()
+        if not doctor_id:
+            return jsonify({'status': 'error', 'message': 'doctorId required'}), 400
+        try:
+            days = int(request.args.get('days', 14))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'days must be an integer'}), 400
+        if not 1 <= days <= MAX_CALENDAR_DAYS:
+            return jsonify({'status': 'error', 'message': f'days must be between 1 and {MAX_CALENDAR_DAYS}'}), 400
+        slot = await async_supabase_service.find_next_free_slot(doctor_id, after, days)
+        return jsonify({'status': 'success', 'data': {'doctorId': doctor_id, 'slot': slot}}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
+# Similar previously confirmed cases for an uploaded image
+@doctor_bp.route('/similar-cases', methods=['POST'])
+@auth_required
+@roles_required('doctor', 'admin')
+@compute_cost(5)
+def similar_cases():
+    try:
+        img = None
+        body = {}
+        if 'image' in request.files:
+            f = request.files['image']
+            img = f.read()
+        else:
+            body = request.get_json(silent=True) or {}
+            img_b64 = body.get('imageBase64')
+            if img_b64:
+                import base64
+                img = base64.b64decode(img_b64)
+
+        if not img:
+            return rejected_input('No image provided')
+
+        try:
+            k = int(request.args.get('k') or request.form.get('k') or body.get('k') or 10)
+        except (TypeError, ValueError):
+            return rejected_input('k must be an integer')
+        k = max(1, min(k, 50))
+        include_unconfirmed = str(
+            request.args.get('includeUnconfirmed') or request.form.get('includeUnconfirmed') or body.get('includeUnconfirmed') or ''
+        ).lower() in ('1', 'true', 'yes')
+
+        import time
+        started = time.perf_counter()
+        cases = ai_service.find_similar_cases(img, k=k, confirmed_only=not include_unconfirmed)
+        took_ms = (time.perf_counter() - started) * 1000.0
+
+        return jsonify({'status': 'success', 'data': {
+            'cases': cases,
+            'model_version': ai_service.model_version(),
+            'took_ms': round(took_ms, 2),
+        }}), 200
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+
 # Doctor profile / availability endpoints
 @doctor_bp.route('/profile', methods=['GET'])
 @auth_required
 @doctor_required
-def get_doctor_profile():
+async def get_doctor_profile():
     try:
         user = getattr(request, 'user', None)
         if not user:
             return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
-        doc = supabase_service.get_doctor_by_user_id(user.get('id'))
+        doc, days = await async_supabase_service.get_role_record(user.get('id'), 'doctor')
         if not doc:
             return jsonify({'status': 'success', 'data': None}), 200
-        days = supabase_service.get_doctor_available_days(doc.get('id'))
         doc['availableDays'] = days
         return jsonify({'status': 'success', 'data': doc}), 200
     except Exception as e:
@@ -1,13 +1,40 @@
 import io
 import os
+import copy
 import json
 import threading
 import subprocess
 import sys
-from typing import Dict, Any
+import time
+import uuid
+import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from app.config.config import get_config
+from app.services.similarity_index import SimilarityIndex
+from app.services.near_duplicate_cache import NearDuplicateCache
+from app.services.model_evaluation import EvaluationEngine
+from app.services.shadow_evaluation import ShadowStats
+
+config = get_config()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 AI_DIR = os.path.join(BASE_DIR, 'AIWoundOrrashDettector')
+SIMILARITY_DIR = os.path.join(AI_DIR, 'similarity')
+EXPLANATIONS_DIR = os.path.join(AI_DIR, 'explanations')
+
+# Detection result fields that describe one upload and are never shared via the near-duplicate cache
+PER_REQUEST_FIELDS = ('case_id', 'explanation_id', 'near_duplicate', 'hash_distance')
+
+# pooled features of the current thread's last torch forward pass (see _attach_feature_hook)
+_torch_features = threading.local()
+
+
+def _capture_torch_features(module, inputs, output):
+    _torch_features.value = output
 
 
 class AIService:
@@ -19,11 +46,51 @@ class AIService:
         self.classes = None
         self._ready = False
         self._loading_lock = threading.Lock()
+        self.keras_model_path = None
+        self.torch_model_path = None
+        # version of the model in memory, fixed when it was loaded
+        self._model_version = 'stub'
+        # (logits, features) view of the Keras model; False when it can't be built
+        self._keras_dual = None
+        # (model_version, SimilarityIndex) for the currently loaded model
+        self._similarity = None
+        self._similarity_lock = threading.Lock()
+        self._similarity_backfill_version = None
+        # set of feedback images the running backfill has listed but not indexed yet (None when none runs)
+        self._backfill_pending = None
+        self._similarity_backfill_thread = None
+        # near-duplicate result cache in front of detect()
+        self.near_duplicates = NearDuplicateCache(
+            capacity=config.AI_DEDUP_CAPACITY,
+            max_distance=config.AI_DEDUP_MAX_DISTANCE,
+            sample_rate=config.AI_DEDUP_SAMPLE_RATE,
+        ) if config.AI_DEDUP_ENABLED else None
+        # off-request-path work (near-duplicate verification samples)
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-background')
+        # Grad-CAM overlays are computed on their own worker so they never queue behind detection
+        self._explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-explain')
+        self._explain_lock = threading.Lock()
+        self._explain_pending = set()
+        self._explain_failed = {}
+        # (live torch model, private copy) used for Grad-CAM; only the explain worker touches the copy
+        self._explain_copy = None
+        # structured result of the most recent evaluate_model/evaluate_checkpoint run
+        self.last_evaluation = None
+        # candidate model shadowing the live one on a sample of detections
+        self.candidate = None
+        self.shadow_stats = ShadowStats()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-shadow')
+        self._shadow_pending = 0
+        self._shadow_lock = threading.Lock()
 
     def _load_model(self):
         with self._loading_lock:
             if self._ready:
                 return
+            self._keras_dual = None
+            # cached results came from the previous model
+            if self.near_duplicates is not None:
+                self.near_duplicates.clear()
             try:
                 # Try to load a Keras (.h5) model if present
                 from PIL import Image
@@ -37,6 +104,8 @@ class AIService:
                         h5_path = os.path.join(AI_DIR, h5_candidates[0]) if h5_candidates else None
                 except Exception:
                     h5_path = None
+                # read before loading so a checkpoint rewritten meanwhile isn't attributed to this model
+                h5_version = self._version_for_path(h5_path) if h5_path else None
 
                 if h5_path and os.path.exists(h5_path):
                     try:
@@ -47,6 +116,7 @@ class AIService:
                         keras_model = load_model(h5_path)
                         self.keras_model = keras_model
                         self.keras_model_path = h5_path
+                        self._model_version = h5_version
 
                         # try to load classes from classes.json if saved during training
                         classes_file = os.path.join(AI_DIR, 'classes.json')
@@ -127,6 +197,7 @@ class AIService:
                             keras_model = load_model(h5_path, compile=False, custom_objects=custom)
                             self.keras_model = keras_model
                             self.keras_model_path = h5_path
+                            self._model_version = h5_version
                             # attempt to load classes.json or dataset folders
                             classes_file = os.path.join(AI_DIR, 'classes.json')
                             classes = []
@@ -175,6 +246,7 @@ class AIService:
                                 bm.load_weights(h5_path)
                                 self.keras_model = bm
                                 self.keras_model_path = h5_path
+                                self._model_version = h5_version
                                 self.classes = classes
                                 self.model = None
                                 print('Rebuilt architecture and loaded weights from:', h5_path)
@@ -193,17 +265,12 @@ class AIService:
                     classes = sorted([d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d))])
 
                 ckpt = os.path.join(AI_DIR, 'models', 'resnet18_best.pth')
-                device = 'cpu'
                 if classes and os.path.exists(ckpt):
-                    model = models.resnet18(pretrained=False)
-                    in_features = model.fc.in_features
-                    model.fc = torch.nn.Linear(in_features, len(classes))
-                    ckpt_data = torch.load(ckpt, map_location=device)
-                    model.load_state_dict(ckpt_data.get('model_state', ckpt_data))
-                    model.to(device)
-                    model.eval()
-                    self.model = model
-                    self.classes = ckpt_data.get('classes') or classes
+                    version = self._version_for_path(ckpt)
+                    self.model, self.classes = self._load_torch_checkpoint(ckpt, classes)
+                    self.torch_model_path = ckpt
+                    self._model_version = version
+                    self._attach_feature_hook(self.model)
                 else:
                     # no model found -> leave as None
                     self.model = None
@@ -220,14 +287,90 @@ class AIService:
 
             self._ready = True
 
+    @staticmethod
+    def _load_torch_checkpoint(ckpt: str, classes: List[str]):
+        """Build a ResNet18 head for ``classes`` and load a checkpoint; returns (model, classes)."""
+        import torch
+        from torchvision import models
+
+        device = 'cpu'
+        model = models.resnet18(pretrained=False)
+        in_features = model.fc.in_features
+        model.fc = torch.nn.Linear(in_features, len(classes))
+        ckpt_data = torch.load(ckpt, map_location=device)
+        model.load_state_dict(ckpt_data.get('model_state', ckpt_data))
+        if ckpt_data.get('img_size'):
+            # input size the checkpoint was trained at; _torch_input resizes to it
+            model.img_size = int(ckpt_data['img_size'])
+        model.to(device)
+        model.eval()
+        return model, (ckpt_data.get('classes') or classes)
+
     def detect(self, image_bytes: bytes) -> Dict[str, Any]:
         """Return a detection result: {label, confidence, treatments, specialization}
 
-        If a PyTorch model is available it will be used, otherwise a simple stub mapping is returned.
+        Near-duplicates of a recently detected image (recompressed, resized or
+        EXIF-stripped re-uploads) reuse the earlier result instead of re-running the model.
         """
         if not self._ready:
             self._load_model()
 
+        cache = self.near_duplicates
+        image_hash = None
+        if cache is not None:
+            try:
+                image_hash = cache.hash_image(image_bytes)
+            except Exception:
+                image_hash = None
+        if image_hash is not None:
+            hit = cache.lookup(image_hash)
+            if hit is not None:
+                result, distance = hit
+                if cache.should_sample():
+                    self._background.submit(self._verify_near_duplicate, image_bytes, result.get('label'))
+                result['near_duplicate'] = True
+                result['hash_distance'] = distance
+                return result
+
+        timings = {}
+        result = self._detect_uncached(image_bytes, timings=timings)
+        # failed detections are not reused, and case ids belong to this upload only
+        if image_hash is not None and result.get('model_used') and result.get('label') != 'Unknown':
+            cache.store(image_hash, {k: v for k, v in result.items() if k not in PER_REQUEST_FIELDS})
+        if self.candidate is not None and random.random() < config.AI_SHADOW_SAMPLE_RATE:
+            candidate, live_result = self.candidate, dict(result)
+            self._after_response(lambda: self._submit_shadow(candidate, image_bytes, live_result, timings.get('model_ms')))
+        return result
+
+    @staticmethod
+    def _after_response(fn):
+        """Call ``fn`` once the current response has been sent (right away outside a request)."""
+        from flask import after_this_request, has_request_context
+
+        if not has_request_context():
+            fn()
+            return
+
+        @after_this_request
+        def _defer(response):
+            response.call_on_close(fn)
+            return response
+
+    def _verify_near_duplicate(self, image_bytes: bytes, cached_label: str):
+        """Background check of a sampled cache hit against a full detection."""
+        try:
+            actual = self._detect_uncached(image_bytes, record_case=False)
+            self.near_duplicates.record_sample(cached_label, actual.get('label'))
+        except Exception as e:
+            print('Near-duplicate verification failed:', e)
+
+    def _detect_uncached(self, image_bytes: bytes, record_case: bool = True, timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """Run the model (or stub) on an image.
+
+        If a PyTorch model is available it will be used, otherwise a simple stub mapping is returned.
+        ``timings['model_ms']`` receives the preprocessing + forward time of a model run.
+        """
+
         # Minimal stub mapping to treatments and specializations
         mapping = {
             'Acne': {
@@ -250,31 +393,14 @@ class AIService:
 
         # Try model inference if available
         model_used = False
+        embedding = None
         # Prefer Keras model if available
         if getattr(self, 'keras_model', None) is not None and self.classes is not None:
             try:
-                import numpy as np
-                from PIL import Image
-                keras = self.keras_model
-
-                img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-                # determine target size from model input if possible
-                input_shape = getattr(keras, 'input_shape', None)
-                if input_shape and len(input_shape) >= 3:
-                    # shape may be (None, H, W, C) or (None, C, H, W)
-                    if input_shape[1] is None or input_shape[2] is None:
-                        target_size = (224, 224)
-                    else:
-                        target_size = (int(input_shape[1]), int(input_shape[2]))
-                else:
-                    target_size = (224, 224)
-
-                img = img.resize(target_size)
-                arr = np.asarray(img).astype('float32') / 255.0
-                # ensure batch dim
-                if arr.ndim == 3:
-                    arr = np.expand_dims(arr, 0)
-                preds = keras.predict(arr)
+                started = time.perf_counter()
+                arr = self._keras_input(image_bytes)
+                preds, embedding = self._keras_forward(arr)
+                model_ms = (time.perf_counter() - started) * 1000.0
                 # convert logits to probabilities using softmax (matches training notebook)
                 try:
                     import numpy as _np
@@ -295,25 +421,22 @@ class AIService:
 
                 label = self.classes[idx] if self.classes and idx < len(self.classes) else f'Class_{idx}'
                 model_used = True
+                if timings is not None:
+                    timings['model_ms'] = model_ms
             except Exception:
                 label = 'Unknown'
                 confidence = 0.0
 
         elif self.model and self.classes:
             try:
-                from PIL import Image
                 import torch
-                from torchvision import transforms
 
-                img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-                t = transforms.Compose([
-                    transforms.Resize((224, 224)),
-                    transforms.ToTensor(),
-                    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-                ])
-                x = t(img).unsqueeze(0)
+                started = time.perf_counter()
+                x = self._torch_input(image_bytes)
                 with torch.no_grad():
-                    out = self.model(x)
+                    out, embedding = self._torch_forward(x)
+                    if timings is not None:
+                        timings['model_ms'] = (time.perf_counter() - started) * 1000.0
                     probs = torch.nn.functional.softmax(out[0], dim=0)
                     val, idx = torch.max(probs, 0)
                     label = self.classes[idx.item()]
@@ -332,7 +455,7 @@ class AIService:
             'specialization': 'General'
         })
 
-        return {
+        result = {
             'label': label,
             'confidence': confidence,
             'treatments': info['treatments'],
@@ -340,8 +463,247 @@ class AIService:
             'model_used': model_used
         }
 
+        if embedding is not None and record_case:
+            try:
+                case_id = self._record_case(embedding, image_bytes, label, confidence, source='detection', confirmed=False)
+                if case_id:
+                    result['case_id'] = case_id
+            except Exception as e:
+                print('Similarity index update failed:', e)
+
+        return result
+
+    # --- Shared preprocessing / forward helpers ---
+    def _keras_input(self, image_bytes: bytes, default_size: int = 224, model=None):
+        """Decode and resize an image into a (1, H, W, 3) float batch for a Keras model (live by default)."""
+        import numpy as np
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        # determine target size from model input if possible
+        input_shape = getattr(model if model is not None else self.keras_model, 'input_shape', None)
+        if input_shape and len(input_shape) >= 3:
+            # shape may be (None, H, W, C) or (None, C, H, W)
+            if input_shape[1] is None or input_shape[2] is None:
+                target_size = (default_size, default_size)
+            else:
+                target_size = (int(input_shape[1]), int(input_shape[2]))
+        else:
+            target_size = (default_size, default_size)
+
+        img = img.resize(target_size)
+        arr = np.asarray(img).astype('float32') / 255.0
+        # ensure batch dim
+        if arr.ndim == 3:
+            arr = np.expand_dims(arr, 0)
+        return arr
+
+    def _torch_input(self, image_bytes: bytes, default_size: int = 224, model=None):
+        """Decode and normalise an image into a (1, 3, S, S) tensor for a torch model (live by default).
+
+        S is the size the model was trained at (its ``img_size``), else ``default_size``.
+        """
+        from PIL import Image
+        from torchvision import transforms
+
+        size = getattr(model if model is not None else self.model, 'img_size', None) or default_size
+        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        t = transforms.Compose([
+            transforms.Resize((size, size)),
+            transforms.ToTensor(),
+            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
+        return t(img).unsqueeze(0)
+
+    def _keras_forward(self, arr):
+        """Run the Keras model, returning (logits, penultimate features) from one pass.
+
+        Features are None when the model has no rank-2 layer before its head.
+        """
+        if self._keras_dual is None:
+            try:
+                from tensorflow import keras as _keras
+                m = self.keras_model
+                features = None
+                for layer in reversed(m.layers[:-1]):
+                    shape = getattr(layer, 'output_shape', None)
+                    if isinstance(shape, tuple) and len(shape) == 2:
+                        features = layer.output
+                        break
+                self._keras_dual = _keras.Model(m.inputs, [m.output, features]) if features is not None else False
+            except Exception:
+                self._keras_dual = False
+        if self._keras_dual is False:
+            return self.keras_model.predict(arr), None
+        preds, feats = self._keras_dual.predict(arr)
+        return preds, feats[0]
+
+    @staticmethod
+    def _attach_feature_hook(model):
+        """Record the pooled features of every forward pass of ``model`` (per thread)."""
+        pool = getattr(model, 'avgpool', None)
+        if pool is not None and _capture_torch_features not in pool._forward_hooks.values():
+            pool.register_forward_hook(_capture_torch_features)
+
+    def _torch_forward(self, x):
+        """Run the torch model, returning (logits, pooled backbone features) from one pass.
+
+        Features come from the forward hook on ``avgpool`` (None for models without one).
+        """
+        import torch
+
+        _torch_features.value = None
+        out = self.model(x)
+        pooled = _torch_features.value
+        _torch_features.value = None
+        if pooled is None:
+            return out, None
+        return out, torch.flatten(pooled, 1)[0].cpu().numpy()
+
+    @staticmethod
+    def _version_for_path(path: str) -> str:
+        try:
+            return f'{os.path.splitext(os.path.basename(path))[0]}-{int(os.path.getmtime(path))}'
+        except Exception:
+            return 'unknown'
+
+    def model_version(self) -> str:
+        """Identify the loaded model by file name and modification time at load ('stub' if none)."""
+        if getattr(self, 'keras_model', None) is not None or self.model is not None:
+            return self._model_version
+        return 'stub'
+
+    # --- Similar-case retrieval ---
+    def embed(self, image_bytes: bytes):
+        """Return the backbone embedding of an image, or None when no model is loaded."""
+        if not self._ready:
+            self._load_model()
+
+        if getattr(self, 'keras_model', None) is not None:
+            _, embedding = self._keras_forward(self._keras_input(image_bytes))
+            return embedding
+        if self.model is not None:
+            import torch
+            with torch.no_grad():
+                _, embedding = self._torch_forward(self._torch_input(image_bytes))
+            return embedding
+        return None
+
+    def _similarity_index(self, dim: int) -> SimilarityIndex:
+        """Open (or create) the similarity index for the currently loaded model.
+
+        Embeddings from different model versions are not comparable, so each version
+        gets its own index. A fresh index is backfilled from confirmed feedback images.
+        """
+        version = self.model_version()
+        with self._similarity_lock:
+            if self._similarity is not None and self._similarity[0] == version:
+                return self._similarity[1]
+            index = SimilarityIndex(os.path.join(SIMILARITY_DIR, version), dim, dtype=config.SIMILARITY_INDEX_DTYPE)
+            self._similarity = (version, index)
+            if len(index) == 0 and self._similarity_backfill_version != version:
+                self._similarity_backfill_version = version
+                pending = set(path for _, path in self._feedback_images())
+                self._backfill_pending = pending
+                self._similarity_backfill_thread = threading.Thread(
+                    target=self._backfill_similarity_index, args=(version, index, pending), daemon=True)
+                self._similarity_backfill_thread.start()
+            return index
+
+    @staticmethod
+    def _feedback_images():
+        """(label, absolute path) of the confirmed feedback images saved under dataset/train/<label>/."""
+        data_dir = os.path.join(AI_DIR, 'dataset', 'train')
+        if not os.path.isdir(data_dir):
+            return []
+        images = []
+        for label in sorted(os.listdir(data_dir)):
+            label_dir = os.path.join(data_dir, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for fn in sorted(os.listdir(label_dir)):
+                if fn.startswith('user_correct_'):
+                    images.append((label, os.path.abspath(os.path.join(label_dir, fn))))
+        return images
+
+    def _backfill_similarity_index(self, version: str, index: SimilarityIndex, pending: set):
+        """Embed the feedback images in ``pending``, listed when the index was created."""
+        added = 0
+        try:
+            with self._similarity_lock:
+                listed = sorted(pending)
+            for fpath in listed:
+                label = os.path.basename(os.path.dirname(fpath))
+                # stop if the model was swapped while we were backfilling
+                if self.model_version() != version:
+                    return
+                try:
+                    with open(fpath, 'rb') as f:
+                        data = f.read()
+                    embedding = self.embed(data)
+                    if embedding is None:
+                        return
+                    index.add(embedding, self._case_meta(data, label, None, 'feedback', True, fpath))
+                    added += 1
+                except Exception:
+                    continue
+                finally:
+                    with self._similarity_lock:
+                        pending.discard(fpath)
+            print(f'Similarity index {version}: backfilled {added} feedback cases')
+        finally:
+            with self._similarity_lock:
+                pending.clear()
+                if self._backfill_pending is pending:
+                    self._backfill_pending = None
+
+    @staticmethod
+    def _case_meta(image_bytes: bytes, label: str, confidence, source: str, confirmed: bool, image_path: Optional[str] = None) -> Dict[str, Any]:
+        meta = {
+            'case_id': uuid.uuid4().hex,
+            'label': label,
+            'confidence': confidence,
+            'source': source,
+            'confirmed': confirmed,
+            'image_sha256': hashlib.sha256(image_bytes).hexdigest(),
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        if image_path:
+            meta['image_path'] = os.path.relpath(image_path, AI_DIR)
+        return meta
+
+    def _record_case(self, embedding, image_bytes: bytes, label: str, confidence, source: str, confirmed: bool, image_path: Optional[str] = None) -> Optional[str]:
+        """Index a case; unconfirmed detections stop being indexed at SIMILARITY_MAX_UNCONFIRMED."""
+        meta = self._case_meta(image_bytes, label, confidence, source, confirmed, image_path)
+        row = self._similarity_index(len(embedding)).add(embedding, meta, max_unconfirmed=config.SIMILARITY_MAX_UNCONFIRMED)
+        return meta['case_id'] if row is not None else None
+
+    def record_feedback_case(self, image_bytes: bytes, label: str, image_path: Optional[str] = None) -> Optional[str]:
+        """Index a clinician/patient-confirmed image under its corrected label."""
+        embedding = self.embed(image_bytes)
+        if embedding is None:
+            return None
+        index = self._similarity_index(len(embedding))
+        if image_path:
+            with self._similarity_lock:
+                if self._backfill_pending and os.path.abspath(image_path) in self._backfill_pending:
+                    # the running backfill has listed this image and will index it
+                    return None
+        meta = self._case_meta(image_bytes, label, None, 'feedback', True, image_path)
+        index.add(embedding, meta)
+        return meta['case_id']
+
+    def find_similar_cases(self, image_bytes: bytes, k: int = 10, confirmed_only: bool = True) -> List[Dict[str, Any]]:
+        """Return the k stored cases whose embeddings are closest (cosine) to the image."""
+        embedding = self.embed(image_bytes)
+        if embedding is None:
+            raise Exception('Similar-case search requires a loaded model')
+        return self._similarity_index(len(embedding)).search(embedding, k=k, confirmed_only=confirmed_only)
+
     def train_and_evaluate(self, epochs: int = 10, batch_size: int = 32, img_size: int = 224, min_accuracy: float = 0.9, blocking: bool = False):
-        """Run the training script and evaluation. If blocking=True it will run synchronously and raise if min_accuracy not met.
+        """Run the training script, then evaluate the new checkpoint in-process (see evaluate_checkpoint).
+
+        If blocking=True it will run synchronously and raise if min_accuracy not met.
 
         Otherwise it starts training in a background thread.
         """
@@ -353,27 +715,19 @@ class AIService:
                 print('TRAIN STDOUT:', proc.stdout)
                 print('TRAIN STDERR:', proc.stderr)
 
-                # run evaluate.py
+                # evaluate the new checkpoint in-process before swapping it in
                 ckpt = os.path.join(AI_DIR, 'models', 'resnet18_best.pth')
                 if os.path.exists(ckpt):
-                    cmd2 = [sys.executable, 'evaluate.py', '--checkpoint', str(ckpt), '--data-dir', 'dataset/train', '--img-size', str(img_size)]
-                    proc2 = subprocess.run(cmd2, cwd=AI_DIR, capture_output=True, text=True)
-                    print('EVAL STDOUT:', proc2.stdout)
-                    print('EVAL STDERR:', proc2.stderr)
-                    # parse overall accuracy line
-                    overall = 0.0
-                    for line in proc2.stdout.splitlines():
-                        if 'Overall accuracy' in line:
-                            try:
-                                overall = float(line.split(':')[-1].strip().strip('%')) / 100.0
-                            except Exception:
-                                overall = 0.0
+                    evaluation = self.evaluate_checkpoint(ckpt, batch_size=batch_size, img_size=img_size)
+                    overall = evaluation['accuracy']
                     print('Model overall accuracy:', overall)
                     # reload model if good
                     if overall >= min_accuracy:
                         # reload model into memory
                         self._ready = False
                         self._load_model()
+                        if self.model is not None and getattr(self.model, 'img_size', None) is None:
+                            self.model.img_size = img_size
                     else:
                         print(f'Model accuracy {overall:.2f} below threshold {min_accuracy:.2f}')
                         if blocking:
@@ -389,6 +743,350 @@ class AIService:
             t = threading.Thread(target=_run, daemon=True)
             t.start()
 
+    # --- Explainability (Grad-CAM overlays) ---
+    @staticmethod
+    def explanation_id(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def _explanation_path(version: str, image_id: str) -> str:
+        return os.path.join(EXPLANATIONS_DIR, version, f'{image_id}.png')
+
+    @staticmethod
+    def _owners_path(version: str, image_id: str) -> str:
+        return os.path.join(EXPLANATIONS_DIR, version, f'{image_id}.owners')
+
+    def _add_explanation_owner(self, version: str, image_id: str, owner_id: str):
+        path = self._owners_path(version, image_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._explain_lock:
+            if owner_id in self._explanation_owners(version, image_id):
+                return
+            # one short line per append, so concurrent workers don't interleave
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f'{owner_id}\n')
+
+    @classmethod
+    def _explanation_owners(cls, version: str, image_id: str) -> set:
+        try:
+            with open(cls._owners_path(version, image_id), 'r', encoding='utf-8') as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def explanation_visible_to(self, image_id: str, user_id: str) -> bool:
+        """Whether ``user_id`` uploaded the image behind an explanation (for the current model)."""
+        return bool(user_id) and str(user_id) in self._explanation_owners(self.model_version(), image_id)
+
+    def request_explanation(self, image_bytes: bytes, label: Optional[str] = None, owner_id: Optional[str] = None) -> Optional[str]:
+        """Queue a heatmap overlay for an image and return its id (None without a model).
+
+        Overlays are stored per model version, so a cached PNG is reused until the
+        model changes. ``owner_id`` is recorded next to it and is the only user
+        explanation_visible_to admits. Only the queueing happens on the caller's thread.
+        """
+        version = self.model_version()
+        if version in ('stub', 'unknown'):
+            return None
+        image_id = self.explanation_id(image_bytes)
+        key = (version, image_id)
+        if owner_id:
+            self._add_explanation_owner(version, image_id, str(owner_id))
+        with self._explain_lock:
+            if key in self._explain_pending or os.path.exists(self._explanation_path(version, image_id)):
+                return image_id
+            self._explain_pending.add(key)
+            self._explain_failed.pop(key, None)
+        self._explain_executor.submit(self._compute_explanation, image_bytes, label, version, image_id)
+        return image_id
+
+    def get_explanation(self, image_id: str) -> Dict[str, Any]:
+        """Return {'state': 'ready'|'pending'|'failed'|'missing', ...} for an explanation id."""
+        version = self.model_version()
+        key = (version, image_id)
+        path = self._explanation_path(version, image_id)
+        if os.path.exists(path):
+            return {'state': 'ready', 'path': path, 'model_version': version}
+        with self._explain_lock:
+            if key in self._explain_pending:
+                return {'state': 'pending', 'model_version': version}
+            if key in self._explain_failed:
+                return {'state': 'failed', 'error': self._explain_failed[key], 'model_version': version}
+        return {'state': 'missing', 'model_version': version}
+
+    def _compute_explanation(self, image_bytes: bytes, label: Optional[str], version: str, image_id: str):
+        key = (version, image_id)
+        try:
+            class_idx = None
+            if label and self.classes and label in self.classes:
+                class_idx = self.classes.index(label)
+            if getattr(self, 'keras_model', None) is not None:
+                arr = self._keras_input(image_bytes)
+                heatmap = self._gradcam_keras(arr, class_idx)
+            elif self.model is not None:
+                heatmap = self._gradcam_torch(self._explain_model(), self._torch_input(image_bytes), class_idx)
+            else:
+                raise Exception('No model loaded')
+
+            path = self._explanation_path(version, image_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+            self._render_overlay(image_bytes, heatmap).save(tmp, 'PNG')
+            os.replace(tmp, path)
+        except Exception as e:
+            with self._explain_lock:
+                # bounded: forget the oldest failure once we hold many
+                if len(self._explain_failed) >= 1000:
+                    self._explain_failed.pop(next(iter(self._explain_failed)))
+                self._explain_failed[key] = str(e)
+        finally:
+            with self._explain_lock:
+                self._explain_pending.discard(key)
+
+    def _gradcam_keras(self, arr, class_idx: Optional[int] = None):
+        """Grad-CAM over the last 4-D layer; falls back to input-gradient saliency."""
+        import numpy as np
+        import tensorflow as tf
+
+        m = self.keras_model
+        conv_layer = None
+        for layer in reversed(m.layers):
+            shape = getattr(layer, 'output_shape', None)
+            if isinstance(shape, tuple) and len(shape) == 4:
+                conv_layer = layer
+                break
+
+        x = tf.convert_to_tensor(arr)
+        if conv_layer is not None:
+            grad_model = tf.keras.Model(m.inputs, [conv_layer.output, m.output])
+            with tf.GradientTape() as tape:
+                conv_out, preds = grad_model(x, training=False)
+                idx = int(tf.argmax(preds[0])) if class_idx is None else class_idx
+                score = preds[:, idx]
+            grads = tape.gradient(score, conv_out)
+            weights = tf.reduce_mean(grads, axis=(1, 2))
+            cam = tf.nn.relu(tf.reduce_sum(conv_out[0] * weights[0], axis=-1)).numpy()
+        else:
+            with tf.GradientTape() as tape:
+                tape.watch(x)
+                preds = m(x, training=False)
+                idx = int(tf.argmax(preds[0])) if class_idx is None else class_idx
+                score = preds[:, idx]
+            cam = tf.reduce_max(tf.abs(tape.gradient(score, x))[0], axis=-1).numpy()
+        cam = np.asarray(cam, dtype='float32')
+        peak = float(cam.max())
+        return cam / peak if peak > 0 else cam
+
+    def _explain_model(self):
+        """Private copy of the live torch model for Grad-CAM.
+
+        Grad-CAM registers hooks and runs backward passes; doing that on the live
+        model would break detections running through it at the same time. The copy
+        is rebuilt when the live model changes.
+        """
+        model = self.model
+        cached = self._explain_copy
+        if cached is None or cached[0] is not model:
+            cached = self._explain_copy = (model, copy.deepcopy(model))
+        return cached[1]
+
+    @staticmethod
+    def _gradcam_torch(model, x, class_idx: Optional[int] = None):
+        """Grad-CAM over ResNet layer4 (or the last conv module)."""
+        import torch
+
+        target = getattr(model, 'layer4', None)
+        if target is None:
+            convs = [mod for mod in model.modules() if isinstance(mod, torch.nn.Conv2d)]
+            target = convs[-1]
+        captured = {}
+
+        def _forward_hook(module, inp, out):
+            captured['activation'] = out
+            out.register_hook(lambda grad: captured.__setitem__('gradient', grad))
+
+        handle = target.register_forward_hook(_forward_hook)
+        try:
+            with torch.enable_grad():
+                out = model(x)
+                idx = int(out[0].argmax()) if class_idx is None else class_idx
+                model.zero_grad()
+                out[0, idx].backward()
+        finally:
+            handle.remove()
+        weights = captured['gradient'].mean(dim=(2, 3), keepdim=True)
+        cam = torch.relu((weights * captured['activation']).sum(dim=1))[0].detach().cpu().numpy()
+        peak = float(cam.max())
+        return cam / peak if peak > 0 else cam
+
+    @staticmethod
+    def _render_overlay(image_bytes: bytes, heatmap, alpha: float = 0.45):
+        """Blend a [0, 1] heatmap (blue -> red) over the original image."""
+        import numpy as np
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        img.thumbnail((512, 512))
+        hm = Image.fromarray((np.clip(heatmap, 0, 1) * 255).astype('uint8')).resize(img.size, Image.BILINEAR)
+        h = np.asarray(hm, dtype='float32') / 255.0
+        colour = np.stack([
+            np.clip(1.5 - np.abs(4 * h - 3), 0, 1),
+            np.clip(1.5 - np.abs(4 * h - 2), 0, 1),
+            np.clip(1.5 - np.abs(4 * h - 1), 0, 1),
+        ], axis=-1)
+        base = np.asarray(img, dtype='float32') / 255.0
+        blended = (1 - alpha) * base + alpha * colour
+        return Image.fromarray((blended * 255).astype('uint8'))
+
+    # --- Shadow evaluation of a candidate model ---
+    def load_candidate(self, path: str) -> Dict[str, Any]:
+        """Load a candidate model (.h5 Keras or .pth ResNet18 checkpoint) next to the live one.
+
+        The candidate never serves results; it only runs on a sample of detections
+        in the background and feeds shadow_stats.
+        """
+        if not self._ready:
+            self._load_model()
+        if path.endswith('.h5'):
+            from tensorflow.keras.models import load_model
+            candidate = {'kind': 'keras', 'model': load_model(path, compile=False), 'classes': self.classes or []}
+        elif path.endswith('.pth'):
+            train_dir = os.path.join(AI_DIR, 'dataset', 'train')
+            classes = sorted([d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d))])
+            model, classes = self._load_torch_checkpoint(path, classes)
+            candidate = {'kind': 'torch', 'model': model, 'classes': classes}
+        else:
+            raise Exception('Candidate must be a .h5 or .pth file')
+        candidate.update({'path': path, 'version': self._version_for_path(path), 'loaded_at': datetime.utcnow().isoformat()})
+        self.shadow_stats.reset()
+        self.candidate = candidate
+        return self.candidate_info()
+
+    def unload_candidate(self):
+        self.candidate = None
+
+    def candidate_info(self) -> Optional[Dict[str, Any]]:
+        c = self.candidate
+        if c is None:
+            return None
+        return {'path': os.path.relpath(c['path'], AI_DIR), 'version': c['version'], 'kind': c['kind'], 'loaded_at': c['loaded_at']}
+
+    def _submit_shadow(self, candidate: Dict[str, Any], image_bytes: bytes, live_result: Dict[str, Any], live_ms: float):
+        # never let a slow candidate build an unbounded backlog
+        with self._shadow_lock:
+            if self._shadow_pending >= config.AI_SHADOW_MAX_PENDING:
+                self.shadow_stats.record_dropped()
+                return
+            self._shadow_pending += 1
+        self._shadow_executor.submit(self._run_shadow, candidate, image_bytes, dict(live_result), live_ms)
+
+    def _run_shadow(self, candidate: Dict[str, Any], image_bytes: bytes, live_result: Dict[str, Any], live_ms: float):
+        try:
+            import numpy as np
+
+            started = time.perf_counter()
+            if candidate['kind'] == 'keras':
+                preds = candidate['model'].predict(self._keras_input(image_bytes, model=candidate['model']))
+                p = preds[0]
+                probs = np.exp(p - np.max(p))
+                probs = probs / np.sum(probs)
+            else:
+                import torch
+                with torch.no_grad():
+                    out = candidate['model'](self._torch_input(image_bytes, model=candidate['model']))
+                    probs = torch.nn.functional.softmax(out[0], dim=0).cpu().numpy()
+            candidate_ms = (time.perf_counter() - started) * 1000.0
+            idx = int(np.argmax(probs))
+            classes = candidate['classes']
+            shadow = {
+                'label': classes[idx] if idx < len(classes) else f'Class_{idx}',
+                'confidence': float(probs[idx]),
+            }
+            # only compare against live results that actually came from a model
+            if live_result.get('model_used'):
+                self.shadow_stats.record(live_result, shadow, live_ms, candidate_ms)
+        except Exception as e:
+            print('Shadow evaluation failed:', e)
+            self.shadow_stats.record_error()
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    # --- Evaluation ---
+    @staticmethod
+    def _evaluation_data_dir() -> str:
+        val_dir = os.path.join(AI_DIR, 'dataset', 'val')
+        return val_dir if os.path.isdir(val_dir) else os.path.join(AI_DIR, 'dataset', 'train')
+
+    def _torch_engine(self, model, classes: List[str], batch_size: int, workers: int) -> EvaluationEngine:
+        import torch
+
+        def _decode(path):
+            with open(path, 'rb') as f:
+                return self._torch_input(f.read(), model=model)[0]
+
+        def _predict(batch):
+            with torch.no_grad():
+                return torch.nn.functional.softmax(model(torch.stack(batch)), dim=1).cpu().numpy()
+
+        return EvaluationEngine(classes, _decode, _predict, batch_size=batch_size, workers=workers)
+
+    def _keras_engine(self, classes: List[str], batch_size: int, workers: int) -> EvaluationEngine:
+        import numpy as np
+
+        def _decode(path):
+            with open(path, 'rb') as f:
+                return self._keras_input(f.read())[0]
+
+        def _predict(batch):
+            return self.keras_model.predict(np.stack(batch))
+
+        return EvaluationEngine(classes, _decode, _predict, batch_size=batch_size, workers=workers)
+
+    def _persist_evaluation(self, version: str, result: Dict[str, Any]):
+        out_dir = os.path.join(AI_DIR, 'models', 'evaluations')
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, f'{version}.json'), 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        self.last_evaluation = result
+
+    def evaluate_checkpoint(self, ckpt: str, data_dir: Optional[str] = None, batch_size: int = 32, workers: int = 4,
+                            img_size: Optional[int] = None) -> Dict[str, Any]:
+        """Evaluate a ResNet18 checkpoint without swapping it in; results are persisted per version.
+
+        Images are resized to ``img_size`` (the size it was trained at), else to the
+        size stored in the checkpoint, else 224.
+        """
+        data_dir = data_dir or self._evaluation_data_dir()
+        train_dir = os.path.join(AI_DIR, 'dataset', 'train')
+        classes = sorted([d for d in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, d))])
+        model, classes = self._load_torch_checkpoint(ckpt, classes)
+        if img_size:
+            model.img_size = int(img_size)
+        result = self._torch_engine(model, classes, batch_size, workers).evaluate(data_dir)
+        version = self._version_for_path(ckpt)
+        result.update({'model_version': version, 'checkpoint': ckpt, 'img_size': getattr(model, 'img_size', 224),
+                       'evaluated_at': datetime.utcnow().isoformat()})
+        self._persist_evaluation(version, result)
+        return result
+
+    def evaluate_model(self, data_dir: Optional[str] = None, batch_size: int = 32, workers: int = 4) -> Dict[str, Any]:
+        """Evaluate the currently loaded model on the validation (or training) folder."""
+        if not self._ready:
+            self._load_model()
+        data_dir = data_dir or self._evaluation_data_dir()
+        if getattr(self, 'keras_model', None) is not None:
+            engine = self._keras_engine(self.classes or [], batch_size, workers)
+        elif self.model is not None:
+            engine = self._torch_engine(self.model, self.classes or [], batch_size, workers)
+        else:
+            raise Exception('No model loaded')
+        result = engine.evaluate(data_dir)
+        version = self.model_version()
+        result.update({'model_version': version, 'evaluated_at': datetime.utcnow().isoformat()})
+        self._persist_evaluation(version, result)
+        return result
+
     def predict_proba(self, image_bytes: bytes):
         """Return (classes, probs) where probs is a list of probabilities matching classes order.
 
@@ -430,17 +1128,9 @@ class AIService:
         # PyTorch path
         if self.model and self.classes:
             try:
-                from PIL import Image
                 import torch
-                from torchvision import transforms
 
-                img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-                t = transforms.Compose([
-                    transforms.Resize((224, 224)),
-                    transforms.ToTensor(),
-                    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-                ])
-                x = t(img).unsqueeze(0)
+                x = self._torch_input(image_bytes)
                 with torch.no_grad():
                     out = self.model(x)
                     probs = torch.nn.functional.softmax(out[0], dim=0).cpu().numpy().tolist()
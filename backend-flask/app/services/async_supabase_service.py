@@ -0,0 +1,355 @@
+import asyncio
+import os
+import threading
+from functools import wraps
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+from app.config.config import get_config
+from app.services.supabase_service import (
+    supabase_service,
+    USER_PROJECTIONS,
+    PROFILE_USER_FIELDS,
+    compose_embedded_profile,
+    compose_profile,
+    MAX_CALENDAR_DAYS,
+    build_day_bitmaps,
+    calendar_from_bitmaps,
+    date_range,
+    days_from,
+    next_day,
+    next_free_slot,
+    is_missing_function,
+)
+from app.services.slot_change_service import slot_changes
+from app.utils.http_pool import HttpPoolStats, pooled_session
+
+config = get_config()
+
+
+def on_client_loop(method):
+    """Run a native AsyncSupabaseService coroutine on the service's client loop."""
+    @wraps(method)
+    async def call(self, *args, **kwargs):
+        return await self._on_client_loop(method(self, *args, **kwargs))
+    return call
+
+
+class AsyncSupabaseService:
+    """Async counterpart of SupabaseService for async views.
+
+    Methods that views await on hot paths are implemented natively on an
+    ``AsyncPostgrestClient`` so independent queries run concurrently
+    (``asyncio.gather``). Any other SupabaseService method is available under the
+    same name and signature as a coroutine that runs the sync implementation in a
+    worker thread, so callers can switch services without changing call sites.
+
+    Flask runs each async view in a short-lived event loop, while httpx
+    connections belong to the loop that opened them. The native methods therefore
+    run on one long-lived loop in a background thread (started on first use, once
+    per process) that owns a single pooled client; views await them through
+    ``run_coroutine_threadsafe``, so keep-alive connections outlive the request.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._loop_pid = None
+        self._loop_lock = threading.Lock()
+        self._postgrest = None
+        self._http_stats = HttpPoolStats()
+
+    def _client_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            # a forked worker does not inherit the parent's loop thread
+            if self._loop is None or self._loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='supabase-async', daemon=True).start()
+                self._loop, self._loop_pid, self._postgrest = loop, os.getpid(), None
+            return self._loop
+
+    async def _on_client_loop(self, coro):
+        loop = self._client_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _client(self) -> AsyncPostgrestClient:
+        """The shared client; only used from coroutines running on the client loop."""
+        if self._postgrest is None:
+            key = config.SUPABASE_SERVICE_ROLE_KEY
+            headers = {**DEFAULT_POSTGREST_CLIENT_HEADERS, 'apiKey': key, 'Authorization': f'Bearer {key}'}
+            client = AsyncPostgrestClient(f"{config.SUPABASE_URL.rstrip('/')}/rest/v1", headers=headers)
+            limits = httpx.Limits(
+                max_connections=config.SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.SUPABASE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+            )
+            timeout = httpx.Timeout(config.SUPABASE_HTTP_READ_TIMEOUT, connect=config.SUPABASE_HTTP_CONNECT_TIMEOUT)
+            # the session created by the constructor has not opened connections yet
+            client.session = pooled_session(client.session, limits, timeout, config.SUPABASE_HTTP2,
+                                            self._http_stats.hooks('postgrest_async'))
+            self._postgrest = client
+        return self._postgrest
+
+    def table(self, name: str):
+        return self._client().table(name)
+
+    def close(self):
+        """Close the shared client and stop the client loop (e.g. at shutdown)."""
+        with self._loop_lock:
+            loop, client = self._loop, self._postgrest
+            self._loop = self._postgrest = None
+        if loop is None or self._loop_pid != os.getpid():
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    def http_stats(self):
+        return self._http_stats.counts('postgrest_async')
+
+    def __getattr__(self, name):
+        attr = getattr(supabase_service, name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+    # Users
+    @on_client_loop
+    async def find_user_by_id(self, user_id: str, projection: str = 'all'):
+        """Find user by ID"""
+        try:
+            columns = USER_PROJECTIONS.get(projection)
+            if columns is None or projection in supabase_service._unsupported_projections:
+                # unknown or unsupported projections take the sync path and its '*' fallback
+                return await asyncio.to_thread(supabase_service.find_user_by_id, user_id, projection)
+            resp = await self.table('users').select(','.join(columns)).eq('id', user_id).execute()
+            return resp.data[0] if resp.data else None
+        except Exception as e:
+            if 'column' in str(e).lower():
+                return await asyncio.to_thread(supabase_service.find_user_by_id, user_id, projection)
+            raise Exception(f'Error finding user: {str(e)}')
+
+    # Doctor / ambulance helpers
+    @on_client_loop
+    async def get_doctor_by_user_id(self, user_id: str):
+        try:
+            resp = await self.table('doctors').select('*').eq('user_id', user_id).execute()
+            return resp.data[0] if resp.data else None
+        except Exception:
+            return None
+
+    @on_client_loop
+    async def get_doctor_available_days(self, doctor_id: str):
+        try:
+            resp = await self.table('doctor_available_days').select('day_of_week').eq('doctor_id', doctor_id).execute()
+            return [r.get('day_of_week') for r in (resp.data or []) if r.get('day_of_week')]
+        except Exception:
+            return []
+
+    @on_client_loop
+    async def get_ambulance_staff_by_user_id(self, user_id: str):
+        try:
+            resp = await self.table('ambulance_staff').select('*').eq('user_id', user_id).execute()
+            return resp.data[0] if resp.data else None
+        except Exception:
+            return None
+
+    @on_client_loop
+    async def get_ambulance_staff_available_days(self, staff_id: str):
+        try:
+            resp = await self.table('ambulance_staff_available_days').select('day_of_week').eq('staff_id', staff_id).execute()
+            return [r.get('day_of_week') for r in (resp.data or []) if r.get('day_of_week')]
+        except Exception:
+            return []
+
+    @on_client_loop
+    async def get_role_record(self, user_id: str, role: str):
+        """The doctor/ambulance_staff row of a user with its available days, or (None, [])."""
+        if role == 'doctor':
+            record = await self.get_doctor_by_user_id(user_id)
+            days = await self.get_doctor_available_days(record.get('id')) if record else []
+        elif role in ('ambulance', 'ambulance_staff'):
+            record = await self.get_ambulance_staff_by_user_id(user_id)
+            days = await self.get_ambulance_staff_available_days(record.get('id')) if record else []
+        else:
+            return None, []
+        return record, days
+
+    @on_client_loop
+    async def get_user_profile(self, user_id: str, role_hint: str = None):
+        """A user's profile with their doctor/ambulance record and available days (None if no user).
+
+        One embedded select, as SupabaseService.get_user_profile. Without the
+        embed, the role row for ``role_hint`` (e.g. the token's role) is fetched
+        alongside the user row and re-read if the stored role differs.
+        """
+        try:
+            embed = supabase_service._profile_embed
+            if embed and 'profile' not in supabase_service._unsupported_projections:
+                try:
+                    resp = await (
+                        self.table('users')
+                        .select(f"{','.join(PROFILE_USER_FIELDS)},{embed}")
+                        .eq('id', user_id)
+                        .execute()
+                    )
+                    return compose_embedded_profile(resp.data[0]) if resp.data else None
+                except Exception as e:
+                    supabase_service.profile_embed_failed(embed, e)
+            user, (record, days) = await asyncio.gather(
+                self.find_user_by_id(user_id, projection='profile'),
+                self.get_role_record(user_id, role_hint),
+            )
+            if not user:
+                return None
+            if user.get('role') != role_hint:
+                record, days = await self.get_role_record(user_id, user.get('role'))
+            return compose_profile(user, record, days)
+        except Exception as e:
+            raise Exception(f'Error loading profile: {str(e)}')
+
+    @on_client_loop
+    async def delete_user_cascade(self, user_id: str):
+        """Delete a user and related doctor/ambulance records."""
+        try:
+            await self.delete_users_cascade([user_id])
+            return True
+        except Exception as e:
+            raise Exception(f'Error deleting user cascade: {str(e)}')
+
+    @on_client_loop
+    async def delete_users_cascade(self, user_ids):
+        """Delete users and their doctor/ambulance records; returns the number of users deleted."""
+        ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        if not ids:
+            return 0
+        try:
+            roles = None
+            if supabase_service.role_counts_cached():
+                resp = await self.table('users').select('id,role').in_('id', ids).execute()
+                roles = [row.get('role') for row in (resp.data or [])]
+            deleted = None
+            if 'delete_users_cascade' not in supabase_service._unsupported_rpcs:
+                try:
+                    resp = await self._client().rpc('delete_users_cascade', {'p_user_ids': ids}).execute()
+                    deleted = int(resp.data or 0)
+                except Exception as e:
+                    if not is_missing_function(e):
+                        raise
+                    supabase_service._unsupported_rpcs.add('delete_users_cascade')
+            if deleted is None:
+                await asyncio.gather(*(self._delete_user_cascade_legacy(uid) for uid in ids))
+                deleted = len(ids)
+            for uid in ids:
+                supabase_service.invalidate_auth_user(uid, revoke_sessions=True)
+            supabase_service.adjust_deleted_role_counts(roles)
+            if roles is None or 'doctor' in roles:
+                supabase_service.invalidate_slot_index()
+            return deleted
+        except Exception as e:
+            raise Exception(f'Error deleting users: {str(e)}')
+
+    async def _delete_user_cascade_legacy(self, user_id: str):
+        doctor, staff = await asyncio.gather(
+            self.table('doctors').select('id').eq('user_id', user_id).execute(),
+            self.table('ambulance_staff').select('id').eq('user_id', user_id).execute(),
+        )
+        doctor_id = doctor.data[0]['id'] if doctor and doctor.data else None
+        staff_id = staff.data[0]['id'] if staff and staff.data else None
+
+        async def delete_doctor():
+            await asyncio.gather(
+                self.table('doctor_availability').delete().eq('doctor_id', doctor_id).execute(),
+                self.table('doctor_available_days').delete().eq('doctor_id', doctor_id).execute(),
+            )
+            await self.table('doctors').delete().eq('id', doctor_id).execute()
+
+        async def delete_staff():
+            await self.table('ambulance_staff_available_days').delete().eq('staff_id', staff_id).execute()
+            await self.table('ambulance_staff').delete().eq('id', staff_id).execute()
+
+        await asyncio.gather(*([delete_doctor()] if doctor_id else []), *([delete_staff()] if staff_id else []))
+        await self.table('users').delete().eq('id', user_id).execute()
+
+    # Appointments / reminders
+    @on_client_loop
+    async def get_appointments_for_doctor_on_date(self, doctor_id: str, date_str: str):
+        """Return appointments for a doctor on a specific date (ISO date prefix)."""
+        try:
+            resp = await (
+                self.table('appointments')
+                .select('*')
+                .eq('doctor_id', doctor_id)
+                .like('appointment_date', f'{date_str}%')
+                .execute()
+            )
+            return resp.data if resp.data else []
+        except Exception as e:
+            raise Exception(f'Error fetching appointments: {str(e)}')
+
+    @on_client_loop
+    async def get_day_bitmaps(self, doctor_ids: list, days: list):
+        """SupabaseService.get_day_bitmaps with the four loading queries issued together."""
+        bitmaps, missing = supabase_service.cached_day_bitmaps(doctor_ids, days)
+        if missing:
+            seq = slot_changes.last_seq()
+            doctors, avail, weekly, appts = await asyncio.gather(
+                self.table('doctors').select('*').in_('id', missing).execute(),
+                self.table('doctor_availability').select('*').in_('doctor_id', missing)
+                .gte('available_date', days[0]).lte('available_date', days[-1]).execute(),
+                self.table('doctor_available_days').select('doctor_id, day_of_week, start_time, end_time')
+                .in_('doctor_id', missing).execute(),
+                self.table('appointments').select('doctor_id, appointment_date').in_('doctor_id', missing)
+                .gte('appointment_date', days[0]).lt('appointment_date', next_day(days[-1])).execute(),
+            )
+            loaded = build_day_bitmaps(missing, days, doctors.data or [], avail.data or [], weekly.data or [], appts.data or [])
+            supabase_service.store_day_bitmaps(loaded, loaded_after=seq)
+            bitmaps.update(loaded)
+        return bitmaps
+
+    @on_client_loop
+    async def get_available_slots(self, doctor_id: str, date_str: str):
+        """Free slot starts (ISO strings) for a doctor on a date, read from the slot index."""
+        try:
+            days = date_range(date_str)
+            bitmap = (await self.get_day_bitmaps([doctor_id], days)).get((str(doctor_id), date_str))
+            return bitmap.free_starts() if bitmap is not None else []
+        except Exception as e:
+            raise Exception(f'Error computing slots: {str(e)}')
+
+    @on_client_loop
+    async def get_availability_calendar(self, doctor_ids: list, date_from: str, date_to: str):
+        """Free slots per doctor and day over a date range (see calendar_from_bitmaps), from the slot index."""
+        try:
+            days = date_range(date_from, date_to, max_days=MAX_CALENDAR_DAYS)
+            return calendar_from_bitmaps(doctor_ids, days, await self.get_day_bitmaps(doctor_ids, days))
+        except Exception as e:
+            raise Exception(f'Error building calendar: {str(e)}')
+
+    @on_client_loop
+    async def find_next_free_slot(self, doctor_id: str, after: str, days: int = MAX_CALENDAR_DAYS):
+        """First free slot start (ISO) at or after ``after`` within ``days`` days, or None."""
+        try:
+            day_list = days_from(after[:10], days, max_days=MAX_CALENDAR_DAYS)
+            return next_free_slot(await self.get_day_bitmaps([doctor_id], day_list), doctor_id, day_list, after)
+        except Exception as e:
+            raise Exception(f'Error finding next free slot: {str(e)}')
+
+    @on_client_loop
+    async def get_reminders_for_user(self, user_id: str):
+        """List reminders for a user."""
+        try:
+            resp = await self.table('reminders').select('*').eq('user_id', user_id).execute()
+            return resp.data if resp.data else []
+        except Exception as e:
+            raise Exception(f'Error listing reminders: {str(e)}')
+
+
+async_supabase_service = AsyncSupabaseService()
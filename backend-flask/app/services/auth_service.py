@@ -1,12 +1,22 @@
-import bcrypt
+import hashlib
 import jwt
+import time
 from datetime import datetime, timedelta
 from app.config.config import get_config
 from app.services.supabase_service import supabase_service
+from app.services.revocation_service import revocation_list
+from app.services.password_hasher import password_hasher
+from app.services.code_store import code_store
+from app.utils.ttl_cache import TTLCache
 import secrets
 
 config = get_config()
 
+# Claims of tokens that already passed signature verification, keyed by the token's
+# SHA-256 and kept until the token's own exp. Only valid tokens are inserted and the
+# LRU bound caps memory, so forged or junk tokens cannot grow it.
+_verified_tokens = TTLCache(maxsize=config.JWT_VERIFY_CACHE_SIZE, ttl=0)
+
 class AuthService:
     """Service for authentication operations"""
 
@@ -52,36 +62,85 @@ class AuthService:
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash a password using bcrypt"""
-        salt = bcrypt.gensalt(rounds=10)
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        """Hash a password using bcrypt (on the hashing pool, at the calibrated cost)"""
+        return password_hasher.hash(password)
     
     @staticmethod
     def compare_password(password: str, hashed_password: str) -> bool:
         """Compare a password with its hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        return password_hasher.verify(password, hashed_password)
+
+    @staticmethod
+    def _store_password_hash(user_id: str, password_hash: str):
+        try:
+            supabase_service.update_user(user_id, {'password_hash': password_hash})
+        except Exception as e:
+            print(f"Password rehash failed for {user_id}: {str(e)}")
+    
+    @staticmethod
+    def legacy_tokens_accepted() -> bool:
+        """Whether tokens without a 'typ' claim (pre refresh-token scheme) are still honoured."""
+        cutoff = datetime.fromisoformat(config.LEGACY_TOKEN_CUTOFF)
+        return datetime.utcnow() < cutoff.replace(tzinfo=None)
     
     @staticmethod
-    def generate_token(user_id: str, role: str, session_nonce: int = 0) -> str:
-        """Generate a JWT token"""
+    def generate_access_token(user: dict) -> str:
+        """Generate a short-lived access token carrying the claims auth_required checks.
+
+        ``iat`` is kept fractional so a revocation and a login in the same second
+        are ordered correctly.
+        """
+        now = time.time()
         payload = {
-            'user_id': user_id,
-            'role': role,
-            'session_nonce': session_nonce,
-            'iat': datetime.utcnow(),
-            'exp': datetime.utcnow() + config.JWT_ACCESS_TOKEN_EXPIRES
+            'typ': 'access',
+            'user_id': user['id'],
+            'role': user.get('role', 'patient'),
+            'session_nonce': user.get('session_nonce', 0),
+            'is_active': bool(user.get('is_active')),
+            'email': user.get('email'),
+            'phone': user.get('phone'),
+            'first_name': user.get('first_name'),
+            'last_name': user.get('last_name'),
+            'iat': now,
+            'exp': int(now + config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds()),
         }
         return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm='HS256')
-    
+
+    @staticmethod
+    def generate_refresh_token(user: dict) -> str:
+        """Generate a long-lived refresh token, exchangeable at /api/auth/refresh"""
+        now = time.time()
+        payload = {
+            'typ': 'refresh',
+            'user_id': user['id'],
+            'session_nonce': user.get('session_nonce', 0),
+            'jti': secrets.token_hex(16),
+            'iat': now,
+            'exp': int(now + config.JWT_REFRESH_TOKEN_EXPIRES.total_seconds()),
+        }
+        return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm='HS256')
+
     @staticmethod
     def verify_token(token: str) -> dict:
-        """Verify and decode a JWT token"""
+        """Verify and decode a JWT token (signature checked once per token per worker)"""
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        claims = _verified_tokens.get(key)
+        if claims is not None:
+            return dict(claims)
         try:
-            return jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
+            claims = jwt.decode(token, config.JWT_SECRET_KEY, algorithms=['HS256'])
         except jwt.ExpiredSignatureError:
             raise Exception('Token has expired')
         except jwt.InvalidTokenError:
             raise Exception('Invalid token')
+        remaining = claims.get('exp', 0) - time.time()
+        if remaining > 0:
+            _verified_tokens.set(key, claims, ttl=remaining)
+        return dict(claims)
+
+    @staticmethod
+    def token_cache_stats():
+        return _verified_tokens.stats()
     
     @staticmethod
     def register(user_data: dict, admin_create: bool = False):
@@ -94,16 +153,12 @@ class AuthService:
         if role == 'ambulance_staff':
             role = 'ambulance'
         
-        # Check if user already exists
-        if email:
-            existing_user = supabase_service.find_user_by_email(email)
-            if existing_user:
-                raise Exception('Email already registered')
-        
-        if phone:
-            existing_user = supabase_service.find_user_by_phone(phone)
-            if existing_user:
-                raise Exception('Phone number already registered')
+        # Check if user already exists (email and phone in one round trip)
+        taken = supabase_service.find_existing_identifiers(email=email, phone=phone)
+        if 'email' in taken:
+            raise Exception('Email already registered')
+        if 'phone' in taken:
+            raise Exception('Phone number already registered')
         
         # Hash password
         password_hash = AuthService.hash_password(password)
@@ -154,10 +209,8 @@ class AuthService:
     @staticmethod
     def login(identifier: str, password: str):
         """Login a user"""
-        # Find user by email or phone
-        user = supabase_service.find_user_by_email(identifier)
-        if not user:
-            user = supabase_service.find_user_by_phone(identifier)
+        # Find user by email or phone (one query)
+        user = supabase_service.find_user_by_identifier(identifier, projection='login')
         
         if not user:
             raise Exception('Invalid credentials')
@@ -170,13 +223,18 @@ class AuthService:
         if not AuthService.compare_password(password, user.get('password_hash', '')):
             raise Exception('Invalid credentials')
         
+        # Upgrade hashes stored at an older cost while we have the plaintext
+        if password_hasher.needs_rehash(user.get('password_hash', '')):
+            user_id = user['id']
+            password_hasher.schedule_rehash(password, lambda h: AuthService._store_password_hash(user_id, h))
+        
         # Check if email is verified (skip for admin users)
         if not user.get('email_verified') and user.get('email') and user.get('role') != 'admin':
             raise Exception('Email not verified. Please verify your email.')
         
-        # Generate token with session nonce
-        session_nonce = user.get('session_nonce', 0)
-        token = AuthService.generate_token(user['id'], user.get('role', 'patient'), session_nonce)
+        # Access token for requests, refresh token to renew it (both bound to the session nonce)
+        token = AuthService.generate_access_token(user)
+        refresh_token = AuthService.generate_refresh_token(user)
         
         # Remove sensitive data
         user.pop('password_hash', None)
@@ -184,8 +242,54 @@ class AuthService:
         
         return {
             'user': user,
-            'token': token
+            'token': token,
+            'refresh_token': refresh_token,
+            'expires_in': int(config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds())
+        }
+
+    @staticmethod
+    def refresh(refresh_token: str):
+        """Exchange a refresh token for a new access token and a new refresh token.
+
+        This is the one place the session is re-checked against the database, so
+        logout-all (nonce bump), deactivation and deletion end refreshes too. Refresh
+        tokens are single-use: the presented one is revoked, and presenting it again
+        (a replay, or a second concurrent refresh) fails.
+        """
+        decoded = AuthService.verify_token(refresh_token)
+        if decoded.get('typ') != 'refresh':
+            raise Exception('Invalid refresh token')
+        if revocation_list.is_token_revoked(decoded.get('jti')):
+            raise Exception('Session has been invalidated. Please login again.')
+
+        user = supabase_service.find_user_by_id(decoded['user_id'], projection='auth')
+        if not user:
+            raise Exception('User no longer exists')
+        if decoded.get('session_nonce', 0) != user.get('session_nonce', 0):
+            raise Exception('Session has been invalidated. Please login again.')
+        if not user.get('is_active'):
+            raise Exception('User account is deactivated')
+        if not revocation_list.consume_token(decoded.get('jti'), decoded['exp']):
+            raise Exception('Session has been invalidated. Please login again.')
+
+        return {
+            'token': AuthService.generate_access_token(user),
+            'refresh_token': AuthService.generate_refresh_token(user),
+            'expires_in': int(config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds())
         }
+
+    @staticmethod
+    def logout(refresh_token: str = None):
+        """Revoke the session's refresh token; its access token lapses on its own."""
+        if not refresh_token:
+            return
+        try:
+            decoded = jwt.decode(refresh_token, config.JWT_SECRET_KEY, algorithms=['HS256'],
+                                 options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            return
+        if decoded.get('typ') == 'refresh' and decoded.get('exp', 0) > time.time():
+            revocation_list.revoke_token(decoded.get('jti'), decoded['exp'])
     
     @staticmethod
     def verify_email(email: str, code: str):
@@ -260,20 +364,9 @@ class AuthService:
         if not user:
             raise Exception('User not found')
         
-        # Generate reset code (stored as-is; column is varchar(6))
+        # Generate reset code (6 digits; fits the varchar(6) column of the database store)
         reset_code = AuthService.generate_reset_code()
-        from datetime import timezone
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
-        
-        # Create reset token record
-        supabase_service.create_password_reset_token({
-            'user_id': user['id'],
-            'reset_code': reset_code,
-            'expires_at': expires_at.isoformat(),
-            'is_used': False,
-            'token_type': 'password_reset',
-            'created_at': datetime.now(timezone.utc).isoformat()
-        })
+        code_store.issue(user['id'], 'password_reset', reset_code, ttl_seconds=3600)
         
         return {
             'message': 'Password reset link sent to email',
@@ -283,9 +376,8 @@ class AuthService:
     @staticmethod
     def reset_password(user_id: str, reset_code: str, new_password: str):
         """Reset user password"""
-        # Verify token
-        token = supabase_service.find_valid_reset_token(user_id, reset_code)
-        if not token:
+        # Verify and consume the code (usable once)
+        if not code_store.consume(user_id, 'password_reset', reset_code):
             raise Exception('Invalid or expired reset token')
         
         # Hash new password
@@ -296,48 +388,34 @@ class AuthService:
             'password_hash': password_hash
         })
         
-        # Mark token as used
-        supabase_service.mark_reset_token_as_used(token['id'])
-        
         return {'message': 'Password reset successfully'}
 
     @staticmethod
     def request_email_change(user_id: str, new_email: str):
         """Send a verification code to the new email and store a short-lived token."""
-        user = supabase_service.find_user_by_id(user_id)
+        user = supabase_service.find_user_by_id(user_id, projection='auth')
         if not user:
             raise Exception('User not found')
 
-        existing = supabase_service.find_user_by_email(new_email)
+        existing = supabase_service.find_user_by_email(new_email, projection='id')
         if existing and existing.get('id') != user_id:
             raise Exception('Email already registered')
 
         code = AuthService.generate_reset_code()
-        from datetime import timezone
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
-
-        supabase_service.create_password_reset_token({
-            'user_id': user_id,
-            'reset_code': code,
-            'expires_at': expires_at.isoformat(),
-            'is_used': False,
-            'token_type': 'email_change',
-            'created_at': datetime.now(timezone.utc).isoformat(),
-        })
+        code_store.issue(user_id, 'email_change', code, ttl_seconds=600)
 
         return {'code': code, 'new_email': new_email}
 
     @staticmethod
     def verify_email_change(user_id: str, new_email: str, code: str):
         """Verify the code and update the user's primary email."""
-        token = supabase_service.find_valid_token(user_id=user_id, code=code, token_type='email_change')
-        if not token:
-            raise Exception('Invalid or expired verification code')
-
-        existing = supabase_service.find_user_by_email(new_email)
+        existing = supabase_service.find_user_by_email(new_email, projection='id')
         if existing and existing.get('id') != user_id:
             raise Exception('Email already registered')
 
+        if not code_store.consume(user_id, 'email_change', code):
+            raise Exception('Invalid or expired verification code')
+
         user = supabase_service.update_user(user_id, {
             'email': new_email,
             'email_verified': True,
@@ -346,8 +424,6 @@ class AuthService:
             'verification_code_expires_at': None,
         })
 
-        supabase_service.mark_reset_token_as_used(token['id'])
-
         user.pop('password_hash', None)
         user.pop('verification_code', None)
 
@@ -356,51 +432,38 @@ class AuthService:
     @staticmethod
     def request_phone_change(user_id: str, new_phone: str):
         """Send a verification code (via email) and store a short-lived token."""
-        user = supabase_service.find_user_by_id(user_id)
+        user = supabase_service.find_user_by_id(user_id, projection='auth')
         if not user:
             raise Exception('User not found')
 
         if not user.get('email'):
             raise Exception('Email is required to verify phone changes')
 
-        existing = supabase_service.find_user_by_phone(new_phone)
+        existing = supabase_service.find_user_by_phone(new_phone, projection='id')
         if existing and existing.get('id') != user_id:
             raise Exception('Phone number already registered')
 
         code = AuthService.generate_reset_code()
-        from datetime import timezone
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
-
-        supabase_service.create_password_reset_token({
-            'user_id': user_id,
-            'reset_code': code,
-            'expires_at': expires_at.isoformat(),
-            'is_used': False,
-            'token_type': 'phone_change',
-            'created_at': datetime.now(timezone.utc).isoformat(),
-        })
+        code_store.issue(user_id, 'phone_change', code, ttl_seconds=600)
 
         return {'code': code, 'new_phone': new_phone, 'email': user.get('email')}
 
     @staticmethod
     def verify_phone_change(user_id: str, new_phone: str, code: str):
         """Verify the code and update the user's primary phone."""
-        token = supabase_service.find_valid_token(user_id=user_id, code=code, token_type='phone_change')
-        if not token:
-            raise Exception('Invalid or expired verification code')
-
-        existing = supabase_service.find_user_by_phone(new_phone)
+        existing = supabase_service.find_user_by_phone(new_phone, projection='id')
         if existing and existing.get('id') != user_id:
             raise Exception('Phone number already registered')
 
+        if not code_store.consume(user_id, 'phone_change', code):
+            raise Exception('Invalid or expired verification code')
+
         user = supabase_service.update_user(user_id, {
             'phone': new_phone,
             'phone_verified': True,
             'verification_type': 'phone',
         })
 
-        supabase_service.mark_reset_token_as_used(token['id'])
-
         user.pop('password_hash', None)
         user.pop('verification_code', None)
 
@@ -410,7 +473,7 @@ class AuthService:
     def logout_all(user_id: str):
         """Logout user from all sessions by incrementing session nonce."""
         try:
-            user = supabase_service.find_user_by_id(user_id)
+            user = supabase_service.find_user_by_id(user_id, projection='auth')
             if not user:
                 raise Exception('User not found')
             
@@ -419,6 +482,9 @@ class AuthService:
             
             # Update session nonce to invalidate all old tokens
             updated_user = supabase_service.update_user(user_id, {'session_nonce': new_nonce})
+            # update_user already drops the cached auth user and revokes issued access
+            # tokens; be explicit since this is what makes logout-all effective
+            supabase_service.invalidate_auth_user(user_id, revoke_sessions=True)
             
             return {
                 'status': 'success',
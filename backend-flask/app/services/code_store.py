@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.config.config import get_config
+from app.services.supabase_service import supabase_service
+from app.utils.sqlite_store import SQLiteStore
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS code_digests (
+    user_id TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, purpose)
+);
+CREATE INDEX IF NOT EXISTS code_digests_expires_at ON code_digests (expires_at);
+"""
+
+
+class LocalCodeStore:
+    """Short-lived one-time codes in a SQLite file shared by the node's workers.
+
+    One live code per (user, purpose): issuing a new code replaces the previous
+    one. Consuming is a single conditional DELETE, so a code can be used once even
+    if two workers race on it. A code is dropped after ``max_attempts`` wrong
+    guesses. Only an HMAC of each code (keyed with ``secret``) is stored, so the
+    file alone does not reveal live codes.
+    """
+
+    name = 'local'
+
+    def __init__(self, path: str, max_attempts: int = 5, secret: str = ''):
+        self.store = SQLiteStore(path, _SCHEMA)
+        self.max_attempts = max_attempts
+        self._secret = secret.encode()
+
+    def _digest(self, user_id: str, purpose: str, code: str) -> str:
+        message = f'{user_id}:{purpose}:{code}'.encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def issue(self, user_id: str, purpose: str, code: str, ttl_seconds: float):
+        self.store.execute(
+            'INSERT OR REPLACE INTO code_digests (user_id, purpose, digest, expires_at, attempts) VALUES (?, ?, ?, ?, 0)',
+            (user_id, purpose, self._digest(user_id, purpose, code), time.time() + ttl_seconds),
+        )
+
+    def consume(self, user_id: str, purpose: str, code: str) -> bool:
+        now = time.time()
+        deleted = self.store.execute(
+            'DELETE FROM code_digests WHERE user_id = ? AND purpose = ? AND digest = ? AND expires_at > ?',
+            (user_id, purpose, self._digest(user_id, purpose, code), now),
+        ).rowcount
+        if deleted:
+            return True
+        self.store.execute(
+            'UPDATE code_digests SET attempts = attempts + 1 WHERE user_id = ? AND purpose = ?', (user_id, purpose)
+        )
+        self.store.execute(
+            'DELETE FROM code_digests WHERE user_id = ? AND purpose = ? AND (attempts >= ? OR expires_at <= ?)',
+            (user_id, purpose, self.max_attempts, now),
+        )
+        return False
+
+    def purge_expired(self) -> int:
+        return self.store.execute('DELETE FROM code_digests WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def count(self) -> int:
+        return self.store.execute('SELECT COUNT(*) FROM code_digests').fetchone()[0]
+
+
+class DatabaseCodeStore:
+    """Codes as rows of the password_reset_tokens table (works across hosts).
+
+    Wrong guesses are counted on the user's live rows, which are marked used
+    after ``max_attempts``.
+    """
+
+    name = 'database'
+
+    def __init__(self, max_attempts: int = 5):
+        self.max_attempts = max_attempts
+
+    def issue(self, user_id: str, purpose: str, code: str, ttl_seconds: float):
+        now = datetime.now(timezone.utc)
+        supabase_service.create_password_reset_token({
+            'user_id': user_id,
+            'reset_code': code,
+            'expires_at': (now + timedelta(seconds=ttl_seconds)).isoformat(),
+            'is_used': False,
+            'token_type': purpose,
+            'created_at': now.isoformat(),
+        })
+
+    def has_live(self, user_id: str, purpose: str) -> bool:
+        return supabase_service.has_valid_token(user_id=user_id, token_type=purpose)
+
+    def revoke(self, user_id: str, purpose: str):
+        supabase_service.revoke_tokens(user_id=user_id, token_type=purpose)
+
+    def consume(self, user_id: str, purpose: str, code: str) -> bool:
+        if supabase_service.consume_token(user_id=user_id, code=code, token_type=purpose) is not None:
+            return True
+        try:
+            supabase_service.record_token_attempt(user_id, purpose, self.max_attempts)
+        except Exception as e:
+            print(f"Code store {self.name} failed to count a wrong guess: {str(e)}")
+        return False
+
+
+class CodeStore:
+    """Verification/reset codes, kept in ``primary`` with the database as fallback.
+
+    If the primary store fails to issue, the code goes to the database instead.
+    Consume tries the primary first. The database is asked when the primary
+    raised, or when it rejected the code but the database holds a live code for
+    the user and purpose (issued there while the primary was failing, or before
+    the primary existed). Guesses the database rejects count against its own
+    attempt limit, so a second store does not double the guesses allowed.
+    """
+
+    def __init__(self, primary, fallback=None):
+        self.primary = primary
+        self.fallback = fallback
+
+    def issue(self, user_id: str, purpose: str, code: str, ttl_seconds: float):
+        try:
+            self.primary.issue(user_id, purpose, code, ttl_seconds)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"Code store {self.primary.name} failed, using {self.fallback.name}: {str(e)}")
+            self.fallback.issue(user_id, purpose, code, ttl_seconds)
+            return
+        if self.fallback is not None:
+            # the new code replaces one issued to the fallback earlier
+            try:
+                self.fallback.revoke(user_id, purpose)
+            except Exception as e:
+                print(f"Code store {self.fallback.name} failed to revoke old codes: {str(e)}")
+
+    def consume(self, user_id: str, purpose: str, code: str) -> bool:
+        try:
+            if self.primary.consume(user_id, purpose, code):
+                return True
+            if self.fallback is None or not self.fallback.has_live(user_id, purpose):
+                return False
+        except Exception as e:
+            print(f"Code store {self.primary.name} failed: {str(e)}")
+        return bool(self.fallback and self.fallback.consume(user_id, purpose, code))
+
+    def purge_expired(self) -> int:
+        purge = getattr(self.primary, 'purge_expired', None)
+        return purge() if purge else 0
+
+
+def _build_code_store():
+    database = DatabaseCodeStore(max_attempts=config.CODE_MAX_ATTEMPTS)
+    if config.CODE_STORE == 'database':
+        return CodeStore(database)
+    local = LocalCodeStore(os.path.join(config.RUNTIME_DIR, 'codes.sqlite3'), max_attempts=config.CODE_MAX_ATTEMPTS,
+                           secret=config.SECRET_KEY)
+    return CodeStore(local, fallback=database)
+
+
+code_store = _build_code_store()
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from app.config.config import get_config
+from app.services.supabase_service import supabase_service
+from app.services.revocation_service import revocation_list
+from app.services.code_store import code_store
+from app.utils.sqlite_store import private_directory, private_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process may sweep
+    fcntl = None
+
+config = get_config()
+
+
+class MaintenanceService:
+    """Periodic cleanup of expired/used tokens and node-local stores.
+
+    Database deletes run in batches of ``batch_size`` with ``pause`` seconds
+    between them, and stop after ``max_batches`` so one run never turns into a
+    long burst of writes; whatever is left is picked up by the next run.
+    """
+
+    def __init__(self, batch_size: int = 500, pause: float = 0.5, max_batches: int = 20):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_batches = max_batches
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_report = None
+
+    def sweep_tokens(self, batch_size: int = None, pause: float = None, max_batches: int = None):
+        batch_size = batch_size or self.batch_size
+        pause = self.pause if pause is None else pause
+        max_batches = max_batches or self.max_batches
+        removed = batches = 0
+        complete = False
+        while batches < max_batches:
+            if batches:
+                time.sleep(pause)
+            ids = supabase_service.find_stale_token_ids(limit=batch_size)
+            if not ids:
+                complete = True
+                break
+            removed += supabase_service.delete_tokens_by_ids(ids)
+            batches += 1
+            if len(ids) < batch_size:
+                complete = True
+                break
+        return {'removed': removed, 'batches': batches, 'complete': complete}
+
+    @staticmethod
+    def sweep_local():
+        """Purge expired rows from the node-local SQLite stores."""
+        removed = {
+            'revocations': revocation_list.purge_expired(),
+            'codes': code_store.purge_expired(),
+        }
+        try:
+            from app.middlewares.rate_limit_middleware import limiter
+            sweep = getattr(limiter.storage, 'sweep', None)
+            if sweep:
+                removed['rate_limit_counters'] = sweep()
+        except Exception:
+            pass
+        return removed
+
+    def run_once(self, **kwargs):
+        started = time.time()
+        report = {'password_reset_tokens': None, 'local': None, 'errors': []}
+        try:
+            report['password_reset_tokens'] = self.sweep_tokens(**kwargs)
+        except Exception as e:
+            report['errors'].append(str(e))
+        try:
+            report['local'] = self.sweep_local()
+        except Exception as e:
+            report['errors'].append(str(e))
+        report['table_sizes'] = {'password_reset_tokens': supabase_service.count_rows('password_reset_tokens')}
+        report['duration_seconds'] = round(time.time() - started, 3)
+        report['finished_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        self.last_report = report
+        return report
+
+    def _loop(self, interval: float):
+        lock_path = private_file(os.path.join(private_directory(config.RUNTIME_DIR), 'maintenance.lock'))
+        with open(lock_path, 'a') as lock_file:
+            while not self._stop.wait(interval):
+                # one worker per node sweeps per interval; the lock file's mtime
+                # records the last run so the other workers skip this round
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                try:
+                    if time.time() - os.path.getmtime(lock_path) < interval * 0.9:
+                        continue
+                    os.utime(lock_path)
+                    self.run_once()
+                except Exception as e:
+                    print('Maintenance run failed:', e)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def start(self, interval: float):
+        """Run ``run_once`` every ``interval`` seconds on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name='maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+maintenance_service = MaintenanceService(
+    batch_size=config.MAINTENANCE_BATCH_SIZE,
+    pause=config.MAINTENANCE_BATCH_PAUSE,
+)
@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.gif'}
+
+
+def list_labelled_images(data_dir: str, classes: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """Return (paths, class indices) for images under data_dir/<class name>/.
+
+    Folders that are not one of the model's classes are ignored.
+    """
+    index = {name: i for i, name in enumerate(classes)}
+    paths, labels = [], []
+    for name in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, name)
+        if name not in index or not os.path.isdir(folder):
+            continue
+        for fn in sorted(os.listdir(folder)):
+            if os.path.splitext(fn)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(folder, fn))
+                labels.append(index[name])
+    return paths, np.asarray(labels, dtype=np.int64)
+
+
+def confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray, num_classes: int) -> np.ndarray:
+    """Rows are true classes, columns predicted classes."""
+    flat = np.bincount(y_true * num_classes + y_pred, minlength=num_classes * num_classes)
+    return flat.reshape(num_classes, num_classes)
+
+
+def classification_metrics(cm: np.ndarray, classes: Sequence[str]) -> Dict[str, Any]:
+    """Accuracy plus per-class and macro precision/recall/F1 from a confusion matrix."""
+    cm = cm.astype(np.float64)
+    tp = np.diag(cm)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    total = cm.sum()
+    present = support > 0
+    return {
+        'accuracy': float(tp.sum() / total) if total else 0.0,
+        'macro_precision': float(precision[present].mean()) if present.any() else 0.0,
+        'macro_recall': float(recall[present].mean()) if present.any() else 0.0,
+        'macro_f1': float(f1[present].mean()) if present.any() else 0.0,
+        'per_class': {
+            name: {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(support[i]),
+            }
+            for i, name in enumerate(classes)
+        },
+    }
+
+
+class EvaluationEngine:
+    """Stream a labelled image folder through a batched predictor.
+
+    ``decode`` turns a file path into one model input and runs on a thread pool
+    (PIL releases the GIL while decoding); the next batch is decoded while the
+    current one is being predicted. ``predict_batch`` receives a list of decoded
+    inputs and returns an (N, num_classes) array of scores.
+    """
+
+    def __init__(self, classes: Sequence[str], decode: Callable[[str], Any],
+                 predict_batch: Callable[[List[Any]], np.ndarray], batch_size: int = 32, workers: int = 4):
+        self.classes = list(classes)
+        self.decode = decode
+        self.predict_batch = predict_batch
+        self.batch_size = max(1, int(batch_size))
+        self.workers = max(1, int(workers))
+
+    def _decoded_batches(self, paths: List[str], labels: np.ndarray):
+        def _safe_decode(path):
+            try:
+                return self.decode(path)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='eval-decode') as pool:
+            pending = None
+            for start in range(0, len(paths), self.batch_size):
+                futures = [pool.submit(_safe_decode, p) for p in paths[start:start + self.batch_size]]
+                if pending is not None:
+                    yield pending[0], [f.result() for f in pending[1]]
+                pending = (labels[start:start + self.batch_size], futures)
+            if pending is not None:
+                yield pending[0], [f.result() for f in pending[1]]
+
+    def evaluate(self, data_dir: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        paths, labels = list_labelled_images(data_dir, self.classes)
+        y_true, y_pred = [], []
+        skipped = 0
+        for batch_labels, inputs in self._decoded_batches(paths, labels):
+            keep = [i for i, x in enumerate(inputs) if x is not None]
+            skipped += len(inputs) - len(keep)
+            if not keep:
+                continue
+            scores = np.asarray(self.predict_batch([inputs[i] for i in keep]))
+            y_true.append(batch_labels[keep])
+            y_pred.append(scores.argmax(axis=1))
+
+        n = len(self.classes)
+        if y_true:
+            cm = confusion_matrix(np.concatenate(y_true), np.concatenate(y_pred), n)
+        else:
+            cm = np.zeros((n, n), dtype=np.int64)
+        result = classification_metrics(cm, self.classes)
+        result.update({
+            'classes': self.classes,
+            'confusion_matrix': cm.tolist(),
+            'num_images': int(cm.sum()),
+            'skipped_images': skipped,
+            'data_dir': data_dir,
+            'duration_seconds': round(time.perf_counter() - started, 3),
+        })
+        return result
@@ -0,0 +1,97 @@
+import io
+import random
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# popcount per byte value, used when numpy has no bitwise_count (numpy < 2.0)
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class NearDuplicateCache:
+    """Recent detection results indexed by a 64-bit perceptual (difference) hash.
+
+    Re-sent photos that were recompressed, resized or had EXIF stripped hash to the
+    same or nearly the same value, so a lookup scans the ring buffer of recent hashes
+    for the smallest Hamming distance and reuses that result when it is within
+    ``max_distance`` bits.
+    """
+
+    def __init__(self, capacity: int = 4096, max_distance: int = 6, sample_rate: float = 0.0):
+        self.capacity = max(1, int(capacity))
+        self.max_distance = int(max_distance)
+        self.sample_rate = float(sample_rate)
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(self.capacity, dtype=np.uint64)
+        self._results = [None] * self.capacity
+        self._size = 0
+        self._next = 0
+        self._stats = {'lookups': 0, 'hits': 0, 'sampled': 0, 'sample_mismatches': 0}
+
+    @staticmethod
+    def hash_image(image_bytes: bytes) -> int:
+        """Return the 64-bit dHash of an image (9x8 greyscale, adjacent-pixel gradients)."""
+        from PIL import Image, ImageOps
+
+        img = Image.open(io.BytesIO(image_bytes))
+        # phones often rotate via EXIF; apply it so stripped copies hash the same
+        img = ImageOps.exif_transpose(img).convert('L').resize((9, 8), Image.LANCZOS)
+        px = np.asarray(img, dtype=np.int16)
+        bits = (px[:, 1:] > px[:, :-1]).reshape(-1)
+        return int(np.packbits(bits).view('>u8')[0])
+
+    @staticmethod
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(values)
+        return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+    def lookup(self, image_hash: int) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Return (result, distance) for the closest recent hash within range, else None."""
+        with self._lock:
+            self._stats['lookups'] += 1
+            if self._size == 0:
+                return None
+            distances = self._popcount(self._hashes[:self._size] ^ np.uint64(image_hash))
+            slot = int(np.argmin(distances))
+            distance = int(distances[slot])
+            if distance > self.max_distance:
+                return None
+            self._stats['hits'] += 1
+            return dict(self._results[slot]), distance
+
+    def store(self, image_hash: int, result: Dict[str, Any]):
+        with self._lock:
+            slot = self._next
+            self._hashes[slot] = np.uint64(image_hash)
+            self._results[slot] = dict(result)
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        """Drop every entry, e.g. after the model changed."""
+        with self._lock:
+            self._results = [None] * self.capacity
+            self._size = 0
+            self._next = 0
+
+    def should_sample(self) -> bool:
+        """Whether this hit should be re-checked against a full detection."""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record_sample(self, cached_label: str, actual_label: str):
+        with self._lock:
+            self._stats['sampled'] += 1
+            if cached_label != actual_label:
+                self._stats['sample_mismatches'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s['size'] = self._size
+            s['capacity'] = self.capacity
+            s['max_distance'] = self.max_distance
+        s['hit_ratio'] = (s['hits'] / s['lookups']) if s['lookups'] else 0.0
+        s['false_positive_rate'] = (s['sample_mismatches'] / s['sampled']) if s['sampled'] else None
+        return s
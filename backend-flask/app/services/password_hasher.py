@@ -0,0 +1,141 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from app.config.config import get_config
+
+config = get_config()
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool's queue is full."""
+
+
+class PasswordHasher:
+    """bcrypt hashing on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so request threads waiting here let the rest of the
+    worker keep serving while the pool bounds how many hashes burn CPU at once.
+    When more than ``max_workers + max_queue`` hashes are in flight, new ones are
+    refused instead of piling up behind a login burst.
+
+    The cost factor is calibrated once per process to the largest number of rounds
+    (never below ``min_rounds``) whose hash takes at most ``target_ms``.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 64, target_ms: float = 250.0,
+                 min_rounds: int = 10, max_rounds: int = 15, rounds: int = None, timeout: float = 30.0):
+        self.max_workers = max(1, int(max_workers))
+        self.target_ms = float(target_ms)
+        self.min_rounds = int(min_rounds)
+        self.max_rounds = int(max_rounds)
+        self.timeout = timeout
+        self._rounds = max(self.min_rounds, int(rounds)) if rounds else None
+        self._slots = threading.BoundedSemaphore(self.max_workers + max(0, int(max_queue)))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self._stats = {'hashes': 0, 'verifies': 0, 'rehashes': 0, 'rehashes_dropped': 0, 'rejected': 0}
+
+    @property
+    def rounds(self) -> int:
+        if self._rounds is None:
+            self.calibrate()
+        return self._rounds
+
+    def calibrate(self) -> int:
+        """Pick the cost factor for this hardware; each extra round doubles the time."""
+        with self._lock:
+            if self._rounds is not None:
+                return self._rounds
+            salt = bcrypt.gensalt(rounds=self.min_rounds)
+            started = time.perf_counter()
+            bcrypt.hashpw(b'calibration-password', salt)
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            rounds = self.min_rounds
+            while rounds < self.max_rounds and elapsed_ms * 2 <= self.target_ms:
+                rounds += 1
+                elapsed_ms *= 2
+            self._rounds = rounds
+            return rounds
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy('Server is busy, please try again')
+        try:
+            future = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def hash(self, password: str) -> str:
+        self._count('hashes')
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        self._count('verifies')
+        try:
+            return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:
+            # malformed or empty stored hash
+            return False
+
+    @staticmethod
+    def cost_of(hashed: str) -> int:
+        try:
+            return int(hashed.split('$')[2])
+        except (AttributeError, IndexError, ValueError):
+            return 0
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return self.cost_of(hashed) < self.rounds
+
+    def schedule_rehash(self, password: str, store):
+        """Hash ``password`` at the current cost on the pool and pass it to ``store``.
+
+        Does not wait. A rehash takes a pool slot like any hash but never queues
+        for one: when the pool is saturated it is dropped (returns None) and the
+        hash is upgraded at a later login. The hash runs directly on the pool
+        thread (not via ``_run``) so rehashes never wait on slots they occupy.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rehashes_dropped')
+            return None
+        self._count('rehashes')
+
+        def _task():
+            try:
+                salt = bcrypt.gensalt(rounds=self.rounds)
+                store(bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8'))
+            finally:
+                self._slots.release()
+
+        try:
+            return self._pool.submit(_task)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s.update({'rounds': self._rounds, 'target_ms': self.target_ms, 'max_workers': self.max_workers})
+        return s
+
+
+password_hasher = PasswordHasher(
+    max_workers=config.BCRYPT_WORKERS,
+    max_queue=config.BCRYPT_MAX_QUEUE,
+    target_ms=config.BCRYPT_TARGET_MS,
+    rounds=config.BCRYPT_ROUNDS,
+)
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+from app.config.config import get_config
+from app.utils.sqlite_store import SQLiteStore
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revocations (
+    key TEXT PRIMARY KEY,
+    not_before REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS revocations_expires_at ON revocations (expires_at);
+"""
+
+
+class RevocationList:
+    """Revoked sessions, shared by all workers on the node through SQLite.
+
+    Two kinds of entry:
+      * ``user:<id>`` - access tokens for the user issued before ``not_before`` are
+        rejected. Kept only for one access-token lifetime, after which every token
+        it could affect has expired on its own.
+      * ``jti:<id>`` - a single refresh token, kept until that token expires.
+
+    The live set is tiny, so each worker holds a copy in memory and re-reads it at
+    most every ``sync_interval`` seconds; a revocation made in another worker takes
+    effect here within that interval. Revocations made in this worker apply at once.
+    """
+
+    def __init__(self, path: str, sync_interval: float = 1.0, user_ttl: float = 900.0):
+        self.store = SQLiteStore(path, _SCHEMA)
+        self.sync_interval = sync_interval
+        self.user_ttl = user_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._synced_at = 0.0
+
+    def _put(self, key: str, not_before: float, expires_at: float):
+        self.store.execute(
+            'INSERT INTO revocations (key, not_before, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET not_before = MAX(not_before, excluded.not_before), '
+            'expires_at = MAX(expires_at, excluded.expires_at)',
+            (key, not_before, expires_at),
+        )
+        # writes are rare (logout, role change), so prune dead rows here
+        self.store.execute('DELETE FROM revocations WHERE expires_at <= ?', (not_before,))
+        with self._lock:
+            self._entries[key] = max(self._entries.get(key, 0.0), not_before)
+
+    def revoke_user(self, user_id: str):
+        """Reject every access token issued to ``user_id`` up to now."""
+        if not user_id:
+            return
+        now = time.time()
+        self._put(f'user:{user_id}', now, now + self.user_ttl)
+
+    def revoke_token(self, jti: str, expires_at: float):
+        if jti:
+            self._put(f'jti:{jti}', time.time(), float(expires_at))
+
+    def consume_token(self, jti: str, expires_at: float) -> bool:
+        """Revoke a single-use token; True only for the one caller (in any worker) that revoked it first."""
+        if not jti:
+            return False
+        now = time.time()
+        key = f'jti:{jti}'
+        cur = self.store.execute(
+            'INSERT INTO revocations (key, not_before, expires_at) VALUES (?, ?, ?) ON CONFLICT(key) DO NOTHING',
+            (key, now, float(expires_at)),
+        )
+        with self._lock:
+            self._entries[key] = now
+        return cur.rowcount == 1
+
+    def _sync(self):
+        now = time.time()
+        if now - self._synced_at < self.sync_interval:
+            return
+        rows = self.store.execute('SELECT key, not_before FROM revocations WHERE expires_at > ?', (now,)).fetchall()
+        with self._lock:
+            self._entries = dict(rows)
+            self._synced_at = now
+
+    def is_user_revoked(self, user_id: str, issued_at: float) -> bool:
+        self._sync()
+        not_before = self._entries.get(f'user:{user_id}')
+        return not_before is not None and float(issued_at) < not_before
+
+    def is_token_revoked(self, jti: str) -> bool:
+        self._sync()
+        return f'jti:{jti}' in self._entries
+
+    def purge_expired(self) -> int:
+        return self.store.execute('DELETE FROM revocations WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def stats(self):
+        self._sync()
+        return {'entries': len(self._entries), 'sync_interval_seconds': self.sync_interval}
+
+
+revocation_list = RevocationList(
+    os.path.join(config.RUNTIME_DIR, 'revocations.sqlite3'),
+    sync_interval=config.REVOCATION_SYNC_INTERVAL,
+    user_ttl=config.JWT_ACCESS_TOKEN_EXPIRES.total_seconds(),
+)
@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+class ShadowStats:
+    """Running comparison of a candidate model against the live model.
+
+    Latencies are kept in bounded windows so percentiles reflect recent traffic
+    without growing with the number of samples.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.samples = 0
+            self.agreements = 0
+            self.errors = 0
+            self.dropped = 0
+            self._delta_sum = 0.0
+            self._abs_delta_sum = 0.0
+            self._latency = {
+                'live': deque(maxlen=self._window),
+                'candidate': deque(maxlen=self._window),
+            }
+            self._disagreements = deque(maxlen=20)
+
+    def record(self, live: Dict[str, Any], candidate: Dict[str, Any], live_ms: float, candidate_ms: float):
+        with self._lock:
+            self.samples += 1
+            agree = live.get('label') == candidate.get('label')
+            if agree:
+                self.agreements += 1
+            else:
+                self._disagreements.append({'live': live.get('label'), 'candidate': candidate.get('label')})
+            delta = float(candidate.get('confidence') or 0.0) - float(live.get('confidence') or 0.0)
+            self._delta_sum += delta
+            self._abs_delta_sum += abs(delta)
+            self._latency['live'].append(live_ms)
+            self._latency['candidate'].append(candidate_ms)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    @staticmethod
+    def _latency_summary(values) -> Optional[Dict[str, float]]:
+        if not values:
+            return None
+        arr = np.asarray(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+        return {'mean_ms': float(arr.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.samples
+            return {
+                'samples': n,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'agreement_rate': (self.agreements / n) if n else None,
+                'mean_confidence_delta': (self._delta_sum / n) if n else None,
+                'mean_abs_confidence_delta': (self._abs_delta_sum / n) if n else None,
+                'latency': {name: self._latency_summary(list(v)) for name, v in self._latency.items()},
+                'recent_disagreements': list(self._disagreements),
+            }
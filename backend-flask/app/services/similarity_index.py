@@ -0,0 +1,193 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev servers run a single process
+    fcntl = None
+
+
+class SimilarityIndex:
+    """Append-only cosine-similarity index over L2-normalised embeddings.
+
+    Vectors are stored in a memory-mapped matrix (``vectors.bin``) that grows by
+    doubling, and per-row metadata in a JSON-lines sidecar (``meta.jsonl``).
+    Appends never rewrite existing rows, so every worker process can open the same
+    directory and pick up rows written by other workers by tailing the sidecar.
+    """
+
+    SEARCH_BLOCK_ROWS = 65536
+
+    def __init__(self, directory: str, dim: int, dtype: str = 'float32', initial_capacity: int = 1024):
+        self.directory = directory
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = max(1, int(initial_capacity))
+        self._vectors_path = os.path.join(directory, 'vectors.bin')
+        self._meta_path = os.path.join(directory, 'meta.jsonl')
+        self._lock_path = os.path.join(directory, '.lock')
+        self._lock = threading.RLock()
+
+        self._vectors = None
+        self._capacity = 0
+        self._meta: List[Dict[str, Any]] = []
+        self._confirmed = np.zeros(0, dtype=bool)
+        self._meta_offset = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # workers may open a new version's directory at the same time; only one writes index.json
+        with self._file_lock():
+            info_path = os.path.join(directory, 'index.json')
+            if os.path.exists(info_path):
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+                if int(info.get('dim', self.dim)) != self.dim or info.get('dtype', self.dtype.name) != self.dtype.name:
+                    raise Exception(f'Similarity index at {directory} was built with dim={info.get("dim")} dtype={info.get("dtype")}')
+            else:
+                tmp = f'{info_path}.{os.getpid()}.tmp'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump({'dim': self.dim, 'dtype': self.dtype.name}, f)
+                os.replace(tmp, info_path)
+            self._sync()
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._meta)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, 'a') as lf:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _map(self):
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // self._row_bytes()
+        if capacity == self._capacity and self._vectors is not None:
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode='r+', shape=(capacity, self.dim)) if capacity else None
+        self._capacity = capacity
+
+    def _grow(self, needed: int):
+        capacity = max(self._capacity, self.initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(capacity * self._row_bytes())
+        self._capacity = 0
+        self._map()
+
+    def _sync(self):
+        """Pick up rows appended (possibly by another process) since the last sync."""
+        if not os.path.exists(self._meta_path):
+            return
+        if os.path.getsize(self._meta_path) == self._meta_offset:
+            return
+        added = []
+        with open(self._meta_path, 'rb') as f:
+            f.seek(self._meta_offset)
+            for line in f:
+                # a partially written trailing line is picked up on the next sync
+                if not line.endswith(b'\n'):
+                    break
+                self._meta_offset += len(line)
+                try:
+                    added.append(json.loads(line))
+                except ValueError:
+                    added.append({})
+        if not added:
+            return
+        self._meta.extend(added)
+        self._confirmed = np.concatenate([
+            self._confirmed,
+            np.fromiter((bool(m.get('confirmed')) for m in added), dtype=bool, count=len(added)),
+        ])
+        self._map()
+
+    @staticmethod
+    def _normalise(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm > 0 else v
+
+    def add(self, vector, meta: Dict[str, Any], max_unconfirmed: Optional[int] = None) -> Optional[int]:
+        """Append one embedding with its metadata and return its row number.
+
+        An unconfirmed row is not added (None is returned) once the index already
+        holds ``max_unconfirmed`` of them; confirmed rows are always added.
+        """
+        v = self._normalise(vector)
+        if v.shape[0] != self.dim:
+            raise Exception(f'Embedding has dim {v.shape[0]}, index expects {self.dim}')
+        with self._file_lock():
+            self._sync()
+            if max_unconfirmed is not None and not meta.get('confirmed') \
+                    and len(self._confirmed) - np.count_nonzero(self._confirmed) >= max_unconfirmed:
+                return None
+            row = len(self._meta)
+            self._grow(row + 1)
+            # the mapping is shared, so other processes see the row without an msync
+            self._vectors[row] = v.astype(self.dtype)
+            line = (json.dumps(meta, default=str) + '\n').encode('utf-8')
+            with open(self._meta_path, 'ab') as f:
+                f.write(line)
+            self._sync()
+            return row
+
+    def search(self, vector, k: int = 10, confirmed_only: bool = True) -> List[Dict[str, Any]]:
+        """Return the ``k`` most similar rows as metadata dicts with a ``score`` key.
+
+        Scores are computed block by block so float16 storage is widened to float32
+        a slice at a time instead of materialising the whole matrix.
+        """
+        q = self._normalise(vector)
+        if q.shape[0] != self.dim:
+            raise Exception(f'Embedding has dim {q.shape[0]}, index expects {self.dim}')
+        with self._lock:
+            self._sync()
+            n = len(self._meta)
+            if n == 0 or k <= 0:
+                return []
+            best_rows = np.empty(0, dtype=np.int64)
+            best_scores = np.empty(0, dtype=np.float32)
+            for start in range(0, n, self.SEARCH_BLOCK_ROWS):
+                stop = min(n, start + self.SEARCH_BLOCK_ROWS)
+                scores = np.asarray(self._vectors[start:stop], dtype=np.float32) @ q
+                if confirmed_only:
+                    scores[~self._confirmed[start:stop]] = -np.inf
+                if stop - start > k:
+                    top = np.argpartition(scores, -k)[-k:]
+                else:
+                    top = np.arange(stop - start)
+                best_rows = np.concatenate([best_rows, top + start])
+                best_scores = np.concatenate([best_scores, scores[top]])
+            order = np.argsort(-best_scores)[:k]
+            results = []
+            for i in order:
+                score = float(best_scores[i])
+                if not np.isfinite(score):
+                    continue
+                row = int(best_rows[i])
+                results.append({**self._meta[row], 'row': row, 'score': score})
+            return results
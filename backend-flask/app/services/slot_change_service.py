@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+from app.config.config import get_config
+from app.utils.sqlite_store import SQLiteStore
+
+config = get_config()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slot_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctor_id TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slot_changes_changed_at ON slot_changes (changed_at);
+"""
+
+
+class SlotChangeLog:
+    """Doctors whose free slots changed, shared by all workers on the node through SQLite.
+
+    Each worker keeps its own slot index; a booking or schedule change appends a
+    row here so the other workers drop that doctor's cached days. Workers poll
+    for rows they have not seen at most every ``sync_interval`` seconds, so a
+    change made in another worker shows up within that interval. Rows older than
+    ``retention`` (at least the slot index TTL) are pruned on write.
+    """
+
+    ALL = '*'
+
+    def __init__(self, path: str, sync_interval: float = 1.0, retention: float = 300.0, origin: str = None):
+        self.store = SQLiteStore(path, _SCHEMA)
+        self.sync_interval = sync_interval
+        self.retention = retention
+        self._origin = origin
+        self._lock = threading.Lock()
+        self._seen = None
+        self._polled_at = 0.0
+
+    @property
+    def origin(self) -> str:
+        # the pid, read per call so a forked worker does not share its parent's
+        return self._origin or str(os.getpid())
+
+    def record(self, doctor_id: str = None):
+        """Note that ``doctor_id``'s slots changed (every doctor's, if None)."""
+        now = time.time()
+        self.store.execute(
+            'INSERT INTO slot_changes (doctor_id, origin, changed_at) VALUES (?, ?, ?)',
+            (str(doctor_id) if doctor_id else self.ALL, self.origin, now),
+        )
+        self.store.execute('DELETE FROM slot_changes WHERE changed_at <= ?', (now - self.retention,))
+
+    def last_seq(self) -> int:
+        return self.store.execute('SELECT COALESCE(MAX(seq), 0) FROM slot_changes').fetchone()[0]
+
+    def changed_since(self, seq: int) -> set:
+        """Doctors changed (by any worker, this one included) after ``seq``."""
+        rows = self.store.execute('SELECT DISTINCT doctor_id FROM slot_changes WHERE seq > ?', (seq,)).fetchall()
+        return {row[0] for row in rows}
+
+    def poll(self) -> set:
+        """Doctors changed by other workers since the last poll; empty between sync intervals."""
+        now = time.time()
+        with self._lock:
+            if now - self._polled_at < self.sync_interval:
+                return set()
+            self._polled_at = now
+            if self._seen is None:
+                # nothing is cached before the first poll
+                self._seen = self.last_seq()
+                return set()
+            rows = self.store.execute(
+                'SELECT seq, doctor_id, origin FROM slot_changes WHERE seq > ? ORDER BY seq', (self._seen,)
+            ).fetchall()
+            if rows:
+                self._seen = rows[-1][0]
+        return {doctor_id for _, doctor_id, origin in rows if origin != self.origin}
+
+    def stats(self):
+        return {'last_seen_seq': self._seen, 'sync_interval_seconds': self.sync_interval}
+
+
+slot_changes = SlotChangeLog(
+    os.path.join(config.RUNTIME_DIR, 'slot_changes.sqlite3'),
+    sync_interval=config.SLOT_CHANGE_SYNC_INTERVAL,
+    retention=max(300.0, config.SLOT_INDEX_TTL * 2),
+)
@@ -1,15 +1,328 @@
 import os
+import re
+import httpx
 from supabase import create_client, Client
 from app.config.config import get_config
+from app.utils.ttl_cache import TTLCache
+from app.utils.http_pool import HttpPoolStats, HTTP2_AVAILABLE, pooled_session, pool_snapshot
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.slot_bitmap import DayBitmap
+from app.services.revocation_service import revocation_list
+from app.services.slot_change_service import SlotChangeLog, slot_changes
 import secrets
 
 config = get_config()
 
+# Fields auth_required needs to authorize a request and populate request.user
+AUTH_USER_FIELDS = ('id', 'role', 'is_active', 'session_nonce', 'email', 'phone', 'first_name', 'last_name')
+# Changing any of these invalidates access tokens already issued to the user
+SESSION_FIELDS = ('role', 'is_active', 'session_nonce')
+
+PROFILE_USER_FIELDS = (
+    'id', 'email', 'phone', 'first_name', 'last_name', 'date_of_birth',
+    'address', 'city', 'state', 'country', 'postal_code',
+    'alternate_email', 'alternate_phone', 'profile_image_url',
+    'role', 'is_active', 'email_verified', 'phone_verified', 'verification_type', 'created_at',
+)
+
+# Named column sets for users queries; hot paths select only what they use so
+# password hashes and codes stay in the database. 'all' selects every column.
+USER_PROJECTIONS = {
+    'id': ('id',),
+    'auth': AUTH_USER_FIELDS,
+    'profile': PROFILE_USER_FIELDS,
+    'login': PROFILE_USER_FIELDS + ('session_nonce', 'password_hash'),
+    'admin_list': ('id', 'email', 'phone', 'first_name', 'last_name', 'role', 'is_active', 'email_verified', 'created_at'),
+}
+
+ROLE_LABELS = {
+    'patient': 'Patient',
+    'doctor': 'Doctor',
+    'admin': 'Admin',
+    'ambulance_staff': 'Ambulance Staff',
+    'ambulance': 'Ambulance'
+}
+
+
+def normalize_phone(phone: str) -> str:
+    """Strip formatting from a phone number: '+1 (555) 123-4567' -> '+15551234567'."""
+    return re.sub(r'[\s\-\.\(\)]', '', phone or '')
+
+
+def _or_eq(column: str, value) -> str:
+    return _or_cmp(column, 'eq', value)
+
+
+def _or_cmp(column: str, op: str, value) -> str:
+    # Double-quote values so commas/parentheses in input can't alter the OR expression
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'{column}.{op}."{escaped}"'
+
+# Role rows and their weekly days embedded in a users select (needs the
+# doctors/ambulance_staff -> users and *_available_days foreign keys)
+PROFILE_EMBED = (
+    'doctors(*,doctor_available_days(day_of_week)),'
+    'ambulance_staff(*,ambulance_staff_available_days(day_of_week))'
+)
+# PROFILE_EMBED naming the foreign-key columns, for schemas with several relationships between the tables
+PROFILE_EMBED_HINTED = (
+    'doctors!user_id(*,doctor_available_days!doctor_id(day_of_week)),'
+    'ambulance_staff!user_id(*,ambulance_staff_available_days!staff_id(day_of_week))'
+)
+
+
+def doctor_profile(doctor: dict, days: list) -> dict:
+    """API shape of a doctor's role profile."""
+    return {
+        'departmentId': doctor.get('department_id'),
+        'specialization': doctor.get('specialization'),
+        'hospitalName': doctor.get('hospital_name'),
+        'licenseNumber': doctor.get('license_number'),
+        'availableFrom': doctor.get('available_from'),
+        'availableTo': doctor.get('available_to'),
+        'availableDays': days,
+    }
+
+
+def ambulance_profile(staff: dict, days: list) -> dict:
+    """API shape of an ambulance staff member's role profile."""
+    return {
+        'staffType': staff.get('staff_type'),
+        'vehicleRegistration': staff.get('vehicle_registration_number'),
+        'assignedCity': staff.get('assigned_city'),
+        'assignedState': staff.get('assigned_state'),
+        'shiftType': staff.get('shift_type'),
+        'availableDays': days,
+    }
+
+
+def compose_profile(user: dict, role_record: dict = None, days: list = None) -> dict:
+    """User row plus its role profile under ``doctor``/``ambulance``, ready to serialize."""
+    user = {k: v for k, v in user.items() if k not in ('password_hash', 'verification_code')}
+    role = user.get('role')
+    # UI compatibility
+    if role == 'ambulance':
+        user['role'] = 'ambulance_staff'
+    if role_record and role == 'doctor':
+        user['doctor'] = doctor_profile(role_record, days or [])
+    if role_record and role in ('ambulance', 'ambulance_staff'):
+        user['ambulance'] = ambulance_profile(role_record, days or [])
+    return user
+
+
+def compose_embedded_profile(row: dict) -> dict:
+    """``compose_profile`` for a users row selected with PROFILE_EMBED."""
+    row = dict(row)
+
+    def first(value):
+        # to-one embeds come back as an object, to-many as a list
+        return (value[0] if value else None) if isinstance(value, list) else value
+
+    def day_list(rows):
+        return [r.get('day_of_week') for r in (rows or []) if r.get('day_of_week')]
+
+    doctor = first(row.pop('doctors', None))
+    staff = first(row.pop('ambulance_staff', None))
+    if row.get('role') == 'doctor' and doctor:
+        doctor = dict(doctor)
+        return compose_profile(row, doctor, day_list(doctor.pop('doctor_available_days', None)))
+    if row.get('role') in ('ambulance', 'ambulance_staff') and staff:
+        staff = dict(staff)
+        return compose_profile(row, staff, day_list(staff.pop('ambulance_staff_available_days', None)))
+    return compose_profile(row)
+
+
+def is_missing_relationship(error: Exception) -> bool:
+    """True if PostgREST could not resolve an embedded resource (no foreign key)."""
+    message = str(error)
+    return 'PGRST200' in message or 'Could not find a relationship' in message
+
+
+def is_ambiguous_relationship(error: Exception) -> bool:
+    """True if PostgREST found several foreign keys for an embedded resource."""
+    message = str(error)
+    return 'PGRST201' in message or 'more than one relationship was found' in message
+
+
+def normalize_department(dept: dict) -> dict:
+    """Department row with ``id``/``name`` filled from the legacy column names."""
+    return {
+        **dept,
+        'id': dept.get('id') or dept.get('department_id'),
+        'name': dept.get('name') or dept.get('department_name') or dept.get('department'),
+    }
+
+
+def _filter_role(query, role):
+    if role == 'ambulance_staff':
+        return query.in_('role', ['ambulance', 'ambulance_staff'])
+    if role:
+        return query.eq('role', role)
+    return query
+
+
+def _session_changed(before, after, updates) -> bool:
+    """Whether an update changed a SESSION_FIELDS value (compared with the stored row).
+
+    Without both rows to compare, any session field in ``updates`` counts as a change.
+    """
+    fields = [f for f in SESSION_FIELDS if f in updates]
+    if not fields:
+        return False
+    if before is None or after is None:
+        return True
+    return any(before.get(f) != after.get(f) for f in fields)
+
+
+def _newest_first(query):
+    # Stable users order (id breaks created_at ties) as one order parameter;
+    # repeated order parameters are not combined by PostgREST
+    query.params = query.params.add('order', 'created_at.desc,id.desc')
+    return query
+
+
+def is_missing_function(error: Exception) -> bool:
+    """True if PostgREST rejected an RPC because the function is not installed."""
+    message = str(error)
+    return 'PGRST202' in message or 'Could not find the function' in message
+
+
+# Longest date range a single slot query may cover
+MAX_SLOT_RANGE_DAYS = 62
+# Calendar requests: days per request and doctors per request
+MAX_CALENDAR_DAYS = 31
+MAX_CALENDAR_DOCTORS = 50
+
+
+def date_range(date_from: str, date_to: str = None, max_days: int = MAX_SLOT_RANGE_DAYS):
+    """ISO dates from date_from to date_to inclusive; ValueError if invalid, reversed or too long."""
+    from datetime import date, timedelta
+
+    start = date.fromisoformat(date_from)
+    end = date.fromisoformat(date_to) if date_to else start
+    count = (end - start).days + 1
+    if count < 1:
+        raise ValueError('date range ends before it starts')
+    if count > max_days:
+        raise ValueError(f'date range is limited to {max_days} days')
+    return [(start + timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def next_day(day: str) -> str:
+    from datetime import date, timedelta
+
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def days_from(day: str, count: int, max_days: int = MAX_SLOT_RANGE_DAYS):
+    """``count`` consecutive ISO dates starting at ``day`` (see date_range)."""
+    from datetime import date, timedelta
+
+    return date_range(day, (date.fromisoformat(day) + timedelta(days=int(count) - 1)).isoformat(), max_days)
+
+
+def group_slots(days: list, rows: list) -> dict:
+    """``{day: [slot, ...]}`` for every day in ``days`` from available_slots rows."""
+    grouped = {day: [] for day in days}
+    for row in rows:
+        grouped.setdefault(str(row['slot_date']), []).append(row['slot_start'])
+    return grouped
+
+
+def build_day_bitmaps(doctor_ids: list, days: list, doctors: list, avail_rows: list, weekly_rows: list, appts: list) -> dict:
+    """``{(doctor_id, day): DayBitmap}`` from rows fetched for the whole range.
+
+    Rows are grouped once, then each doctor-day becomes one bitmap; unknown
+    doctors are left out.
+    """
+    doctors_by_id = {str(d.get('id')): d for d in doctors}
+    avail_by_day, weekly_by_doctor, booked_by_day = {}, {}, {}
+    for row in avail_rows:
+        avail_by_day.setdefault((str(row.get('doctor_id')), str(row.get('available_date'))), []).append(row)
+    for row in weekly_rows:
+        weekly_by_doctor.setdefault(str(row.get('doctor_id')), []).append(row)
+    for row in appts:
+        start = row.get('appointment_date')
+        if start:
+            booked_by_day.setdefault((str(row.get('doctor_id')), str(start)[:10]), []).append(row)
+
+    bitmaps = {}
+    for doctor_id in doctor_ids:
+        doctor = doctors_by_id.get(str(doctor_id))
+        if doctor is None:
+            continue
+        for day in days:
+            key = (str(doctor_id), day)
+            bitmaps[key] = DayBitmap.from_rows(day, doctor, avail_by_day.get(key, []),
+                                               weekly_by_doctor.get(str(doctor_id), []), booked_by_day.get(key, []))
+    return bitmaps
+
+
+def calendar_from_bitmaps(doctor_ids: list, days: list, bitmaps: dict) -> dict:
+    """``{doctor_id: {day: ['HH:MM', ...]}}``; days without free slots and doctors without bitmaps are left out."""
+    calendar = {}
+    for doctor_id in doctor_ids:
+        by_day = {}
+        for day in days:
+            bitmap = bitmaps.get((str(doctor_id), day))
+            if bitmap is not None and bitmap.free:
+                by_day[day] = bitmap.free_starts('%H:%M')
+        if any((str(doctor_id), day) in bitmaps for day in days):
+            calendar[str(doctor_id)] = by_day
+    return calendar
+
+
+def build_calendar(doctor_ids: list, days: list, doctors: list, avail_rows: list, weekly_rows: list, appts: list) -> dict:
+    """Free slots for every doctor and day from rows fetched for the whole range (see calendar_from_bitmaps)."""
+    return calendar_from_bitmaps(doctor_ids, days, build_day_bitmaps(doctor_ids, days, doctors, avail_rows, weekly_rows, appts))
+
+
+def next_free_slot(bitmaps: dict, doctor_id: str, days: list, after: str = None):
+    """First free slot start (ISO) of ``doctor_id`` over ``days`` at or after ``after``, or None."""
+    for day in days:
+        bitmap = bitmaps.get((str(doctor_id), day))
+        if bitmap is not None and bitmap.free:
+            slot = bitmap.next_free(after if after and after[:10] == day else None)
+            if slot:
+                return slot
+    return None
+
+
+def compute_free_slots(date_str: str, doctor: dict, avail_rows: list, days: list, appts: list):
+    """Free slot start times (ISO strings) for one doctor and date from already-fetched rows.
+
+    ``avail_rows`` are doctor_availability rows for the date; when empty the weekly
+    ``days`` (doctor_available_days rows) apply. Slots whose start matches an
+    appointment_date in ``appts`` are removed.
+    """
+    return DayBitmap.from_rows(date_str, doctor, avail_rows, days, appts).free_starts()
+
+
 class SupabaseService:
     def __init__(self):
         # Validate configuration early to provide actionable errors
         if not config.SUPABASE_URL:
             raise Exception('SUPABASE_URL is not set. Set the SUPABASE_URL environment variable to your Supabase project URL.')
+        self._http_stats = HttpPoolStats()
+        self.client = self._create_client()
+
+        # Short-lived per-process cache of the user fields auth_required checks
+        self._auth_user_cache = TTLCache(maxsize=config.AUTH_USER_CACHE_SIZE, ttl=config.AUTH_USER_CACHE_TTL)
+        # Projections naming a column this schema lacks; these fall back to '*'
+        self._unsupported_projections = set()
+        # Database functions (migrations/) found missing; their callers use the legacy path
+        self._unsupported_rpcs = set()
+        # Embed used for profiles; None once the database rejects it (one query per table then)
+        self._profile_embed = PROFILE_EMBED
+        # Departments and other rarely changing lookup data
+        self._reference_cache = TTLCache(maxsize=64, ttl=config.REFERENCE_CACHE_TTL)
+        # Role -> user count for the admin dashboard; writes adjust it in place
+        self._role_counts = TTLCache(maxsize=1, ttl=config.ROLE_COUNTS_TTL)
+        # (doctor_id, day) -> DayBitmap of free slots; bookings made here update it in place,
+        # changes made by other workers arrive through slot_changes
+        self._slot_index = TTLCache(maxsize=config.SLOT_INDEX_SIZE, ttl=config.SLOT_INDEX_TTL)
+
+    def _create_client(self) -> Client:
         try:
             from urllib.parse import urlparse
             parsed = urlparse(config.SUPABASE_URL)
@@ -18,7 +331,7 @@ class SupabaseService:
             host = config.SUPABASE_URL
 
         try:
-            self.client: Client = create_client(
+            client = create_client(
                 config.SUPABASE_URL,
                 config.SUPABASE_SERVICE_ROLE_KEY
             )
@@ -26,42 +339,174 @@ class SupabaseService:
             # Provide a clearer error when DNS resolution or network fails
             raise Exception(f"Error creating Supabase client (host={host}): {str(e)}")
 
-    def list_users(self, role=None, limit=100, offset=0):
+        # Replace the default PostgREST/storage sessions with tuned, keep-alive pools
+        limits = httpx.Limits(
+            max_connections=config.SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.SUPABASE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(config.SUPABASE_HTTP_READ_TIMEOUT, connect=config.SUPABASE_HTTP_CONNECT_TIMEOUT)
+        postgrest = client.postgrest
+        old = postgrest.session
+        postgrest.session = pooled_session(old, limits, timeout, config.SUPABASE_HTTP2, self._http_stats.hooks('postgrest'))
+        old.close()
+        storage = client.storage
+        old = storage.session
+        storage.session = storage._client = pooled_session(old, limits, timeout, config.SUPABASE_HTTP2, self._http_stats.hooks('storage'))
+        old.close()
+        return client
+
+    @property
+    def client(self) -> Client:
+        # httpx pools must not be shared with a forked child (gunicorn --preload):
+        # each worker builds its own client on first use
+        if self._client_pid != os.getpid():
+            self._client = self._create_client()
+            self._client_pid = os.getpid()
+            self._http_stats.reset()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._client_pid = os.getpid()
+
+    def http_pool_stats(self):
+        stats = {
+            'pid': self._client_pid,
+            'http2': bool(config.SUPABASE_HTTP2 and HTTP2_AVAILABLE),
+            'max_connections': config.SUPABASE_HTTP_MAX_CONNECTIONS,
+            'max_keepalive_connections': config.SUPABASE_HTTP_MAX_KEEPALIVE,
+        }
+        sessions = {}
+        try:
+            sessions['postgrest'] = self._client.postgrest.session
+            sessions['storage'] = self._client.storage.session
+        except AttributeError:
+            pass
+        for name, session in sessions.items():
+            stats[name] = {**pool_snapshot(session), **self._http_stats.counts(name)}
+        return stats
+
+    def _select_users(self, projection: str, build):
+        """Run a users select with a named column projection.
+
+        ``build`` applies filters/ranges to the query. If the database rejects a
+        column of the projection, that projection falls back to ``select('*')``
+        (trimmed to its columns) for the rest of the process.
+        """
+        columns = USER_PROJECTIONS.get(projection)
+        if columns is None or projection in self._unsupported_projections:
+            rows = build(self.client.table('users').select('*')).execute().data or []
+            if columns is None:
+                return rows
+            return [{k: row[k] for k in columns if k in row} for row in rows]
+        try:
+            return build(self.client.table('users').select(','.join(columns))).execute().data or []
+        except Exception as e:
+            if 'column' not in str(e).lower():
+                raise
+            self._unsupported_projections.add(projection)
+            return self._select_users(projection, build)
+
+    # Auth user cache
+    def get_auth_user(self, user_id: str):
+        """Return the auth-relevant fields of a user, served from a short-TTL cache.
+
+        Writes through update_user/delete_user invalidate the entry in this process;
+        other workers pick up the change within AUTH_USER_CACHE_TTL seconds.
+        """
+        def _load():
+            user = self.find_user_by_id(user_id, projection='auth')
+            return {k: user.get(k) for k in AUTH_USER_FIELDS} if user else None
+
+        user = self._auth_user_cache.get_or_load(user_id, _load)
+        return dict(user) if user else None
+
+    def invalidate_auth_user(self, user_id: str, revoke_sessions: bool = False):
+        if user_id:
+            self._auth_user_cache.invalidate(user_id)
+            if revoke_sessions:
+                revocation_list.revoke_user(user_id)
+
+    def auth_cache_stats(self):
+        return self._auth_user_cache.stats()
+
+    def list_users(self, role=None, limit=100, offset=0, projection='admin_list'):
         """List users, optionally filtered by role."""
         try:
-            query = self.client.table('users').select('*')
-            if role:
-                if role == 'ambulance_staff':
-                    query = query.in_('role', ['ambulance', 'ambulance_staff'])
-                else:
-                    query = query.eq('role', role)
-            query = query.range(offset, offset + limit - 1)
-            response = query.execute()
-            return response.data if response.data else []
+            def build(query):
+                return _newest_first(_filter_role(query, role)).range(offset, offset + limit - 1)
+            return self._select_users(projection, build)
         except Exception as e:
             raise Exception(f'Error listing users: {str(e)}')
 
+    def list_users_page(self, role=None, limit=50, cursor=None, projection='admin_list'):
+        """One page of users, newest first, and the cursor of the next page (None on the last page).
+
+        Keyset pagination on (created_at, id): each page is an index range scan
+        after the previous page's last row (migrations/003_users_keyset_index.sql),
+        so deep pages cost the same as the first and rows don't shift between
+        pages when users are added. ``cursor`` comes from a previous call;
+        InvalidCursor is raised for anything else.
+        """
+        after = decode_cursor(cursor, 2) if cursor else None
+        try:
+            def build(query):
+                query = _filter_role(query, role)
+                if after:
+                    created_at, user_id = after
+                    query = self._or(query, [
+                        _or_cmp('created_at', 'lt', created_at),
+                        f"and({_or_cmp('created_at', 'eq', created_at)},{_or_cmp('id', 'lt', user_id)})",
+                    ])
+                return _newest_first(query).limit(limit + 1)
+            rows = self._select_users(projection, build)
+        except Exception as e:
+            raise Exception(f'Error listing users: {str(e)}')
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(str(last.get('created_at')), str(last.get('id')))
+        return rows, next_cursor
+
     # Departments
     def list_departments(self):
-        """List departments (optionally could filter active)."""
+        """List departments, normalized to carry ``id`` and ``name`` (served from the reference cache)."""
         try:
-            resp = self.client.table('departments').select('*').execute()
-            return resp.data if resp.data else []
+            return [dict(d) for d in self._reference_cache.get_or_load('departments', self._load_departments)]
         except Exception as e:
             raise Exception(f'Error listing departments: {str(e)}')
 
+    def _load_departments(self):
+        resp = self.client.table('departments').select('*').execute()
+        return [normalize_department(d) for d in (resp.data or []) if isinstance(d, dict)]
+
     def get_department(self, department_id: str):
         """Get a single department by id."""
         try:
+            for dept in self._reference_cache.get_or_load('departments', self._load_departments):
+                if str(dept.get('id')) == str(department_id):
+                    return dict(dept)
+            # not in the cached list: possibly created since it was loaded
             resp = self.client.table('departments').select('*').eq('id', department_id).single().execute()
-            return resp.data if resp.data else None
+            return normalize_department(resp.data) if resp.data else None
         except Exception:
             return None
 
+    def invalidate_reference_data(self):
+        """Drop cached departments in this process (call after changing them)."""
+        self._reference_cache.clear()
+
+    def reference_cache_stats(self):
+        return self._reference_cache.stats()
+
     def delete_user(self, user_id: str):
         """Delete user by ID."""
         try:
             response = self.client.table('users').delete().eq('id', user_id).execute()
+            self.invalidate_auth_user(user_id, revoke_sessions=True)
             if response.data is not None:
                 return True
             raise Exception('Failed to delete user')
@@ -71,53 +516,88 @@ class SupabaseService:
     def delete_user_cascade(self, user_id: str):
         """Delete a user and related doctor/ambulance records."""
         try:
-            # Doctor records
-            doctor = self.client.table('doctors').select('id').eq('user_id', user_id).execute()
-            doctor_id = doctor.data[0]['id'] if doctor and doctor.data else None
-            if doctor_id:
-                self.client.table('doctor_availability').delete().eq('doctor_id', doctor_id).execute()
-                self.client.table('doctor_available_days').delete().eq('doctor_id', doctor_id).execute()
-                self.client.table('doctors').delete().eq('id', doctor_id).execute()
-
-            # Ambulance staff records
-            staff = self.client.table('ambulance_staff').select('id').eq('user_id', user_id).execute()
-            staff_id = staff.data[0]['id'] if staff and staff.data else None
-            if staff_id:
-                self.client.table('ambulance_staff_available_days').delete().eq('staff_id', staff_id).execute()
-                self.client.table('ambulance_staff').delete().eq('id', staff_id).execute()
-
-            # User
-            self.delete_user(user_id)
+            self.delete_users_cascade([user_id])
             return True
         except Exception as e:
             raise Exception(f'Error deleting user cascade: {str(e)}')
 
+    def delete_users_cascade(self, user_ids):
+        """Delete users and their doctor/ambulance records; returns the number of users deleted.
+
+        Runs as one transactional call to the delete_users_cascade database function
+        (migrations/001_delete_users_cascade.sql). Without the function, each user
+        is deleted table by table.
+        """
+        ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        if not ids:
+            return 0
+        try:
+            roles = self._roles_of(ids) if self.role_counts_cached() else None
+            deleted = None
+            if 'delete_users_cascade' not in self._unsupported_rpcs:
+                try:
+                    resp = self.client.rpc('delete_users_cascade', {'p_user_ids': ids}).execute()
+                    deleted = int(resp.data or 0)
+                except Exception as e:
+                    if not is_missing_function(e):
+                        raise
+                    self._unsupported_rpcs.add('delete_users_cascade')
+            if deleted is None:
+                for uid in ids:
+                    self._delete_user_cascade_legacy(uid)
+                deleted = len(ids)
+            for uid in ids:
+                self.invalidate_auth_user(uid, revoke_sessions=True)
+            self.adjust_deleted_role_counts(roles)
+            if roles is None or 'doctor' in roles:
+                self.invalidate_slot_index()
+            return deleted
+        except Exception as e:
+            raise Exception(f'Error deleting users: {str(e)}')
+
+    def _roles_of(self, user_ids):
+        resp = self.client.table('users').select('id,role').in_('id', list(user_ids)).execute()
+        return [row.get('role') for row in (resp.data or [])]
+
+    def adjust_deleted_role_counts(self, roles):
+        """Decrement cached role counts for deleted users (``roles`` None: counts weren't cached)."""
+        if roles is None:
+            return
+        deltas = {}
+        for role in roles:
+            deltas[role or 'patient'] = deltas.get(role or 'patient', 0) - 1
+        self.adjust_role_counts(deltas)
+
+    def _delete_user_cascade_legacy(self, user_id: str):
+        # Doctor records
+        doctor = self.client.table('doctors').select('id').eq('user_id', user_id).execute()
+        doctor_id = doctor.data[0]['id'] if doctor and doctor.data else None
+        if doctor_id:
+            self.client.table('doctor_availability').delete().eq('doctor_id', doctor_id).execute()
+            self.client.table('doctor_available_days').delete().eq('doctor_id', doctor_id).execute()
+            self.client.table('doctors').delete().eq('id', doctor_id).execute()
+
+        # Ambulance staff records
+        staff = self.client.table('ambulance_staff').select('id').eq('user_id', user_id).execute()
+        staff_id = staff.data[0]['id'] if staff and staff.data else None
+        if staff_id:
+            self.client.table('ambulance_staff_available_days').delete().eq('staff_id', staff_id).execute()
+            self.client.table('ambulance_staff').delete().eq('id', staff_id).execute()
+
+        self.client.table('users').delete().eq('id', user_id).execute()
+
     def user_counts_by_role(self):
         """Get user counts grouped by role."""
         try:
-            # Get all users
-            response = self.client.table('users').select('role').execute()
-            users = response.data if response.data else []
-            
-            # Count by role
-            role_counts = {}
-            for user in users:
-                role = user.get('role', 'patient')
-                role_counts[role] = role_counts.get(role, 0) + 1
+            role_counts = self._role_counts.get_or_load('roles', self._load_role_counts)
             
             # Convert to list format with proper labels
             result = []
-            role_labels = {
-                'patient': 'Patient',
-                'doctor': 'Doctor',
-                'admin': 'Admin',
-                'ambulance_staff': 'Ambulance Staff',
-                'ambulance': 'Ambulance'
-            }
-            
             for role, count in role_counts.items():
+                if count <= 0:
+                    continue
                 result.append({
-                    'role': role_labels.get(role, role.replace('_', ' ').title()),
+                    'role': ROLE_LABELS.get(role, role.replace('_', ' ').title()),
                     'count': count,
                     'role_key': role
                 })
@@ -129,6 +609,99 @@ class SupabaseService:
         except Exception as e:
             raise Exception(f'Error getting user counts: {str(e)}')
 
+    def _load_role_counts(self):
+        """Role -> user count, computed by the database.
+
+        Uses the user_counts_by_role function (migrations/002_user_counts_by_role.sql);
+        without it, one head count per known role (roles outside ROLE_LABELS are
+        then not reported). Users without a role count as patients either way.
+        """
+        if 'user_counts_by_role' not in self._unsupported_rpcs:
+            try:
+                resp = self.client.rpc('user_counts_by_role', {}).execute()
+                return {row.get('role') or 'patient': int(row.get('count') or 0) for row in (resp.data or [])}
+            except Exception as e:
+                if not is_missing_function(e):
+                    raise
+                self._unsupported_rpcs.add('user_counts_by_role')
+        counts = {}
+        for role in ROLE_LABELS:
+            query = self.client.table('users').select('id', count='exact')
+            if role == 'patient':
+                query = self._or(query, [_or_eq('role', role), 'role.is.null'])
+            else:
+                query = query.eq('role', role)
+            counts[role] = query.limit(1).execute().count or 0
+        return counts
+
+    def role_counts_cached(self) -> bool:
+        """True while role counts are cached, i.e. writes need to adjust them."""
+        return self._role_counts.contains('roles')
+
+    def adjust_role_counts(self, deltas: dict):
+        """Apply role -> delta changes to the cached role counts, if cached."""
+        def apply(counts):
+            counts = dict(counts)
+            for role, delta in deltas.items():
+                if role:
+                    counts[role] = counts.get(role, 0) + delta
+            return counts
+        self._role_counts.adjust('roles', apply)
+
+    def profile_embed_failed(self, embed: str, error: Exception):
+        """Handle an error of the embedded profile select; the caller then uses separate queries.
+
+        A missing relationship (PGRST200) disables the embed. An ambiguous one
+        (PGRST201) switches to PROFILE_EMBED_HINTED, and disables the embed if
+        that is ambiguous too. A missing user column is left to the 'profile'
+        projection fallback. Any other error is re-raised.
+        """
+        if is_ambiguous_relationship(error):
+            if embed == PROFILE_EMBED:
+                print('Profile embed is ambiguous (PGRST201), naming the foreign keys instead')
+                self._profile_embed = PROFILE_EMBED_HINTED
+            else:
+                print(f'Profile embed is ambiguous even with foreign-key hints, disabling it: {str(error)}')
+                self._profile_embed = None
+        elif is_missing_relationship(error):
+            self._profile_embed = None
+        elif 'column' not in str(error).lower():
+            raise error
+
+    def get_user_profile(self, user_id: str):
+        """A user's profile with their doctor/ambulance record and available days (None if no user).
+
+        One users select with the role tables embedded (PROFILE_EMBED); databases
+        without the foreign keys get the user, role row and days queried in turn.
+        """
+        try:
+            embed = self._profile_embed
+            if embed and 'profile' not in self._unsupported_projections:
+                try:
+                    resp = (
+                        self.client.table('users')
+                        .select(f"{','.join(PROFILE_USER_FIELDS)},{embed}")
+                        .eq('id', user_id)
+                        .execute()
+                    )
+                    return compose_embedded_profile(resp.data[0]) if resp.data else None
+                except Exception as e:
+                    self.profile_embed_failed(embed, e)
+            user = self.find_user_by_id(user_id, projection='profile')
+            if not user:
+                return None
+            role = user.get('role')
+            record, days = None, []
+            if role == 'doctor':
+                record = self.get_doctor_by_user_id(user_id)
+                days = self.get_doctor_available_days(record.get('id')) if record else []
+            elif role in ('ambulance', 'ambulance_staff'):
+                record = self.get_ambulance_staff_by_user_id(user_id)
+                days = self.get_ambulance_staff_available_days(record.get('id')) if record else []
+            return compose_profile(user, record, days)
+        except Exception as e:
+            raise Exception(f'Error loading profile: {str(e)}')
+
     # --- Doctor helpers ---
     def get_doctor_by_user_id(self, user_id: str):
         try:
@@ -286,6 +859,7 @@ class SupabaseService:
                 # Replace daily availability (no unique constraint in DB)
                 self.client.table('doctor_availability').delete().eq('doctor_id', doctor_id).execute()
                 self.client.table('doctor_availability').insert(availability_row).execute()
+                self.invalidate_slot_index()
 
             return doctor_id
         except Exception as e:
@@ -379,33 +953,98 @@ class SupabaseService:
         try:
             response = self.client.table('users').insert(user_data).execute()
             if response.data:
-                return response.data[0]
+                created = response.data[0]
+                self.adjust_role_counts({created.get('role') or user_data.get('role') or 'patient': 1})
+                return created
             raise Exception('Failed to create user')
         except Exception as e:
             raise Exception(f'Error creating user: {str(e)}')
     
-    def find_user_by_email(self, email: str):
+    @staticmethod
+    def _or(query, clauses):
+        """Apply a PostgREST OR filter (older postgrest-py builders lack ``or_``)."""
+        expr = ','.join(clauses)
+        if hasattr(query, 'or_'):
+            return query.or_(expr)
+        query.params = query.params.add('or', f'({expr})')
+        return query
+
+    def find_user_by_identifier(self, identifier: str, projection: str = 'all'):
+        """Find a user by email or phone (as given or normalized) in one query.
+
+        Matches rank email, then the phone exactly as given, then the normalized
+        phone; ties (which unique columns should rule out) go to the oldest id and
+        are logged.
+        """
+        try:
+            if not identifier:
+                return None
+            clauses = [_or_eq('email', identifier), _or_eq('phone', identifier)]
+            normalized = normalize_phone(identifier) if '@' not in identifier else None
+            if normalized and normalized != identifier:
+                clauses.append(_or_eq('phone', normalized))
+            rows = self._select_users(projection, lambda q: self._or(q, clauses).order('id').limit(3))
+            if not rows:
+                return None
+
+            def rank(row):
+                if row.get('email') == identifier:
+                    return 0
+                return 1 if row.get('phone') == identifier else 2
+
+            best = min(rank(row) for row in rows)
+            matches = [row for row in rows if rank(row) == best]
+            if len(rows) > 1:
+                print(f"Login identifier matched {len(rows)} users {[row.get('id') for row in rows]}; "
+                      f"using {matches[0].get('id')}{' (tie)' if len(matches) > 1 else ''}")
+            return matches[0]
+        except Exception as e:
+            return None
+
+    def find_existing_identifiers(self, email: str = None, phone: str = None) -> set:
+        """Return which of ``email``/``phone`` already belong to a user, in one query."""
+        clauses = []
+        if email:
+            clauses.append(_or_eq('email', email))
+        if phone:
+            clauses.append(_or_eq('phone', phone))
+        if not clauses:
+            return set()
+        try:
+            rows = self.client.table('users').select('id,email,phone')
+            rows = self._or(rows, clauses).limit(2).execute().data or []
+        except Exception as e:
+            raise Exception(f'Error checking existing users: {str(e)}')
+        taken = set()
+        for row in rows:
+            if email and row.get('email') == email:
+                taken.add('email')
+            if phone and row.get('phone') == phone:
+                taken.add('phone')
+        return taken
+
+    def find_user_by_email(self, email: str, projection: str = 'all'):
         """Find user by email"""
         try:
-            response = self.client.table('users').select('*').eq('email', email).execute()
-            return response.data[0] if response.data else None
+            rows = self._select_users(projection, lambda q: q.eq('email', email))
+            return rows[0] if rows else None
         except Exception as e:
             return None
     
-    def find_user_by_phone(self, phone: str):
+    def find_user_by_phone(self, phone: str, projection: str = 'all'):
         """Find user by phone"""
         try:
-            response = self.client.table('users').select('*').eq('phone', phone).execute()
-            return response.data[0] if response.data else None
+            rows = self._select_users(projection, lambda q: q.eq('phone', phone))
+            return rows[0] if rows else None
         except Exception as e:
             return None
     
-    def find_user_by_id(self, user_id: str):
+    def find_user_by_id(self, user_id: str, projection: str = 'all'):
         """Find user by ID"""
         try:
-            response = self.client.table('users').select('*').eq('id', user_id).execute()
-            if response.data:
-                return response.data[0]
+            rows = self._select_users(projection, lambda q: q.eq('id', user_id))
+            if rows:
+                return rows[0]
             return None
         except Exception as e:
             raise Exception(f'Error finding user: {str(e)}')
@@ -413,9 +1052,17 @@ class SupabaseService:
     def update_user(self, user_id: str, updates: dict):
         """Update user by ID"""
         try:
+            previous = None
+            if any(f in updates for f in SESSION_FIELDS):
+                previous = self.find_user_by_id(user_id, projection='auth')
             response = self.client.table('users').update(updates).eq('id', user_id).execute()
-            if response.data:
-                return response.data[0]
+            updated = response.data[0] if response.data else None
+            self.invalidate_auth_user(user_id, revoke_sessions=_session_changed(previous, updated, updates))
+            if updated:
+                previous_role = previous.get('role') if previous else None
+                if previous_role and previous_role != updated.get('role') and self.role_counts_cached():
+                    self.adjust_role_counts({previous_role: -1, updated.get('role'): 1})
+                return updated
             raise Exception('Failed to update user')
         except Exception as e:
             raise Exception(f'Error updating user: {str(e)}')
@@ -423,7 +1070,16 @@ class SupabaseService:
     def update_user_by_email(self, email: str, updates: dict):
         """Update user by email"""
         try:
+            previous = {}
+            if any(f in updates for f in SESSION_FIELDS):
+                rows = self._select_users('auth', lambda q: q.eq('email', email))
+                previous = {str(row.get('id')): row for row in rows}
             response = self.client.table('users').update(updates).eq('email', email).execute()
+            if 'role' in updates:
+                self._role_counts.invalidate('roles')
+            for row in (response.data or []):
+                before = previous.get(str(row.get('id')))
+                self.invalidate_auth_user(row.get('id'), revoke_sessions=_session_changed(before, row, updates))
             if response.data:
                 return response.data[0]
             raise Exception('Failed to update user')
@@ -433,7 +1089,11 @@ class SupabaseService:
     def get_all_users(self, limit: int = 100, offset: int = 0):
         """Get all users with pagination"""
         try:
-            response = self.client.table('users').select('*').range(offset, offset + limit - 1).execute()
+            response = (
+                _newest_first(self.client.table('users').select('*'))
+                .range(offset, offset + limit - 1)
+                .execute()
+            )
             return response.data if response.data else []
         except Exception as e:
             raise Exception(f'Error fetching users: {str(e)}')
@@ -458,7 +1118,9 @@ class SupabaseService:
         """Insert an appointment record and return it."""
         try:
             resp = self.client.table('appointments').insert(appointment).execute()
-            return resp.data[0] if resp.data else None
+            saved = resp.data[0] if resp.data else None
+            self.mark_slot_booked(appointment.get('doctor_id'), appointment.get('appointment_date'))
+            return saved
         except Exception as e:
             raise Exception(f'Error creating appointment: {str(e)}')
 
@@ -500,72 +1162,149 @@ class SupabaseService:
         doctor's daily available_from/available_to and available days (weekday).
         Returns list of ISO datetime strings for slot start times.
         """
-        from datetime import datetime, timedelta
+        return self.get_available_slots_range(doctor_id, date_str, date_str).get(date_str, [])
 
+    def get_available_slots_range(self, doctor_id: str, date_from: str, date_to: str):
+        """Free slot starts per day, ``{'YYYY-MM-DD': [ISO start, ...]}``, for date_from..date_to.
+
+        One call to the available_slots database function
+        (migrations/004_available_slots.sql). Without it, each day is computed
+        from its doctor/availability/appointment rows as before.
+        """
         try:
-            # load doctor profile
-            resp = self.client.table('doctors').select('*').eq('id', doctor_id).single().execute()
-            doctor = resp.data if resp.data else None
+            days = date_range(date_from, date_to)
+            if 'available_slots' not in self._unsupported_rpcs:
+                try:
+                    resp = self.client.rpc('available_slots', {
+                        'p_doctor_id': doctor_id, 'p_from': days[0], 'p_to': days[-1],
+                    }).execute()
+                    return group_slots(days, resp.data or [])
+                except Exception as e:
+                    if not is_missing_function(e):
+                        raise
+                    self._unsupported_rpcs.add('available_slots')
+            return {day: self._get_available_slots_legacy(doctor_id, day) for day in days}
+        except Exception as e:
+            raise Exception(f'Error computing slots: {str(e)}')
 
-            # try to find explicit availability rows for that date
-            avail_resp = (
-                self.client.table('doctor_availability')
-                .select('*')
-                .eq('doctor_id', doctor_id)
-                .eq('available_date', date_str)
-                .execute()
-            )
-            avail_rows = avail_resp.data if avail_resp and avail_resp.data else []
-
-            slots = []
-
-            def build_slots(start_time, end_time, slot_min):
-                nonlocal slots
-                fmt = '%H:%M:%S'
-                start_dt = datetime.strptime(f"{date_str} {start_time}", '%Y-%m-%d %H:%M:%S')
-                end_dt = datetime.strptime(f"{date_str} {end_time}", '%Y-%m-%d %H:%M:%S')
-                cur = start_dt
-                delta = timedelta(minutes=int(slot_min))
-                while cur + delta <= end_dt:
-                    slots.append(cur.isoformat())
-                    cur += delta
-
-            if avail_rows:
-                # use the first (the app upserts single row)
-                a = avail_rows[0]
-                slot_min = a.get('slot_duration_minutes') or 30
-                build_slots(a.get('start_time') or a.get('available_from') or doctor.get('available_from'),
-                            a.get('end_time') or a.get('available_to') or doctor.get('available_to'),
-                            slot_min)
-            else:
-                # fallback to weekly days
-                # check if doctor is available that weekday
-                weekday = datetime.fromisoformat(date_str).weekday()
-                days_resp = self.client.table('doctor_available_days').select('day_of_week, start_time, end_time').eq('doctor_id', doctor_id).execute()
-                days = days_resp.data if days_resp and days_resp.data else []
-                matched = [d for d in days if int(d.get('day_of_week')) == weekday]
-                if matched:
-                    # use first matched row
-                    m = matched[0]
-                    slot_min = doctor.get('slot_duration_minutes') or 30
-                    build_slots(m.get('start_time') or doctor.get('available_from'), m.get('end_time') or doctor.get('available_to'), slot_min)
+    def _get_available_slots_legacy(self, doctor_id: str, date_str: str):
+        # load doctor profile
+        resp = self.client.table('doctors').select('*').eq('id', doctor_id).single().execute()
+        doctor = resp.data if resp.data else None
+
+        # try to find explicit availability rows for that date
+        avail_resp = (
+            self.client.table('doctor_availability')
+            .select('*')
+            .eq('doctor_id', doctor_id)
+            .eq('available_date', date_str)
+            .execute()
+        )
+        avail_rows = avail_resp.data if avail_resp and avail_resp.data else []
+
+        days = []
+        if not avail_rows:
+            days_resp = self.client.table('doctor_available_days').select('day_of_week, start_time, end_time').eq('doctor_id', doctor_id).execute()
+            days = days_resp.data if days_resp and days_resp.data else []
+
+        appts = self.get_appointments_for_doctor_on_date(doctor_id, date_str)
+        return compute_free_slots(date_str, doctor, avail_rows, days, appts)
+
+    def _schedule_rows(self, doctor_ids: list, days: list):
+        """Doctors, availability, weekly days and appointments rows for a range (see build_day_bitmaps)."""
+        doctors = self.client.table('doctors').select('*').in_('id', doctor_ids).execute().data or []
+        avail = (
+            self.client.table('doctor_availability').select('*').in_('doctor_id', doctor_ids)
+            .gte('available_date', days[0]).lte('available_date', days[-1]).execute().data or []
+        )
+        weekly = (
+            self.client.table('doctor_available_days').select('doctor_id, day_of_week, start_time, end_time')
+            .in_('doctor_id', doctor_ids).execute().data or []
+        )
+        appts = (
+            self.client.table('appointments').select('doctor_id, appointment_date').in_('doctor_id', doctor_ids)
+            .gte('appointment_date', days[0]).lt('appointment_date', next_day(days[-1])).execute().data or []
+        )
+        return doctors, avail, weekly, appts
+
+    def _sync_slot_index(self):
+        """Drop cached days of doctors whose slots other workers changed."""
+        changed = slot_changes.poll()
+        if SlotChangeLog.ALL in changed:
+            self._slot_index.clear()
+        elif changed:
+            self._slot_index.invalidate_where(lambda key: key[0] in changed)
+
+    def cached_day_bitmaps(self, doctor_ids: list, days: list):
+        """Bitmaps in the slot index for these doctor-days, and the doctors missing any day."""
+        self._sync_slot_index()
+        bitmaps, missing = {}, []
+        for doctor_id in doctor_ids:
+            for day in days:
+                bitmap = self._slot_index.get((str(doctor_id), day))
+                if bitmap is None:
+                    if str(doctor_id) not in missing:
+                        missing.append(str(doctor_id))
                 else:
-                    # No available days -> empty
-                    slots = []
+                    bitmaps[(str(doctor_id), day)] = bitmap
+        return bitmaps, missing
+
+    def store_day_bitmaps(self, bitmaps: dict, loaded_after: int = None):
+        """Cache loaded bitmaps, skipping doctors changed since change-log seq ``loaded_after``."""
+        changed = slot_changes.changed_since(loaded_after) if loaded_after is not None else set()
+        if SlotChangeLog.ALL in changed:
+            return
+        for key, bitmap in bitmaps.items():
+            if key[0] not in changed:
+                self._slot_index.set(key, bitmap)
+
+    def get_day_bitmaps(self, doctor_ids: list, days: list):
+        """``{(doctor_id, day): DayBitmap}`` from the slot index; doctors missing a day are loaded in four queries."""
+        bitmaps, missing = self.cached_day_bitmaps(doctor_ids, days)
+        if missing:
+            seq = slot_changes.last_seq()
+            loaded = build_day_bitmaps(missing, days, *self._schedule_rows(missing, days))
+            self.store_day_bitmaps(loaded, loaded_after=seq)
+            bitmaps.update(loaded)
+        return bitmaps
+
+    def mark_slot_booked(self, doctor_id: str, slot_start: str):
+        """Clear a booked slot's bit in this worker's slot index and tell the node's other workers."""
+        if doctor_id and isinstance(slot_start, str):
+            self._slot_index.adjust((str(doctor_id), slot_start[:10]), lambda bitmap: bitmap.book(slot_start))
+            self._record_slot_change(doctor_id)
+
+    def invalidate_slot_index(self):
+        """Drop every cached doctor-day in every worker on the node (call after changing doctors' schedules)."""
+        self._slot_index.clear()
+        self._record_slot_change(None)
+
+    @staticmethod
+    def _record_slot_change(doctor_id):
+        try:
+            slot_changes.record(doctor_id)
+        except Exception as e:
+            # other workers still catch up within SLOT_INDEX_TTL
+            print(f'Could not record slot change: {str(e)}')
 
-            # remove slots that are already booked
-            appts = self.get_appointments_for_doctor_on_date(doctor_id, date_str)
-            booked_starts = set()
-            for a in appts:
-                ad = a.get('appointment_date')
-                if ad:
-                    # normalize prefix
-                    booked_starts.add(ad)
+    def slot_index_stats(self):
+        return self._slot_index.stats()
 
-            free = [s for s in slots if s not in booked_starts]
-            return free
+    def get_availability_calendar(self, doctor_ids: list, date_from: str, date_to: str):
+        """Free slots per doctor and day over a date range (see calendar_from_bitmaps), from the slot index."""
+        try:
+            days = date_range(date_from, date_to, max_days=MAX_CALENDAR_DAYS)
+            return calendar_from_bitmaps(doctor_ids, days, self.get_day_bitmaps(doctor_ids, days))
         except Exception as e:
-            raise Exception(f'Error computing slots: {str(e)}')
+            raise Exception(f'Error building calendar: {str(e)}')
+
+    def find_next_free_slot(self, doctor_id: str, after: str, days: int = MAX_CALENDAR_DAYS):
+        """First free slot start (ISO) at or after ``after`` (a date or ISO datetime) within ``days`` days, or None."""
+        try:
+            day_list = days_from(after[:10], days, max_days=MAX_CALENDAR_DAYS)
+            return next_free_slot(self.get_day_bitmaps([doctor_id], day_list), doctor_id, day_list, after)
+        except Exception as e:
+            raise Exception(f'Error finding next free slot: {str(e)}')
 
     def get_due_reminders(self):
         """Return reminders that are scheduled up to now and not yet sent."""
@@ -671,6 +1410,102 @@ class SupabaseService:
         except Exception as e:
             return None
     
+    def consume_token(self, user_id: str, code: str, token_type: str):
+        """Atomically mark a valid, unused token as used; returns it, or None."""
+        try:
+            from datetime import datetime, timezone
+            now = datetime.now(timezone.utc).isoformat()
+            response = (
+                self.client.table('password_reset_tokens')
+                .update({'is_used': True})
+                .eq('user_id', user_id)
+                .eq('reset_code', code)
+                .eq('token_type', token_type)
+                .eq('is_used', False)
+                .gt('expires_at', now)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception:
+            return None
+    
+    def has_valid_token(self, user_id: str, token_type: str) -> bool:
+        """Whether the user has an unused, unexpired token of ``token_type``."""
+        try:
+            from datetime import datetime, timezone
+            now = datetime.now(timezone.utc).isoformat()
+            response = (
+                self.client.table('password_reset_tokens')
+                .select('id')
+                .eq('user_id', user_id)
+                .eq('token_type', token_type)
+                .eq('is_used', False)
+                .gt('expires_at', now)
+                .limit(1)
+                .execute()
+            )
+            return bool(response.data)
+        except Exception:
+            return False
+
+    def revoke_tokens(self, user_id: str, token_type: str):
+        """Mark the user's unused tokens of ``token_type`` as used."""
+        try:
+            (
+                self.client.table('password_reset_tokens')
+                .update({'is_used': True})
+                .eq('user_id', user_id)
+                .eq('token_type', token_type)
+                .eq('is_used', False)
+                .execute()
+            )
+        except Exception as e:
+            raise Exception(f'Error revoking tokens: {str(e)}')
+
+    def record_token_attempt(self, user_id: str, token_type: str, max_attempts: int):
+        """Count a wrong guess on the user's live tokens of ``token_type``.
+
+        A token is marked used once it reaches ``max_attempts`` guesses. Each row is
+        bumped with a compare-and-set on ``attempts`` so concurrent guesses all
+        count. Without the attempts column (migrations/005_token_attempts.sql) the
+        live tokens are marked used on the first wrong guess.
+        """
+        from datetime import datetime, timezone
+        now = datetime.now(timezone.utc).isoformat()
+        table = lambda: self.client.table('password_reset_tokens')
+        try:
+            if 'token_attempts' in self._unsupported_projections:
+                rows = None
+            else:
+                try:
+                    rows = (
+                        table().select('id, attempts').eq('user_id', user_id).eq('token_type', token_type)
+                        .eq('is_used', False).gt('expires_at', now).execute().data or []
+                    )
+                except Exception as e:
+                    if 'column' not in str(e).lower():
+                        raise
+                    self._unsupported_projections.add('token_attempts')
+                    rows = None
+            if rows is None:
+                self.revoke_tokens(user_id, token_type)
+                return
+            for row in rows:
+                seen = row.get('attempts') or 0
+                for _ in range(5):
+                    updated = (
+                        table().update({'attempts': seen + 1, 'is_used': seen + 1 >= max_attempts})
+                        .eq('id', row['id']).eq('attempts', seen).eq('is_used', False).execute().data
+                    )
+                    if updated:
+                        break
+                    current = table().select('attempts, is_used').eq('id', row['id']).execute().data
+                    if not current or current[0].get('is_used'):
+                        break
+                    seen = current[0].get('attempts') or 0
+        except Exception as e:
+            raise Exception(f'Error recording token attempt: {str(e)}')
+
     def mark_reset_token_as_used(self, token_id: str):
         """Mark a reset token as used"""
         try:
@@ -683,6 +1518,35 @@ class SupabaseService:
         except Exception as e:
             raise Exception(f'Error updating token: {str(e)}')
     
+    def find_stale_token_ids(self, limit: int = 500):
+        """Ids of password_reset_tokens rows that are expired or already used (one batch)."""
+        try:
+            from datetime import datetime, timezone
+            now = datetime.now(timezone.utc).isoformat()
+            query = self.client.table('password_reset_tokens').select('id')
+            query = self._or(query, [f'expires_at.lt."{now}"', 'is_used.is.true']).limit(limit)
+            return [row['id'] for row in (query.execute().data or [])]
+        except Exception as e:
+            raise Exception(f'Error finding stale tokens: {str(e)}')
+
+    def delete_tokens_by_ids(self, ids):
+        """Delete password_reset_tokens rows by id; returns the number deleted."""
+        if not ids:
+            return 0
+        try:
+            response = self.client.table('password_reset_tokens').delete().in_('id', list(ids)).execute()
+            return len(response.data or [])
+        except Exception as e:
+            raise Exception(f'Error deleting tokens: {str(e)}')
+
+    def count_rows(self, table: str):
+        """Exact row count of a table without fetching rows (None if unavailable)."""
+        try:
+            response = self.client.table(table).select('id', count='exact').limit(1).execute()
+            return response.count
+        except Exception:
+            return None
+
     def cleanup_expired_tokens(self):
         """Delete expired password reset tokens"""
         try:
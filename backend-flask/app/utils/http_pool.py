@@ -0,0 +1,69 @@
+import threading
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HttpPoolStats:
+    """Request counters for pooled httpx sessions, fed by httpx event hooks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def hooks(self, name: str):
+        def on_request(request):
+            self._bump(name, 'requests')
+
+        def on_response(response):
+            self._bump(name, f'responses_{response.status_code // 100}xx')
+
+        return {'request': [on_request], 'response': [on_response]}
+
+    def _bump(self, name: str, key: str):
+        with self._lock:
+            counts = self._counts.setdefault(name, {})
+            counts[key] = counts.get(key, 0) + 1
+
+    def counts(self, name: str):
+        with self._lock:
+            return dict(self._counts.get(name, {}))
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def pooled_session(old: httpx.Client, limits: httpx.Limits, timeout: httpx.Timeout, http2: bool, event_hooks=None):
+    """A replacement for ``old`` (same class, base URL and headers) with explicit
+    pool limits, keep-alive, timeouts and optionally HTTP/2."""
+    return type(old)(
+        base_url=old.base_url,
+        headers=old.headers,
+        timeout=timeout,
+        limits=limits,
+        http2=http2 and HTTP2_AVAILABLE,
+        follow_redirects=old.follow_redirects,
+        event_hooks=event_hooks,
+    )
+
+
+def pool_snapshot(session: httpx.Client):
+    """Open/idle connection counts of a session's pool (best effort: httpcore internals)."""
+    try:
+        connections = list(session._transport._pool.connections)
+    except AttributeError:
+        return {}
+    idle = sum(1 for c in connections if c.is_idle())
+    http2 = 0
+    for c in connections:
+        try:
+            http2 += 1 if 'HTTP/2' in c.info() else 0
+        except Exception:
+            pass
+    return {'connections': len(connections), 'idle': idle, 'active': len(connections) - idle, 'http2_connections': http2}
@@ -0,0 +1,33 @@
+import base64
+import json
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor was not produced by ``encode_cursor``."""
+
+
+def encode_cursor(*values) -> str:
+    """Opaque cursor for the sort key of the last row of a page."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int):
+    """Sort key values from ``encode_cursor``; ``size`` is the expected number of values."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) and v for v in values):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def page_size(value, default: int = 50, maximum: int = 200) -> int:
+    """Requested page size clamped to [1, maximum]; ``default`` when missing or not a number."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
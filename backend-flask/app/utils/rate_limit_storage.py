@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from limits.storage import Storage
+
+from app.utils.sqlite_store import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counters_expires_at ON counters (expires_at);
+"""
+
+# A counter whose window has passed restarts at the new amount; a live one adds to it
+_UPSERT = """
+INSERT INTO counters (key, value, expires_at) VALUES (:key, :amount, :expires_at)
+ON CONFLICT(key) DO UPDATE SET
+    value = CASE WHEN counters.expires_at <= :now THEN excluded.value ELSE counters.value + excluded.value END,
+    expires_at = CASE WHEN counters.expires_at <= :now OR :elastic THEN excluded.expires_at ELSE counters.expires_at END
+"""
+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window rate-limit counters in a SQLite (WAL) file.
+
+    Every worker on the node opens the same file, so limits hold across gunicorn
+    workers and restarts without running Redis/Memcached. Each hit is one atomic
+    upsert; expired windows are reset in place by that upsert and swept in bulk
+    at most every ``sweep_interval`` seconds.
+
+    URI: ``sqlite:///absolute/path/to/file.sqlite3`` (``sqlite://`` alone uses
+    a file in the system temp directory).
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri: str = 'sqlite://', wrap_exceptions: bool = False, sweep_interval: float = 60.0, **options):
+        path = uri.split('://', 1)[1] if '://' in uri else ''
+        if not path:
+            path = os.path.join(tempfile.gettempdir(), 'healhub', 'ratelimit.sqlite3')
+        self.store = SQLiteStore(path, _SCHEMA)
+        self.sweep_interval = float(sweep_interval)
+        self._swept_at = 0.0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        now = time.time()
+        params = {'key': key, 'amount': amount, 'expires_at': now + expiry, 'now': now, 'elastic': bool(elastic_expiry)}
+        if _HAS_RETURNING:
+            value = self.store.execute(_UPSERT + ' RETURNING value', params).fetchone()[0]
+        else:
+            conn = self.store.connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(_UPSERT, params)
+                value = conn.execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        if now - self._swept_at > self.sweep_interval:
+            self.sweep(now)
+        return value
+
+    def refund(self, key: str, amount: int) -> int:
+        """Subtract ``amount`` from a live counter, never below zero; expired ones are left alone."""
+        return self.store.execute('UPDATE counters SET value = MAX(0, value - ?) WHERE key = ? AND expires_at > ?',
+                                  (amount, key, time.time())).rowcount
+
+    def get(self, key: str) -> int:
+        row = self.store.execute('SELECT value FROM counters WHERE key = ? AND expires_at > ?',
+                                 (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self.store.execute('SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?',
+                                 (key, time.time())).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self.store.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self.store.execute('DELETE FROM counters').rowcount
+
+    def clear(self, key: str) -> None:
+        self.store.execute('DELETE FROM counters WHERE key = ?', (key,))
+
+    def sweep(self, now: float = None) -> int:
+        """Delete counters whose window has ended; returns the number removed."""
+        now = time.time() if now is None else now
+        self._swept_at = now
+        return self.store.execute('DELETE FROM counters WHERE expires_at <= ?', (now,)).rowcount
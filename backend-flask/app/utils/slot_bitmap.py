@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+_ISO = '%Y-%m-%dT%H:%M:%S'
+
+
+def day_window(date_str: str, doctor: dict, avail_rows: list, weekly_rows: list):
+    """(start 'HH:MM:SS', end 'HH:MM:SS', slot minutes) a doctor works on a day, or None.
+
+    A doctor_availability row for the day wins (first row, 30 minute default);
+    otherwise the doctor_available_days row for the weekday (0 = Monday), with the
+    doctor's available_from/available_to and slot_duration_minutes as defaults.
+    """
+    doctor = doctor or {}
+    if avail_rows:
+        a = avail_rows[0]
+        return (a.get('start_time') or a.get('available_from') or doctor.get('available_from'),
+                a.get('end_time') or a.get('available_to') or doctor.get('available_to'),
+                a.get('slot_duration_minutes') or 30)
+    weekday = datetime.fromisoformat(date_str).weekday()
+    matched = [d for d in weekly_rows if int(d.get('day_of_week')) == weekday]
+    if not matched:
+        return None
+    m = matched[0]
+    return (m.get('start_time') or doctor.get('available_from'),
+            m.get('end_time') or doctor.get('available_to'),
+            doctor.get('slot_duration_minutes') or 30)
+
+
+class DayBitmap:
+    """Occupancy of one doctor-day as a bitmap over its slot positions.
+
+    Slot ``i`` starts at ``start + i * step``; bit ``i`` of ``free`` is set while
+    the slot is free. Instances are immutable: ``book`` returns a new bitmap, so
+    one can be shared between threads and swapped atomically in a cache.
+    """
+
+    __slots__ = ('day', 'start', 'step', 'count', 'free')
+
+    def __init__(self, day: str, start: datetime = None, step: timedelta = None, count: int = 0, free: int = None):
+        self.day = day
+        self.start = start
+        self.step = step
+        self.count = count
+        self.free = ((1 << count) - 1) if free is None else free
+
+    @classmethod
+    def from_rows(cls, date_str: str, doctor: dict, avail_rows: list, weekly_rows: list, appts: list):
+        window = day_window(date_str, doctor, avail_rows, weekly_rows)
+        if window is None:
+            return cls(date_str)
+        start_time, end_time, slot_min = window
+        start = datetime.strptime(f"{date_str} {start_time}", '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(f"{date_str} {end_time}", '%Y-%m-%d %H:%M:%S')
+        step = timedelta(minutes=int(slot_min))
+        count = max(0, (end - start) // step)
+        bitmap = cls(date_str, start, step, count)
+        booked = 0
+        for appt in appts:
+            position = bitmap.position(appt.get('appointment_date'))
+            if position is not None:
+                booked |= 1 << position
+        bitmap.free &= ~booked
+        return bitmap
+
+    def position(self, slot_start) -> int:
+        """Slot position of an ISO start ('YYYY-MM-DDTHH:MM:SS'), or None if it is not one."""
+        if not self.count or not isinstance(slot_start, str) or not slot_start.startswith(self.day):
+            return None
+        try:
+            at = datetime.strptime(slot_start, _ISO)
+        except ValueError:
+            return None
+        offset, rest = divmod(at - self.start, self.step)
+        if rest or not 0 <= offset < self.count:
+            return None
+        return offset
+
+    def is_free(self, slot_start: str) -> bool:
+        position = self.position(slot_start)
+        return position is not None and bool(self.free >> position & 1)
+
+    def book(self, slot_start: str) -> 'DayBitmap':
+        position = self.position(slot_start)
+        if position is None:
+            return self
+        return DayBitmap(self.day, self.start, self.step, self.count, self.free & ~(1 << position))
+
+    def free_count(self) -> int:
+        return bin(self.free).count('1')
+
+    def free_positions(self):
+        free = self.free
+        while free:
+            low = free & -free
+            yield low.bit_length() - 1
+            free ^= low
+
+    def free_starts(self, fmt: str = _ISO) -> list:
+        return [(self.start + i * self.step).strftime(fmt) for i in self.free_positions()]
+
+    def next_free(self, after: str = None):
+        """First free slot start at or after the ISO date/datetime ``after`` (the whole day if None)."""
+        free = self.free
+        if after and self.count:
+            at = datetime.fromisoformat(after[:19])
+            if at > self.start:
+                first = -((self.start - at) // self.step)  # ceil((at - start) / step)
+                free &= ~((1 << min(first, self.count)) - 1)
+        if not free:
+            return None
+        return (self.start + ((free & -free).bit_length() - 1) * self.step).strftime(_ISO)
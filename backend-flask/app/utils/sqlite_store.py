@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+
+def private_directory(path: str) -> str:
+    """Create ``path`` (mode 0700) or check an existing one before state is kept in it.
+
+    Node-local stores hold revocations and one-time codes, so the directory must
+    be a real directory owned by this user; one pre-created by someone else (e.g.
+    under a shared /tmp) is refused rather than used. Group/other access is removed.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(f'{path} is not a directory')
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise RuntimeError(f'{path} is owned by another user; set RUNTIME_DIR to a private directory')
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def private_file(path: str) -> str:
+    """Create ``path`` if missing with mode 0600 (SQLite gives its -wal/-shm files the same mode)."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if os.fstat(fd).st_mode & 0o077:
+            os.fchmod(fd, 0o600)
+    finally:
+        os.close(fd)
+    return path
+
+
+class SQLiteStore:
+    """Small node-local SQLite database shared by every worker process on a host.
+
+    Connections are opened lazily per thread and re-opened after a fork (gunicorn
+    preload), since sqlite3 connections must not cross either boundary. WAL mode
+    lets readers in other workers proceed while one worker writes.
+    """
+
+    def __init__(self, path: str, schema: str = '', timeout: float = 5.0):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and getattr(self._local, 'pid', None) == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            private_directory(directory)
+        private_file(self.path)
+        # autocommit: each statement is its own transaction unless wrapped explicitly
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        # Switching a new file to WAL fails with "database is locked" without
+        # waiting on the busy timeout when other processes open it at the same time
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                break
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if self.schema:
+            conn.executescript(self.schema)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def execute(self, sql: str, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql: str, rows):
+        return self.connection().executemany(sql, rows)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and getattr(self._local, 'pid', None) == os.getpid():
+            conn.close()
+        self._local.conn = None
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Entries use the cache-wide ``ttl`` unless ``set`` is given an explicit one.
+    ``maxsize`` bounds memory: the least recently used entry is evicted first.
+    Each process (gunicorn worker) has its own instance, so writers must call
+    ``invalidate`` locally and rely on the TTL to bound staleness elsewhere.
+    Concurrent ``get_or_load`` misses on one key share a single loader call, and a
+    load that overlaps ``invalidate``/``clear`` of its key is returned but not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Event] = {}
+        # key -> [generation, loads in flight]; invalidate bumps the generation
+        self._inflight: Dict[Hashable, list] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'loads': 0, 'coalesced': 0,
+                       'load_seconds': 0.0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self._stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def _set_locked(self, key: Hashable, value: Any, ttl: Optional[float]):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else float(ttl)), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value or call ``loader`` and cache its result.
+
+        ``None`` results are not cached. While one thread loads a key, other
+        threads missing on it wait for that load instead of calling ``loader``
+        themselves (if it fails or returns None they load on their own). Loader
+        time is recorded so ``stats`` can estimate the latency saved by hits.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            pending = self._loading.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._loading[key] = threading.Event()
+            else:
+                self._stats['coalesced'] += 1
+        if not leader:
+            pending.wait()
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            return self._load(key, loader, ttl)
+        try:
+            return self._load(key, loader, ttl)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.set()
+
+    def _load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float]) -> Any:
+        with self._lock:
+            flight = self._inflight.setdefault(key, [0, 0])
+            flight[1] += 1
+            generation = flight[0]
+        started = time.perf_counter()
+        value = _MISSING
+        try:
+            value = loader()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    self._inflight.pop(key, None)
+                self._stats['loads'] += 1
+                self._stats['load_seconds'] += elapsed
+                # invalidated while loading: the value may predate the write that invalidated it
+                if value is not _MISSING and value is not None and flight[0] == generation:
+                    self._set_locked(key, value, ttl)
+        return value
+
+    def contains(self, key: Hashable) -> bool:
+        """True if ``key`` has a live entry; unlike get, not counted as a hit or miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and entry[0] > now
+
+    def adjust(self, key: Hashable, update: Callable[[Any], Any]) -> bool:
+        """Replace a live entry with ``update(value)``, keeping its expiry.
+
+        Returns False (and does nothing) when the key is missing or expired.
+        ``update`` runs under the cache lock and must not block.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                return False
+            self._data[key] = (entry[0], update(entry[1]))
+            return True
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._inflight:
+                self._inflight[key][0] += 1
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self._stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Invalidate every key for which ``predicate(key)`` is true; returns how many entries were dropped."""
+        with self._lock:
+            for key, flight in self._inflight.items():
+                if predicate(key):
+                    flight[0] += 1
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            for flight in self._inflight.values():
+                flight[0] += 1
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            s['size'] = len(self._data)
+        lookups = s['hits'] + s['misses']
+        avg_load_ms = (s.pop('load_seconds') / s['loads'] * 1000.0) if s['loads'] else 0.0
+        s.update({
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hit_rate': (s['hits'] / lookups) if lookups else 0.0,
+            'avg_load_ms': round(avg_load_ms, 3),
+            'estimated_saved_ms': round(s['hits'] * avg_load_ms, 1),
+        })
+        return s
@@ -0,0 +1,50 @@
+-- Cascading user deletion in one transaction.
+--
+-- delete_users_cascade removes users together with their doctor and ambulance
+-- staff records (and those records' availability rows) and returns the number
+-- of users deleted. delete_user_cascade is the single-user form. Both run as
+-- one statement batch inside the function's transaction, so an interrupted
+-- call leaves nothing half-deleted.
+--
+-- Apply with the Supabase SQL editor or `psql "$DATABASE_URL" -f <file>`.
+-- Until it is applied the backend falls back to table-by-table deletes.
+
+create or replace function public.delete_users_cascade(p_user_ids uuid[])
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    deleted integer;
+begin
+    delete from doctor_availability
+        where doctor_id in (select id from doctors where user_id = any(p_user_ids));
+    delete from doctor_available_days
+        where doctor_id in (select id from doctors where user_id = any(p_user_ids));
+    delete from doctors where user_id = any(p_user_ids);
+
+    delete from ambulance_staff_available_days
+        where staff_id in (select id from ambulance_staff where user_id = any(p_user_ids));
+    delete from ambulance_staff where user_id = any(p_user_ids);
+
+    delete from users where id = any(p_user_ids);
+    get diagnostics deleted = row_count;
+    return deleted;
+end;
+$$;
+
+create or replace function public.delete_user_cascade(p_user_id uuid)
+returns boolean
+language sql
+security definer
+set search_path = public
+as $$
+    select public.delete_users_cascade(array[p_user_id]) > 0;
+$$;
+
+-- Only the backend (service role) may call these
+revoke execute on function public.delete_users_cascade(uuid[]) from public, anon, authenticated;
+revoke execute on function public.delete_user_cascade(uuid) from public, anon, authenticated;
+grant execute on function public.delete_users_cascade(uuid[]) to service_role;
+grant execute on function public.delete_user_cascade(uuid) to service_role;
@@ -0,0 +1,17 @@
+-- Per-role user counts for the admin dashboard, grouped in the database so the
+-- backend no longer downloads the role of every user.
+
+create or replace function public.user_counts_by_role()
+returns table (role text, count bigint)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select coalesce(u.role, 'patient') as role, count(*) as count
+    from users u
+    group by 1;
+$$;
+
+revoke execute on function public.user_counts_by_role() from public, anon, authenticated;
+grant execute on function public.user_counts_by_role() to service_role;
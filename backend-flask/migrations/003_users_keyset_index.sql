@@ -0,0 +1,10 @@
+-- Indexes for keyset pagination of the admin user listing
+-- (order by created_at desc, id desc, optionally filtered by role).
+-- CONCURRENTLY avoids locking users while the index builds; run this file
+-- outside a transaction block.
+
+create index concurrently if not exists users_created_at_id_idx
+    on public.users (created_at desc, id desc);
+
+create index concurrently if not exists users_role_created_at_id_idx
+    on public.users (role, created_at desc, id desc);
@@ -0,0 +1,88 @@
+-- Free appointment slots computed in the database.
+--
+-- available_slots(doctor, from, to) returns one row per free slot start for each
+-- day in [from, to], with the same rules as compute_free_slots in
+-- app/services/supabase_service.py:
+--   * a doctor_availability row for the day (start/end, slot length, default 30
+--     minutes) takes precedence;
+--   * otherwise the doctor_available_days row for the weekday (0 = Monday)
+--     applies, with the doctor's available_from/available_to and
+--     slot_duration_minutes as defaults;
+--   * slots starting at an appointment's appointment_date are dropped. Both sides
+--     are compared as timestamp (appointment_date read as wall-clock time in the
+--     session time zone), so '2026-05-01 09:00:00+00' and '2026-05-01T09:00:00'
+--     match whatever the column type or text form.
+-- Optional columns (doctor_availability.available_from/available_to,
+-- doctors.slot_duration_minutes) are read through to_jsonb, so the function
+-- installs whether or not they exist.
+
+create or replace function public.available_slots(p_doctor_id uuid, p_from date, p_to date)
+returns table (slot_date date, slot_start text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with doc as (
+        select * from doctors where id = p_doctor_id
+    ),
+    days as (
+        select d::date as day from generate_series(p_from, p_to, interval '1 day') as d
+    ),
+    windows as (
+        select
+            days.day,
+            coalesce(av.start_time, (to_jsonb(av) ->> 'available_from')::time, doc.available_from) as start_time,
+            coalesce(av.end_time, (to_jsonb(av) ->> 'available_to')::time, doc.available_to) as end_time,
+            coalesce(av.slot_duration_minutes, 30) as slot_minutes
+        from days
+        cross join doc
+        cross join lateral (
+            select * from doctor_availability a
+            where a.doctor_id = p_doctor_id and a.available_date = days.day
+            limit 1
+        ) av
+        union all
+        select
+            days.day,
+            coalesce(wd.start_time, doc.available_from),
+            coalesce(wd.end_time, doc.available_to),
+            coalesce((to_jsonb(doc) ->> 'slot_duration_minutes')::int, 30)
+        from days
+        cross join doc
+        cross join lateral (
+            select * from doctor_available_days w
+            where w.doctor_id = p_doctor_id
+              and w.day_of_week::int = extract(isodow from days.day)::int - 1
+            limit 1
+        ) wd
+        where not exists (
+            select 1 from doctor_availability a
+            where a.doctor_id = p_doctor_id and a.available_date = days.day
+        )
+    ),
+    slots as (
+        select
+            w.day,
+            s as slot_at,
+            to_char(s, 'YYYY-MM-DD"T"HH24:MI:SS') as slot_start
+        from windows w
+        cross join lateral generate_series(
+            w.day + w.start_time,
+            w.day + w.end_time - make_interval(mins => w.slot_minutes),
+            make_interval(mins => w.slot_minutes)
+        ) as s
+        where w.start_time is not null and w.end_time is not null
+    )
+    select s.day, s.slot_start
+    from slots s
+    where not exists (
+        select 1 from appointments ap
+        where ap.doctor_id = p_doctor_id
+          and ap.appointment_date::timestamp = s.slot_at
+    )
+    order by s.day, s.slot_start;
+$$;
+
+revoke execute on function public.available_slots(uuid, date, date) from public, anon, authenticated;
+grant execute on function public.available_slots(uuid, date, date) to service_role;
@@ -0,0 +1,8 @@
+-- Wrong-guess counter for password_reset_tokens.
+--
+-- The code store counts wrong guesses on a user's live tokens and marks a token
+-- used once it reaches CODE_MAX_ATTEMPTS. Until this column exists, a wrong
+-- guess marks the live tokens used straight away.
+
+alter table public.password_reset_tokens
+    add column if not exists attempts integer not null default 0;
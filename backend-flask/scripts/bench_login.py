@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark password verification under a login burst.
+
+Simulates a worker with --threads request threads receiving --logins concurrent
+logins, and reports login latency percentiles plus the latency of a cheap request
+served by the same worker during the burst. Compares inline bcrypt (the old
+behaviour, --mode inline) with the bounded hashing pool (--mode pool).
+
+Usage: python scripts/bench_login.py [--logins 64] [--threads 16] [--mode both]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing the app package needs the usual environment (.env)
+load_dotenv()
+
+from app.services.password_hasher import PasswordHasher, HasherBusy  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def cheap_request_latencies(stop: threading.Event, out: list):
+    # A request that needs the GIL briefly, e.g. a cached auth check + JSON response
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(range(2000))
+        out.append((time.perf_counter() - started) * 1000.0)
+        time.sleep(0.005)
+
+
+def run(mode: str, hasher: PasswordHasher, stored: str, logins: int, threads: int):
+    password = 'CorrectHorse9'
+
+    def login():
+        started = time.perf_counter()
+        try:
+            if mode == 'inline':
+                bcrypt.checkpw(password.encode('utf-8'), stored.encode('utf-8'))
+            else:
+                hasher.verify(password, stored)
+            ok = True
+        except HasherBusy:
+            ok = False
+        return (time.perf_counter() - started) * 1000.0, ok
+
+    stop = threading.Event()
+    cheap = []
+    probe = threading.Thread(target=cheap_request_latencies, args=(stop, cheap), daemon=True)
+    probe.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: login(), range(logins)))
+    wall = time.perf_counter() - started
+    stop.set()
+    probe.join()
+
+    latencies = [ms for ms, ok in results if ok]
+    rejected = sum(1 for _, ok in results if not ok)
+    print(f"[{mode}] {logins} logins on {threads} threads in {wall:.2f}s "
+          f"({len(latencies) / wall:.1f} logins/s, {rejected} rejected)")
+    print(f"  login  p50={percentile(latencies, 50):.0f}ms p95={percentile(latencies, 95):.0f}ms "
+          f"p99={percentile(latencies, 99):.0f}ms")
+    print(f"  cheap  p50={percentile(cheap, 50):.2f}ms p99={percentile(cheap, 99):.2f}ms (n={len(cheap)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=4, help='hashing pool size')
+    parser.add_argument('--queue', type=int, default=64, help='hashing pool queue bound')
+    parser.add_argument('--target-ms', type=float, default=250.0)
+    parser.add_argument('--mode', choices=['inline', 'pool', 'both'], default='both')
+    args = parser.parse_args()
+
+    hasher = PasswordHasher(max_workers=args.workers, max_queue=args.queue, target_ms=args.target_ms)
+    print(f"calibrated bcrypt cost: {hasher.calibrate()} rounds (target {args.target_ms:.0f}ms)")
+    stored = bcrypt.hashpw(b'CorrectHorse9', bcrypt.gensalt(rounds=hasher.rounds)).decode('utf-8')
+
+    for mode in (['inline', 'pool'] if args.mode == 'both' else [args.mode]):
+        run(mode, hasher, stored, args.logins, args.threads)
+
+
+if __name__ == '__main__':
+    main()
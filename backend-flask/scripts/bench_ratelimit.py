@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark the per-request overhead of the rate-limit storage backends.
+
+Each of --procs processes (standing in for gunicorn workers) performs --hits
+fixed-window hits against the same limit key, the way Flask-Limiter does for a
+request. Reports the mean and p99 cost per hit and the total the backend counted
+(memory:// counts per process, so its total never reaches procs * hits).
+
+Usage: python scripts/bench_ratelimit.py [--hits 5000] [--procs 4] [--uri sqlite:///tmp/x.sqlite3]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing the app package needs the usual environment (.env)
+load_dotenv()
+
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import FixedWindowRateLimiter  # noqa: E402
+
+from app.utils.rate_limit_storage import SQLiteStorage  # noqa: E402,F401  (registers sqlite://)
+
+
+def worker(uri, hits, results):
+    storage = storage_from_string(uri)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse('1000000/hour')
+    timings = []
+    for _ in range(hits):
+        started = time.perf_counter()
+        limiter.hit(item, '127.0.0.1', 'bench')
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    results.put((sum(timings), timings[int(len(timings) * 0.99) - 1], storage.get(item.key_for('127.0.0.1', 'bench'))))
+
+
+def run(uri, hits, procs):
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    workers = [multiprocessing.Process(target=worker, args=(uri, hits, results)) for _ in range(procs)]
+    for w in workers:
+        w.start()
+    rows = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - started
+    total = hits * procs
+    mean_us = sum(r[0] for r in rows) / total * 1e6
+    p99_us = max(r[1] for r in rows) * 1e6
+    counted = max(r[2] for r in rows)
+    print(f"{uri:<50} mean={mean_us:7.1f}us/hit p99={p99_us:7.1f}us "
+          f"throughput={total / wall:9.0f} hits/s counted={counted}/{total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hits', type=int, default=5000)
+    parser.add_argument('--procs', type=int, default=4)
+    parser.add_argument('--uri', action='append', help='storage URI(s) to compare')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-ratelimit-')
+    uris = args.uri or ['memory://', f"sqlite://{os.path.join(tmp, 'ratelimit.sqlite3')}"]
+    for uri in uris:
+        run(uri, args.hits, args.procs)
+
+
+if __name__ == '__main__':
+    main()
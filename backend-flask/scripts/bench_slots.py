@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare slot computation in Python (four queries per day) with the available_slots RPC.
+
+Runs against the Supabase project from .env, so the RPC path needs
+migrations/004_available_slots.sql applied. For each path it computes the free
+slots of --doctor for --days days starting at --date, --repeat times, and reports
+mean and p95 latency per call and whether both paths returned the same slots.
+
+Usage: python scripts/bench_slots.py --doctor <doctor uuid> [--date 2024-06-03] [--days 7] [--repeat 10]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# importing the app package needs the usual environment (.env)
+load_dotenv()
+
+from app.services.supabase_service import supabase_service, date_range  # noqa: E402
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def timed(fn, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, timings
+
+
+def report(label, timings):
+    mean_ms = sum(timings) / len(timings) * 1000.0
+    print(f"{label:<32} mean={mean_ms:8.1f}ms p95={percentile(timings, 95) * 1000.0:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doctor', required=True, help='doctors.id to compute slots for')
+    parser.add_argument('--date', default=date.today().isoformat(), help='first day (YYYY-MM-DD)')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    days = date_range(args.date, (date.fromisoformat(args.date) + timedelta(days=args.days - 1)).isoformat())
+
+    legacy, legacy_timings = timed(
+        lambda: {day: supabase_service._get_available_slots_legacy(args.doctor, day) for day in days}, args.repeat)
+    report(f'python, {len(days)} day(s)', legacy_timings)
+
+    supabase_service._unsupported_rpcs.discard('available_slots')
+    rpc, rpc_timings = timed(lambda: supabase_service.get_available_slots_range(args.doctor, days[0], days[-1]), args.repeat)
+    if 'available_slots' in supabase_service._unsupported_rpcs:
+        print('available_slots RPC is not installed; apply migrations/004_available_slots.sql')
+        return
+    report(f'rpc, {len(days)} day(s)', rpc_timings)
+
+    print(f"slots: {sum(len(v) for v in rpc.values())}, identical results: {rpc == legacy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""Delete expired and used password_reset_tokens rows and purge node-local stores.
+
+Deletes run in paced batches so a large backlog never hits the database in one
+burst; rerun (or schedule with cron/Task Scheduler) until it reports complete.
+"""
+import argparse
+import json
+from app import create_app
+from app.services.maintenance_service import maintenance_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean up expired/used tokens')
+    parser.add_argument('--batch-size', type=int, default=None, help='rows deleted per batch')
+    parser.add_argument('--pause', type=float, default=None, help='seconds to wait between batches')
+    parser.add_argument('--max-batches', type=int, default=None, help='stop after this many batches')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        report = maintenance_service.run_once(
+            batch_size=args.batch_size, pause=args.pause, max_batches=args.max_batches
+        )
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+import fnmatch
+import os
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Keep tests off the node-wide runtime files: per-process rate-limit counters and a
+# throwaway directory for the SQLite stores
+os.environ.setdefault('RATELIMIT_STORAGE_URL', 'memory://')
+os.environ.setdefault('RUNTIME_DIR', tempfile.mkdtemp(prefix='healhub-tests-'))
+
+
+def _or_value(raw):
+    if raw == 'null':
+        return None
+    if raw.startswith('"') and raw.endswith('"'):
+        return raw[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return raw
+
+
+def _matches(row, column, op, value):
+    actual = row.get(column)
+    if op == 'eq':
+        return actual == value or (actual is not None and str(actual) == str(value))
+    if op == 'neq':
+        return not _matches(row, column, 'eq', value)
+    if op == 'in':
+        return actual in value
+    if op == 'is':
+        return actual is None if value in (None, 'null') else actual == value
+    if op == 'like':
+        return actual is not None and fnmatch.fnmatchcase(str(actual), str(value).replace('%', '*'))
+    if op == 'or':
+        return any(_matches(row, c, o, v) for c, o, v in value)
+    if actual is None:
+        return False
+    return {'gt': actual > value, 'gte': actual >= value, 'lt': actual < value, 'lte': actual <= value}[op]
+
+
+class FakeQuery:
+    """One PostgREST request against FakePostgrest; filters apply to the table's rows."""
+
+    def __init__(self, client, table, op='select', columns='*', payload=None, count=None):
+        self.client = client
+        self.table = table
+        self.op = op
+        self.columns = columns
+        self.payload = payload
+        self.count = count
+        self.filters = []
+        self.ordering = []
+        self.bounds = None
+        self.one = False
+
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def like(self, column, pattern):
+        return self._filter(column, 'like', pattern)
+
+    def or_(self, expr):
+        """Flat ``col.op.value`` clauses, as built by supabase_service._or."""
+        clauses = []
+        for clause in expr.split(','):
+            column, op, value = clause.split('.', 2)
+            clauses.append((column, op, _or_value(value)))
+        self.or_expr = expr
+        return self._filter(None, 'or', clauses)
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end - start + 1)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def filter_value(self, column, op='eq'):
+        return next((v for c, o, v in self.filters if c == column and o == op), None)
+
+    def execute(self):
+        self.client.calls.append(self)
+        error = self.client.fail(self) if self.client.fail else None
+        if error:
+            raise error
+        rows = self.client.tables.setdefault(self.table, [])
+        if self.op == 'insert':
+            added = [dict(r) for r in (self.payload if isinstance(self.payload, list) else [self.payload])]
+            rows.extend(added)
+            return SimpleNamespace(data=[dict(r) for r in added], count=None)
+        matched = [r for r in rows if all(_matches(r, c, o, v) for c, o, v in self.filters)]
+        if self.op == 'update':
+            for row in matched:
+                row.update(self.payload)
+        elif self.op == 'delete':
+            rows[:] = [r for r in rows if not any(r is m for m in matched)]
+        count = len(matched)
+        for column, desc in reversed(self.ordering):
+            matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        if self.bounds:
+            start, size = self.bounds
+            matched = matched[start:start + size]
+        names = self.columns.replace(' ', '').split(',')
+        if self.op == 'select' and self.columns != '*' and '(' not in self.columns:
+            data = [{k: r.get(k) for k in names} for r in matched]
+        else:
+            data = [dict(r) for r in matched]
+        if self.one:
+            data = data[0] if data else None
+        return SimpleNamespace(data=data, count=count if self.count else None)
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def select(self, columns='*', count=None):
+        return FakeQuery(self.client, self.name, 'select', columns, count=count)
+
+    def insert(self, data):
+        return FakeQuery(self.client, self.name, 'insert', payload=data)
+
+    def update(self, data):
+        return FakeQuery(self.client, self.name, 'update', payload=data)
+
+    def delete(self):
+        return FakeQuery(self.client, self.name, 'delete')
+
+
+class FakePostgrest:
+    """In-memory stand-in for the Supabase client's table() and rpc() builders.
+
+    ``tables`` maps table name -> rows. ``rpcs`` maps function name -> data, a
+    callable(params) returning data, or an exception to raise; unknown functions
+    fail like a database without them (PGRST202). ``fail(query)`` may return an
+    exception for a query to raise. Executed queries are recorded in ``calls``.
+    """
+
+    def __init__(self, tables=None, rpcs=None, fail=None):
+        self.tables = {name: [dict(r) for r in rows] for name, rows in (tables or {}).items()}
+        self.rpcs = dict(rpcs or {})
+        self.fail = fail
+        self.calls = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, name, params):
+        client = self
+
+        class Rpc(FakeQuery):
+            def execute(self):
+                client.calls.append(self)
+                handler = client.rpcs.get(name, _MISSING_FUNCTION)
+                if handler is _MISSING_FUNCTION:
+                    raise Exception(f"{{'code': 'PGRST202', 'message': 'Could not find the function public.{name}'}}")
+                if isinstance(handler, Exception):
+                    raise handler
+                return SimpleNamespace(data=handler(params) if callable(handler) else handler, count=None)
+
+        return Rpc(self, name, 'rpc', payload=params)
+
+    def queries(self, op=None, table=None):
+        return [q for q in self.calls if (op is None or q.op == op) and (table is None or q.table == table)]
+
+
+_MISSING_FUNCTION = object()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Factory installing a FakePostgrest as supabase_service.client (with a clean RPC support set)."""
+    from app.services.supabase_service import supabase_service
+
+    def install(tables=None, rpcs=None, fail=None):
+        client = FakePostgrest(tables, rpcs, fail)
+        monkeypatch.setattr(supabase_service, 'client', client)
+        monkeypatch.setattr(supabase_service, '_unsupported_rpcs', set())
+        return client
+    return install
+
+
+@pytest.fixture
+def postgrest_http(monkeypatch):
+    """Factory installing a real SyncPostgrestClient whose HTTP requests go to ``handler(request)``."""
+    import httpx
+    from postgrest import SyncPostgrestClient
+    from app.services.supabase_service import supabase_service
+
+    def install(handler):
+        client = SyncPostgrestClient('https://db.test/rest/v1')
+        client.session = httpx.Client(base_url='https://db.test/rest/v1', transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(supabase_service, 'client', client)
+        return client
+    return install
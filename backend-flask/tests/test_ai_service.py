@@ -0,0 +1,94 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ai_service as ai_module
+from app.services.ai_service import AIService
+
+VECTORS = {b'old': [1, 0, 0, 0], b'old-copy': [1, 0, 0, 0], b'new': [0, 1, 0, 0]}
+
+
+def _feedback_image(root, label, name, data):
+    label_dir = root / 'dataset' / 'train' / label
+    label_dir.mkdir(parents=True, exist_ok=True)
+    path = label_dir / f'user_correct_{name}.jpg'
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_feedback_is_indexed_during_and_after_the_backfill(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai_module, 'AI_DIR', str(tmp_path))
+    monkeypatch.setattr(ai_module, 'SIMILARITY_DIR', str(tmp_path / 'similarity'))
+    old_path = _feedback_image(tmp_path, 'Acne', 'old', b'old')
+    gate = threading.Event()
+
+    def embed(data):
+        if data == b'old':
+            # hold the backfill on its first image
+            gate.wait(5)
+        return VECTORS[data]
+
+    service = AIService()
+    monkeypatch.setattr(service, 'embed', embed)
+    monkeypatch.setattr(service, 'model_version', lambda: 'v1')
+
+    # an image the running backfill has listed is left to it
+    assert service.record_feedback_case(b'old-copy', 'Acne', old_path) is None
+    gate.set()
+    service._similarity_backfill_thread.join(5)
+    assert service._backfill_pending is None
+
+    new_path = _feedback_image(tmp_path, 'Eczema', 'new', b'new')
+    assert service.record_feedback_case(b'new', 'Eczema', new_path)
+    assert service.find_similar_cases(b'new', k=1)[0]['label'] == 'Eczema'
+    assert service.find_similar_cases(b'old', k=1)[0]['label'] == 'Acne'
+    assert len(service._similarity[1]) == 2
+
+
+def test_version_is_fixed_when_the_model_is_loaded(monkeypatch, tmp_path):
+    torch = pytest.importorskip('torch')
+    models = pytest.importorskip('torchvision.models')
+
+    monkeypatch.setattr(ai_module, 'AI_DIR', str(tmp_path))
+    for label in ('Acne', 'Eczema'):
+        (tmp_path / 'dataset' / 'train' / label).mkdir(parents=True)
+    (tmp_path / 'models').mkdir()
+    ckpt = tmp_path / 'models' / 'resnet18_best.pth'
+    torch.save({'model_state': models.resnet18(num_classes=2).state_dict()}, str(ckpt))
+
+    service = AIService()
+    service._load_model()
+    loaded = service.model_version()
+    assert loaded.startswith('resnet18_best-')
+
+    # training overwrites the checkpoint while the old model is still in memory
+    mtime = os.path.getmtime(ckpt) + 100
+    os.utime(ckpt, (mtime, mtime))
+    assert service.model_version() == loaded
+    assert service._version_for_path(str(ckpt)) != loaded
+
+
+def test_checkpoint_is_evaluated_at_its_training_size(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai_module, 'AI_DIR', str(tmp_path))
+    (tmp_path / 'dataset' / 'train' / 'Acne').mkdir(parents=True)
+    ckpt = tmp_path / 'candidate.pth'
+    ckpt.write_bytes(b'')
+    sizes = []
+
+    class Engine:
+        def __init__(self, model):
+            self.model = model
+
+        def evaluate(self, data_dir):
+            sizes.append(self.model.img_size)
+            return {'accuracy': 1.0}
+
+    service = AIService()
+    monkeypatch.setattr(service, '_load_torch_checkpoint', lambda path, classes: (SimpleNamespace(img_size=None), classes))
+    monkeypatch.setattr(service, '_torch_engine', lambda model, classes, batch_size, workers: Engine(model))
+
+    result = service.evaluate_checkpoint(str(ckpt), img_size=299)
+    assert sizes == [299]
+    assert result['img_size'] == 299
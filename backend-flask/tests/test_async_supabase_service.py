@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import uuid
+
+from app import create_app
+from app.services.async_supabase_service import AsyncSupabaseService, async_supabase_service
+from app.services.auth_service import auth_service
+from app.services.supabase_service import supabase_service, compute_free_slots
+
+
+def _headers(role):
+    user = {'id': f'user-{uuid.uuid4().hex}', 'role': role, 'is_active': True, 'session_nonce': 0}
+    return user, {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+
+
+def test_unported_methods_run_sync_implementation(monkeypatch):
+    monkeypatch.setattr(supabase_service, 'get_department', lambda department_id: {'id': department_id})
+    assert asyncio.run(async_supabase_service.get_department('d1')) == {'id': 'd1'}
+
+
+def test_async_view_runs_behind_sync_decorators(monkeypatch):
+    calls = []
+
+    async def fake_record(user_id, role):
+        calls.append((user_id, role))
+        await asyncio.sleep(0)
+        return {'id': 'doc-1'}, [1, 3]
+
+    monkeypatch.setattr(async_supabase_service, 'get_role_record', fake_record)
+    user, headers = _headers('doctor')
+    res = create_app().test_client().get('/api/doctor/profile', headers=headers)
+    assert res.status_code == 200
+    assert res.get_json()['data'] == {'id': 'doc-1', 'availableDays': [1, 3]}
+    assert calls == [(user['id'], 'doctor')]
+
+    _, headers = _headers('patient')
+    res = create_app().test_client().get('/api/doctor/profile', headers=headers)
+    assert res.status_code == 403
+
+
+def test_profile_queries_run_concurrently(monkeypatch):
+    started = []
+
+    async def fake_user(user_id, projection='all'):
+        started.append('user')
+        await asyncio.sleep(0.05)
+        return {'id': user_id, 'role': 'doctor'}
+
+    async def fake_record(user_id, role):
+        started.append('record')
+        # the user query has started but not finished yet
+        assert started == ['user', 'record']
+        return {'id': 'doc-1', 'specialization': 'Dermatology'}, [2]
+
+    monkeypatch.setattr(async_supabase_service, 'find_user_by_id', fake_user)
+    monkeypatch.setattr(async_supabase_service, 'get_role_record', fake_record)
+    # databases without the embedded-select relationships
+    monkeypatch.setattr(supabase_service, '_profile_embed', None)
+    _, headers = _headers('doctor')
+    res = create_app().test_client().get('/api/auth/profile', headers=headers)
+    assert res.status_code == 200
+    assert res.get_json()['data']['doctor']['specialization'] == 'Dermatology'
+
+
+def test_compute_free_slots_skips_booked():
+    doctor = {'available_from': '09:00:00', 'available_to': '10:00:00', 'slot_duration_minutes': 20}
+    days = [{'day_of_week': 0, 'start_time': None, 'end_time': None}]  # 2024-01-01 is a Monday
+    appts = [{'appointment_date': '2024-01-01T09:20:00'}]
+    assert compute_free_slots('2024-01-01', doctor, [], days, appts) == ['2024-01-01T09:00:00', '2024-01-01T09:40:00']
+    assert compute_free_slots('2024-01-02', doctor, [], days, appts) == []
+
+
+def test_views_share_one_client_on_a_long_lived_loop():
+    service = AsyncSupabaseService()
+    seen = []
+
+    async def probe():
+        seen.append((threading.current_thread().name, service._client()))
+
+    try:
+        # each async view runs in its own short-lived loop
+        asyncio.run(service._on_client_loop(probe()))
+        asyncio.run(service._on_client_loop(probe()))
+    finally:
+        service.close()
+    assert [name for name, _ in seen] == ['supabase-async', 'supabase-async']
+    assert seen[0][1] is seen[1][1]
@@ -0,0 +1,78 @@
+import os
+import time
+
+import jwt
+import pytest
+
+from app import create_app
+from app.config.config import get_config
+from app.services.supabase_service import supabase_service
+
+
+def _legacy_token(user_id):
+    """A token as issued before the access/refresh split (no 'typ' claim)."""
+    now = int(time.time())
+    payload = {'user_id': user_id, 'role': 'patient', 'session_nonce': 0, 'iat': now, 'exp': now + 3600}
+    return jwt.encode(payload, get_config().JWT_SECRET_KEY, algorithm='HS256')
+
+
+def test_auth_required_reuses_cached_user(monkeypatch):
+    calls = []
+
+    def fake_find_user_by_id(user_id, projection='all'):
+        calls.append(user_id)
+        return {'id': user_id, 'role': 'patient', 'is_active': True, 'session_nonce': 0,
+                'first_name': 'Pat', 'last_name': 'Ient', 'password_hash': 'x'}
+
+    monkeypatch.setattr(supabase_service, 'find_user_by_id', fake_find_user_by_id)
+    monkeypatch.setattr(get_config(), 'LEGACY_TOKEN_CUTOFF', '2999-01-01')
+    supabase_service.invalidate_auth_user('cache-user')
+
+    app = create_app()
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {_legacy_token('cache-user')}"}
+
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 200
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 200
+    assert calls == ['cache-user']
+
+    supabase_service.invalidate_auth_user('cache-user')
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 200
+    assert calls == ['cache-user', 'cache-user']
+
+
+def test_legacy_tokens_are_rejected_after_the_cutoff(monkeypatch):
+    monkeypatch.setattr(supabase_service, 'find_user_by_id',
+                        lambda user_id, projection='all': {'id': user_id, 'role': 'patient', 'is_active': True})
+    monkeypatch.setattr(get_config(), 'LEGACY_TOKEN_CUTOFF', '2000-01-01')
+    headers = {'Authorization': f"Bearer {_legacy_token('legacy-user')}"}
+    assert create_app().test_client().get('/api/patient/dashboard', headers=headers).status_code == 401
+
+
+def test_sessions_are_revoked_only_when_a_session_field_changes(monkeypatch, fake_db):
+    from app.services import supabase_service as supabase_module
+
+    revoked = []
+    monkeypatch.setattr(supabase_module.revocation_list, 'revoke_user', revoked.append)
+    fake_db(tables={'users': [{'id': 'u1', 'email': 'u1@example.com', 'role': 'doctor', 'is_active': True,
+                               'session_nonce': 0, 'first_name': 'Old'}]})
+
+    # an admin edit sends the role back unchanged with the other fields
+    supabase_service.update_user('u1', {'first_name': 'New', 'role': 'doctor', 'is_active': True})
+    supabase_service.update_user_by_email('u1@example.com', {'role': 'doctor'})
+    assert revoked == []
+
+    supabase_service.update_user('u1', {'first_name': 'New', 'role': 'admin'})
+    supabase_service.update_user_by_email('u1@example.com', {'is_active': False})
+    assert revoked == ['u1', 'u1']
+
+
+
+def test_legacy_cutoff_defaults_to_one_token_lifetime_after_start():
+    from datetime import datetime
+    from app.config.config import Config
+
+    if os.environ.get('LEGACY_TOKEN_CUTOFF'):
+        pytest.skip('LEGACY_TOKEN_CUTOFF is set')
+    remaining = datetime.fromisoformat(Config.LEGACY_TOKEN_CUTOFF) - datetime.utcnow()
+    assert Config.LEGACY_TOKEN_LIFETIME - remaining < Config.LEGACY_TOKEN_LIFETIME / 100
@@ -0,0 +1,53 @@
+import uuid
+
+from app import create_app
+from app.services.async_supabase_service import async_supabase_service
+from app.services.auth_service import auth_service
+from app.services.supabase_service import build_calendar
+
+DOCTORS = [
+    {'id': 'd1', 'available_from': '09:00:00', 'available_to': '11:00:00', 'slot_duration_minutes': 60},
+    {'id': 'd2', 'available_from': '14:00:00', 'available_to': '15:00:00'},
+]
+# 2024-01-01 is a Monday (day_of_week 0)
+WEEKLY = [
+    {'doctor_id': 'd1', 'day_of_week': 0, 'start_time': None, 'end_time': None},
+    {'doctor_id': 'd1', 'day_of_week': 1, 'start_time': '10:00:00', 'end_time': '11:00:00'},
+    {'doctor_id': 'd2', 'day_of_week': 1, 'start_time': None, 'end_time': None},
+]
+AVAILABILITY = [
+    {'doctor_id': 'd2', 'available_date': '2024-01-03', 'start_time': '08:00:00', 'end_time': '09:00:00', 'slot_duration_minutes': 30},
+]
+APPOINTMENTS = [
+    {'doctor_id': 'd1', 'appointment_date': '2024-01-01T10:00:00'},
+    {'doctor_id': 'd2', 'appointment_date': '2024-01-02T14:30:00'},
+]
+
+
+def test_calendar_is_built_in_one_pass():
+    calendar = build_calendar(['d1', 'd2', 'missing'], ['2024-01-01', '2024-01-02', '2024-01-03'],
+                              DOCTORS, AVAILABILITY, WEEKLY, APPOINTMENTS)
+    assert calendar == {
+        'd1': {'2024-01-01': ['09:00'], '2024-01-02': ['10:00']},
+        'd2': {'2024-01-02': ['14:00'], '2024-01-03': ['08:00', '08:30']},
+    }
+
+
+def test_calendar_endpoint(monkeypatch):
+    seen = []
+
+    async def fake_calendar(doctor_ids, date_from, date_to):
+        seen.append((doctor_ids, date_from, date_to))
+        return {'d1': {'2024-01-01': ['09:00']}}
+
+    monkeypatch.setattr(async_supabase_service, 'get_availability_calendar', fake_calendar)
+    user = {'id': f'user-{uuid.uuid4().hex}', 'role': 'patient', 'is_active': True, 'session_nonce': 0}
+    headers = {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+    client = create_app().test_client()
+
+    res = client.get('/api/appointment/calendar?doctorIds=d1,d1,d2&from=2024-01-01&to=2024-01-07', headers=headers)
+    assert res.status_code == 200
+    assert res.get_json()['data']['slots'] == {'d1': {'2024-01-01': ['09:00']}}
+    assert seen == [(['d1', 'd2'], '2024-01-01', '2024-01-07')]
+
+    assert client.get('/api/appointment/calendar?from=2024-01-01', headers=headers).status_code == 400
@@ -0,0 +1,145 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.services.code_store import CodeStore, DatabaseCodeStore, LocalCodeStore
+
+
+class RecordingStore:
+    name = 'recording'
+
+    def __init__(self):
+        self.codes = {}
+
+    def issue(self, user_id, purpose, code, ttl_seconds):
+        self.codes[(user_id, purpose)] = code
+
+    def has_live(self, user_id, purpose):
+        return (user_id, purpose) in self.codes
+
+    def revoke(self, user_id, purpose):
+        self.codes.pop((user_id, purpose), None)
+
+    def consume(self, user_id, purpose, code):
+        if self.codes.get((user_id, purpose)) != code:
+            return False
+        del self.codes[(user_id, purpose)]
+        return True
+
+
+def test_codes_are_consumed_once_and_expire(tmp_path):
+    store = LocalCodeStore(str(tmp_path / 'codes.sqlite3'))
+    other_worker = LocalCodeStore(str(tmp_path / 'codes.sqlite3'))
+
+    store.issue('u1', 'password_reset', '123456', ttl_seconds=60)
+    assert other_worker.consume('u1', 'password_reset', '123456')
+    assert not store.consume('u1', 'password_reset', '123456')
+
+    # a new code replaces the old one
+    store.issue('u1', 'email_change', '111111', ttl_seconds=60)
+    store.issue('u1', 'email_change', '222222', ttl_seconds=60)
+    assert not store.consume('u1', 'email_change', '111111')
+    assert store.consume('u1', 'email_change', '222222')
+
+    store.issue('u1', 'phone_change', '333333', ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert not store.consume('u1', 'phone_change', '333333')
+    assert store.count() == 0
+
+
+def test_too_many_wrong_guesses_burn_the_code(tmp_path):
+    store = LocalCodeStore(str(tmp_path / 'codes.sqlite3'), max_attempts=3)
+    store.issue('u1', 'password_reset', '123456', ttl_seconds=60)
+    for guess in ('000000', '000001', '000002'):
+        assert not store.consume('u1', 'password_reset', guess)
+    assert not store.consume('u1', 'password_reset', '123456')
+
+
+def test_database_fallback_on_issue_failure_and_consume():
+    class Broken:
+        name = 'broken'
+
+        def issue(self, *args):
+            raise OSError('disk full')
+
+        def consume(self, *args):
+            raise OSError('disk full')
+
+    fallback = RecordingStore()
+    store = CodeStore(Broken(), fallback=fallback)
+    store.issue('u1', 'password_reset', '123456', 60)
+    assert fallback.codes == {('u1', 'password_reset'): '123456'}
+    assert store.consume('u1', 'password_reset', '123456')
+
+
+def test_codes_are_stored_as_digests(tmp_path):
+    path = tmp_path / 'codes.sqlite3'
+    store = LocalCodeStore(str(path), secret='s3cret')
+    store.issue('u1', 'password_reset', '123456', ttl_seconds=60)
+    digest, = store.store.execute('SELECT digest FROM code_digests').fetchone()
+    assert '123456' not in digest and len(digest) == 64
+    assert not LocalCodeStore(str(path), secret='other').consume('u1', 'password_reset', '123456')
+    assert store.consume('u1', 'password_reset', '123456')
+
+
+def test_wrong_guess_is_not_retried_without_a_live_database_code(tmp_path):
+    fallback = RecordingStore()
+    consumed = []
+    fallback.consume = lambda *args: consumed.append(args)
+    store = CodeStore(LocalCodeStore(str(tmp_path / 'codes.sqlite3')), fallback=fallback)
+    store.issue('u1', 'password_reset', '123456', 60)
+    assert not store.consume('u1', 'password_reset', '999999')
+    assert consumed == []
+
+
+def test_code_issued_to_the_fallback_is_consumed_once_the_primary_recovers(tmp_path):
+    local = LocalCodeStore(str(tmp_path / 'codes.sqlite3'))
+    failing = {'issue': True}
+
+    class Flaky:
+        name = 'flaky'
+
+        def issue(self, *args):
+            if failing['issue']:
+                raise OSError('disk full')
+            local.issue(*args)
+
+        def consume(self, *args):
+            return local.consume(*args)
+
+    fallback = RecordingStore()
+    store = CodeStore(Flaky(), fallback=fallback)
+    store.issue('u1', 'password_reset', '123456', 60)
+    failing['issue'] = False
+    assert store.consume('u1', 'password_reset', '123456')
+    assert not store.consume('u1', 'password_reset', '123456')
+
+    # a code issued to the primary replaces the one left in the fallback
+    store.issue('u1', 'email_change', '111111', 60)
+    fallback.codes[('u1', 'email_change')] = '222222'
+    store.issue('u1', 'email_change', '333333', 60)
+    assert not store.consume('u1', 'email_change', '222222')
+    assert store.consume('u1', 'email_change', '333333')
+
+
+def _token(code, **fields):
+    expires = (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
+    return {'id': code, 'user_id': 'u1', 'reset_code': code, 'token_type': 'password_reset',
+            'is_used': False, 'expires_at': expires, 'attempts': 0, **fields}
+
+
+def test_pre_deploy_database_code_still_works(tmp_path, fake_db):
+    fake = fake_db(tables={'password_reset_tokens': [_token('123456')]})
+    store = CodeStore(LocalCodeStore(str(tmp_path / 'codes.sqlite3')), fallback=DatabaseCodeStore(max_attempts=3))
+    assert not store.consume('u1', 'password_reset', '000000')
+    assert store.consume('u1', 'password_reset', '123456')
+    row, = fake.tables['password_reset_tokens']
+    assert row['is_used'] and row['attempts'] == 1
+
+
+def test_wrong_guesses_count_against_the_database_code(tmp_path, fake_db):
+    fake = fake_db(tables={'password_reset_tokens': [_token('123456')]})
+    store = CodeStore(LocalCodeStore(str(tmp_path / 'codes.sqlite3')), fallback=DatabaseCodeStore(max_attempts=3))
+    for guess in ('000000', '000001', '000002'):
+        assert not store.consume('u1', 'password_reset', guess)
+    assert fake.tables['password_reset_tokens'][0]['is_used']
+    assert not store.consume('u1', 'password_reset', '123456')
@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.supabase_service import supabase_service, PROFILE_EMBED, PROFILE_EMBED_HINTED
+
+
+def _embed_fails(error):
+    return lambda query: Exception(error) if PROFILE_EMBED in query.columns else None
+
+
+def _selects(fake):
+    return [q.columns for q in fake.queries('select', 'users')]
+
+
+def test_profile_is_one_embedded_select(fake_db, monkeypatch):
+    row = {
+        'id': 'u1', 'role': 'doctor', 'email': 'doc@example.com', 'password_hash': 'x',
+        'doctors': [{'id': 'doc-1', 'specialization': 'Dermatology', 'department_id': 'd1',
+                     'doctor_available_days': [{'day_of_week': 1}, {'day_of_week': 3}]}],
+        'ambulance_staff': None,
+    }
+    fake = fake_db({'users': [row]})
+    monkeypatch.setattr(supabase_service, '_profile_embed', PROFILE_EMBED)
+
+    profile = supabase_service.get_user_profile('u1')
+    assert len(_selects(fake)) == 1 and PROFILE_EMBED in _selects(fake)[0]
+    assert profile['doctor']['specialization'] == 'Dermatology'
+    assert profile['doctor']['availableDays'] == [1, 3]
+    assert 'doctors' not in profile and 'ambulance_staff' not in profile and 'password_hash' not in profile
+
+
+def test_missing_relationship_falls_back_to_separate_queries(fake_db, monkeypatch):
+    row = {'id': 'u2', 'role': 'ambulance', 'email': 'amb@example.com'}
+    fake_db({'users': [row]}, fail=_embed_fails('PGRST200 Could not find a relationship'))
+    monkeypatch.setattr(supabase_service, '_profile_embed', PROFILE_EMBED)
+    monkeypatch.setattr(supabase_service, 'get_ambulance_staff_by_user_id', lambda user_id: {'id': 's1', 'shift_type': 'night'})
+    monkeypatch.setattr(supabase_service, 'get_ambulance_staff_available_days', lambda staff_id: [5])
+
+    profile = supabase_service.get_user_profile('u2')
+    assert profile['role'] == 'ambulance_staff'
+    assert profile['ambulance'] == {'staffType': None, 'vehicleRegistration': None, 'assignedCity': None,
+                                    'assignedState': None, 'shiftType': 'night', 'availableDays': [5]}
+    assert supabase_service._profile_embed is None
+
+
+def test_ambiguous_relationship_switches_to_hinted_embed(fake_db, monkeypatch):
+    row = {'id': 'u3', 'role': 'patient', 'email': 'p@example.com', 'doctors': [], 'ambulance_staff': None}
+    fake = fake_db({'users': [row]}, fail=_embed_fails('PGRST201 Could not embed because more than one relationship was found'))
+    monkeypatch.setattr(supabase_service, '_profile_embed', PROFILE_EMBED)
+    monkeypatch.setattr(supabase_service, '_unsupported_projections', set())
+
+    assert supabase_service.get_user_profile('u3')['email'] == 'p@example.com'
+    assert supabase_service._profile_embed == PROFILE_EMBED_HINTED
+    fake.calls.clear()
+    assert supabase_service.get_user_profile('u3')['email'] == 'p@example.com'
+    assert len(_selects(fake)) == 1 and PROFILE_EMBED_HINTED in _selects(fake)[0]
+
+
+def test_only_relationship_errors_change_the_embed(monkeypatch):
+    monkeypatch.setattr(supabase_service, '_profile_embed', PROFILE_EMBED)
+
+    # a missing user column is handled by the 'profile' projection fallback
+    supabase_service.profile_embed_failed(PROFILE_EMBED, Exception('column users.phone_verified does not exist'))
+    assert supabase_service._profile_embed == PROFILE_EMBED
+    with pytest.raises(Exception, match='JWT expired'):
+        supabase_service.profile_embed_failed(PROFILE_EMBED, Exception('JWT expired'))
+    assert supabase_service._profile_embed == PROFILE_EMBED
@@ -0,0 +1,74 @@
+import io
+import time
+import uuid
+
+from app import create_app
+from app.config.config import get_config
+from app.services.ai_service import ai_service
+from app.services.auth_service import auth_service
+from app.services.supabase_service import supabase_service
+from app.utils.rate_limit_storage import SQLiteStorage
+
+
+def test_expensive_routes_spend_role_budget(monkeypatch):
+    monkeypatch.setitem(get_config().COMPUTE_BUDGETS, 'patient', 25)
+    monkeypatch.setattr(ai_service, 'detect', lambda data: {'label': 'acne', 'model_used': False})
+    monkeypatch.setattr(supabase_service, 'find_doctors_by_specialization', lambda spec: [])
+
+    client = create_app().test_client()
+    user = {'id': f'budget-{uuid.uuid4().hex}', 'role': 'patient', 'is_active': True}
+    headers = {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+
+    def detect(**extra):
+        data = {'image': (io.BytesIO(b'img'), 'a.png')}
+        data.update(extra)
+        return client.post('/api/patient/detect', headers=headers, data=data, content_type='multipart/form-data')
+
+    res = detect()
+    assert res.status_code == 200
+    assert res.headers['X-Compute-Budget-Limit'] == '25'
+    assert res.headers['X-Compute-Budget-Remaining'] == '15'
+
+    # rejected input is refunded
+    res = client.post('/api/patient/detect', headers=headers, data={}, content_type='multipart/form-data')
+    assert res.status_code == 400
+    assert res.headers['X-Compute-Budget-Remaining'] == '15'
+
+    assert detect().headers['X-Compute-Budget-Remaining'] == '5'
+    res = detect()
+    assert res.status_code == 429
+    assert res.headers['X-Compute-Budget-Remaining'] == '5'
+    assert 'Retry-After' in res.headers
+
+    # cheap reads are not charged
+    assert 'X-Compute-Budget-Remaining' not in client.get('/api/patient/dashboard', headers=headers).headers
+
+
+def test_only_rejected_input_is_refunded(monkeypatch):
+    monkeypatch.setitem(get_config().COMPUTE_BUDGETS, 'patient', 25)
+
+    def broken(data):
+        raise RuntimeError('model failed')
+
+    monkeypatch.setattr(ai_service, 'detect', broken)
+    client = create_app().test_client()
+    user = {'id': f'budget-{uuid.uuid4().hex}', 'role': 'patient', 'is_active': True}
+    headers = {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+
+    res = client.post('/api/patient/detect', headers=headers, data={'image': (io.BytesIO(b'img'), 'a.png')},
+                      content_type='multipart/form-data')
+    assert res.status_code == 400
+    assert res.headers['X-Compute-Budget-Remaining'] == '15'
+
+
+def test_refund_never_starts_a_window_negative(tmp_path):
+    storage = SQLiteStorage(f"sqlite://{tmp_path / 'limits.sqlite3'}")
+    storage.incr('budget', 60, amount=3)
+    assert storage.refund('budget', 10) == 1
+    assert storage.get('budget') == 0
+
+    # a window that rolled over mid-request is not refunded into
+    storage.incr('rolled', 1, amount=10)
+    time.sleep(1.1)
+    assert storage.refund('rolled', 10) == 0
+    assert storage.incr('rolled', 60, amount=1) == 1
@@ -0,0 +1,35 @@
+from app.services.ai_service import ai_service
+from app.services.near_duplicate_cache import NearDuplicateCache
+
+
+def _service(monkeypatch, result):
+    cache = NearDuplicateCache(capacity=8, max_distance=6)
+    monkeypatch.setattr(cache, 'hash_image', lambda image_bytes: 42)
+    monkeypatch.setattr(ai_service, 'near_duplicates', cache)
+    monkeypatch.setattr(ai_service, '_ready', True)
+    monkeypatch.setattr(ai_service, 'candidate', None)
+    calls = []
+
+    def detect(image_bytes, record_case=True, timings=None):
+        calls.append(image_bytes)
+        return dict(result, case_id=f'case-{len(calls)}')
+
+    monkeypatch.setattr(ai_service, '_detect_uncached', detect)
+    return cache, calls
+
+
+def test_cached_results_drop_per_upload_fields(monkeypatch):
+    _, calls = _service(monkeypatch, {'label': 'Acne', 'confidence': 0.9, 'model_used': True})
+    assert ai_service.detect(b'first')['case_id'] == 'case-1'
+    hit = ai_service.detect(b'second')
+    assert len(calls) == 1
+    assert hit['label'] == 'Acne' and hit['near_duplicate'] is True
+    assert 'case_id' not in hit
+
+
+def test_failed_detections_are_not_cached(monkeypatch):
+    cache, calls = _service(monkeypatch, {'label': 'Unknown', 'confidence': 0.0, 'model_used': False})
+    ai_service.detect(b'first')
+    ai_service.detect(b'second')
+    assert len(calls) == 2
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,73 @@
+import io
+import threading
+import uuid
+
+import pytest
+
+from app import create_app
+from app.services import ai_service as ai_module
+from app.services.ai_service import ai_service
+from app.services.auth_service import auth_service
+
+
+def _headers(user_id, role='patient'):
+    user = {'id': user_id, 'role': role, 'is_active': True, 'session_nonce': 0}
+    return {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+
+
+def test_only_the_uploader_sees_an_explanation(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai_module, 'EXPLANATIONS_DIR', str(tmp_path))
+    monkeypatch.setattr(ai_service, 'model_version', lambda: 'resnet18_best-1')
+    monkeypatch.setattr(ai_service._explain_executor, 'submit', lambda *args: None)
+    owner, other = f'user-{uuid.uuid4().hex}', f'user-{uuid.uuid4().hex}'
+
+    image_id = ai_service.request_explanation(b'image', 'Acne', owner)
+    try:
+        client = create_app().test_client()
+        assert client.get(f'/api/patient/detect/explanation/{image_id}', headers=_headers(owner)).status_code == 202
+        assert client.get(f'/api/patient/detect/explanation/{image_id}', headers=_headers(other)).status_code == 404
+        assert client.get(f'/api/patient/detect/explanation/{image_id}', headers=_headers(other, 'admin')).status_code == 202
+
+        # a second uploader of the same image is added, not swapped in
+        ai_service.request_explanation(b'image', 'Acne', other)
+        assert ai_service.explanation_visible_to(image_id, owner)
+        assert ai_service.explanation_visible_to(image_id, other)
+    finally:
+        ai_service._explain_pending.discard(('resnet18_best-1', image_id))
+
+
+def test_detection_runs_while_an_explanation_is_computed(monkeypatch, tmp_path):
+    pytest.importorskip('torch')
+    models = pytest.importorskip('torchvision.models')
+    from PIL import Image
+
+    model = models.resnet18(num_classes=2)
+    model.eval()
+    ai_service._attach_feature_hook(model)
+    monkeypatch.setattr(ai_service, 'model', model)
+    monkeypatch.setattr(ai_service, 'keras_model', None)
+    monkeypatch.setattr(ai_service, 'classes', ['Acne', 'Eczema'])
+    monkeypatch.setattr(ai_service, '_model_version', 'resnet18_best-1')
+    monkeypatch.setattr(ai_module, 'EXPLANATIONS_DIR', str(tmp_path))
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 80, 80)).save(buf, 'PNG')
+    image = buf.getvalue()
+
+    done = threading.Event()
+
+    def explain():
+        try:
+            for _ in range(5):
+                ai_service._compute_explanation(image, 'Acne', 'resnet18_best-1', ai_service.explanation_id(image))
+        finally:
+            done.set()
+
+    worker = threading.Thread(target=explain)
+    worker.start()
+    results = []
+    while not done.is_set():
+        results.append(ai_service._detect_uncached(image, record_case=False))
+    worker.join()
+
+    assert results and all(r['model_used'] and r['label'] != 'Unknown' for r in results)
+    assert (tmp_path / 'resnet18_best-1' / f'{ai_service.explanation_id(image)}.png').exists()
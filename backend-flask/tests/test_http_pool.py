@@ -0,0 +1,49 @@
+import os
+
+import httpx
+
+from app.config.config import get_config
+from app.services.supabase_service import supabase_service
+from app.utils.http_pool import HttpPoolStats, pooled_session
+
+config = get_config()
+
+
+def test_pooled_session_keeps_base_url_and_headers():
+    old = httpx.Client(base_url='https://example.test/rest/v1', headers={'apikey': 'k'})
+    limits = httpx.Limits(max_connections=3, max_keepalive_connections=2, keepalive_expiry=5)
+    session = pooled_session(old, limits, httpx.Timeout(7, connect=2), http2=False)
+    assert session.base_url == old.base_url
+    assert session.headers['apikey'] == 'k'
+    assert session.timeout.connect == 2 and session.timeout.read == 7
+    assert session._transport._pool._max_connections == 3
+    assert session._transport._pool._max_keepalive_connections == 2
+
+
+def test_stats_hooks_count_requests_and_responses():
+    stats = HttpPoolStats()
+    transport = httpx.MockTransport(lambda request: httpx.Response(204))
+    client = httpx.Client(transport=transport, event_hooks=stats.hooks('postgrest'))
+    client.get('https://example.test/')
+    client.get('https://example.test/')
+    assert stats.counts('postgrest') == {'requests': 2, 'responses_2xx': 2}
+
+
+def test_supabase_sessions_use_configured_pool():
+    client = supabase_service.client
+    pool = client.postgrest.session._transport._pool
+    assert pool._max_connections == config.SUPABASE_HTTP_MAX_CONNECTIONS
+    assert client.storage.session is client.storage._client
+    stats = supabase_service.http_pool_stats()
+    assert stats['pid'] == os.getpid()
+    assert 'postgrest' in stats and 'storage' in stats
+
+
+def test_client_is_rebuilt_after_fork(monkeypatch):
+    original = supabase_service.client
+    monkeypatch.setattr(supabase_service, '_client_pid', -1)
+    try:
+        assert supabase_service.client is not original
+        assert supabase_service._client_pid == os.getpid()
+    finally:
+        supabase_service.client = original
@@ -0,0 +1,47 @@
+from app.services import maintenance_service as maintenance_module
+from app.services.maintenance_service import MaintenanceService
+from app.services.supabase_service import supabase_service
+
+
+def test_token_sweep_is_batched_and_bounded(monkeypatch):
+    stale = list(range(23))
+    batches = []
+
+    def find_stale_token_ids(limit=500):
+        return stale[:limit]
+
+    def delete_tokens_by_ids(ids):
+        batches.append(len(ids))
+        del stale[:len(ids)]
+        return len(ids)
+
+    monkeypatch.setattr(supabase_service, 'find_stale_token_ids', find_stale_token_ids)
+    monkeypatch.setattr(supabase_service, 'delete_tokens_by_ids', delete_tokens_by_ids)
+    service = MaintenanceService(batch_size=10, pause=0)
+
+    assert service.sweep_tokens(max_batches=2) == {'removed': 20, 'batches': 2, 'complete': False}
+    assert service.sweep_tokens() == {'removed': 3, 'batches': 1, 'complete': True}
+    assert batches == [10, 10, 3]
+
+
+def test_short_final_batch_is_complete_and_not_followed_by_a_pause(monkeypatch):
+    stale = list(range(13))
+    sleeps = []
+
+    def find_stale_token_ids(limit=500):
+        return stale[:limit]
+
+    def delete_tokens_by_ids(ids):
+        del stale[:len(ids)]
+        return len(ids)
+
+    monkeypatch.setattr(supabase_service, 'find_stale_token_ids', find_stale_token_ids)
+    monkeypatch.setattr(supabase_service, 'delete_tokens_by_ids', delete_tokens_by_ids)
+    monkeypatch.setattr(maintenance_module.time, 'sleep', sleeps.append)
+    service = MaintenanceService(batch_size=10, pause=0.5)
+
+    assert service.sweep_tokens(max_batches=2) == {'removed': 13, 'batches': 2, 'complete': True}
+    assert sleeps == [0.5]
+    stale.extend(range(10))
+    assert service.sweep_tokens(max_batches=1) == {'removed': 10, 'batches': 1, 'complete': False}
+    assert sleeps == [0.5]
@@ -0,0 +1,37 @@
+import numpy as np
+from app.services.model_evaluation import EvaluationEngine, confusion_matrix, classification_metrics
+
+
+def test_confusion_matrix_and_metrics():
+    cm = confusion_matrix(np.array([0, 0, 1, 1, 2]), np.array([0, 1, 1, 1, 0]), 3)
+    assert cm.tolist() == [[1, 1, 0], [0, 2, 0], [1, 0, 0]]
+
+    metrics = classification_metrics(cm, ['a', 'b', 'c'])
+    assert metrics['accuracy'] == 0.6
+    assert metrics['per_class']['b']['precision'] == 2 / 3
+    assert metrics['per_class']['b']['recall'] == 1.0
+    assert metrics['per_class']['c']['f1'] == 0.0
+
+
+def test_engine_streams_folder_and_skips_undecodable(tmp_path):
+    for cls in ('Acne', 'Eczema'):
+        (tmp_path / cls).mkdir()
+        for i in range(3):
+            (tmp_path / cls / f'{i}.jpg').write_text(cls)
+    (tmp_path / 'Acne' / 'broken.png').write_text('')
+
+    def decode(path):
+        text = open(path).read()
+        if not text:
+            raise ValueError('cannot decode')
+        return text
+
+    def predict(batch):
+        # always predicts Acne
+        return np.array([[0.9, 0.1] for _ in batch])
+
+    result = EvaluationEngine(['Acne', 'Eczema'], decode, predict, batch_size=2, workers=2).evaluate(str(tmp_path))
+    assert result['num_images'] == 6
+    assert result['skipped_images'] == 1
+    assert result['accuracy'] == 0.5
+    assert result['confusion_matrix'] == [[3, 0], [3, 0]]
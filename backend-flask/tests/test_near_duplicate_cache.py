@@ -0,0 +1,30 @@
+import io
+import numpy as np
+from PIL import Image
+from app.services.near_duplicate_cache import NearDuplicateCache
+
+
+def _encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def test_recompressed_image_hits_cache():
+    rng = np.random.default_rng(1)
+    base = Image.fromarray(rng.integers(0, 255, size=(16, 16, 3), dtype=np.uint8)).resize((256, 256))
+    original = _encode(base, 'PNG')
+    resent = _encode(base.resize((200, 200)), 'JPEG', quality=40)
+    other = _encode(Image.fromarray(rng.integers(0, 255, size=(16, 16, 3), dtype=np.uint8)).resize((256, 256)), 'PNG')
+
+    cache = NearDuplicateCache(capacity=8, max_distance=6)
+    cache.store(cache.hash_image(original), {'label': 'Acne', 'confidence': 0.9})
+
+    hit = cache.lookup(cache.hash_image(resent))
+    assert hit is not None
+    assert hit[0]['label'] == 'Acne'
+    assert cache.lookup(cache.hash_image(other)) is None
+
+    stats = cache.stats()
+    assert stats['lookups'] == 2 and stats['hits'] == 1
+    assert stats['hit_ratio'] == 0.5
@@ -0,0 +1,75 @@
+import threading
+
+import bcrypt
+import pytest
+
+from app.services.password_hasher import PasswordHasher, HasherBusy
+
+
+def test_hash_verify_and_rehash_detection():
+    hasher = PasswordHasher(max_workers=2, rounds=10)
+    hashed = hasher.hash('s3cret-pass')
+    assert hasher.cost_of(hashed) == 10
+    assert hasher.verify('s3cret-pass', hashed)
+    assert not hasher.verify('wrong', hashed)
+    assert not hasher.verify('s3cret-pass', '')
+
+    stronger = PasswordHasher(rounds=11)
+    assert stronger.needs_rehash(hashed)
+    assert not hasher.needs_rehash(hashed)
+
+
+def test_calibration_never_goes_below_minimum():
+    assert PasswordHasher(target_ms=0).calibrate() == 10
+
+
+def test_schedule_rehash_stores_new_hash():
+    hasher = PasswordHasher(max_workers=1, rounds=10)
+    stored = []
+    hasher.schedule_rehash('pw', stored.append).result(timeout=10)
+    assert bcrypt.checkpw(b'pw', stored[0].encode('utf-8'))
+
+
+def test_full_queue_is_rejected():
+    hasher = PasswordHasher(max_workers=1, max_queue=0, rounds=10)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return True
+
+    t = threading.Thread(target=hasher._run, args=(slow,))
+    t.start()
+    started.wait(5)
+    with pytest.raises(HasherBusy):
+        hasher.hash('pw')
+    release.set()
+    t.join()
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_rehash_is_dropped_when_the_pool_is_saturated():
+    hasher = PasswordHasher(max_workers=1, max_queue=0, rounds=10)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return True
+
+    t = threading.Thread(target=hasher._run, args=(slow,))
+    t.start()
+    started.wait(5)
+    stored = []
+    assert hasher.schedule_rehash('pw', stored.append) is None
+    release.set()
+    t.join()
+
+    # the slot taken by a rehash is given back once it finishes
+    hasher.schedule_rehash('pw', stored.append).result(timeout=10)
+    assert len(stored) == 1
+    assert hasher.verify('pw', stored[0])
+    assert hasher.stats()['rehashes_dropped'] == 1
@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app.utils.rate_limit_storage import SQLiteStorage
+
+
+def _hammer(uri, n):
+    storage = storage_from_string(uri)
+    for _ in range(n):
+        storage.incr('shared', 60)
+
+
+def test_counters_are_shared_and_expire(tmp_path):
+    uri = f"sqlite://{tmp_path / 'limits.sqlite3'}"
+    worker_a, worker_b = storage_from_string(uri), storage_from_string(uri)
+    assert isinstance(worker_a, SQLiteStorage)
+
+    limiter_a, limiter_b = FixedWindowRateLimiter(worker_a), FixedWindowRateLimiter(worker_b)
+    item = parse('3/minute')
+    assert limiter_a.hit(item, 'ip') and limiter_b.hit(item, 'ip') and limiter_a.hit(item, 'ip')
+    assert not limiter_b.hit(item, 'ip')
+    assert worker_a.get(item.key_for('ip')) == 4
+
+    worker_a.incr('short', 1)
+    assert worker_b.get('short') == 1
+    time.sleep(1.1)
+    assert worker_b.get('short') == 0
+    assert worker_b.incr('short', 1) == 1  # expired window restarts
+    time.sleep(1.1)
+    assert worker_a.sweep() == 1
+
+
+def test_increments_are_atomic_across_processes(tmp_path):
+    uri = f"sqlite://{tmp_path / 'limits.sqlite3'}"
+    procs = [multiprocessing.Process(target=_hammer, args=(uri, 200)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert storage_from_string(uri).get('shared') == 800
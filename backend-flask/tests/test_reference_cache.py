@@ -0,0 +1,24 @@
+from app.services.supabase_service import supabase_service
+from app.utils.ttl_cache import TTLCache
+
+
+def test_departments_are_normalized_and_cached(fake_db, monkeypatch):
+    fake = fake_db({'departments': [{'department_id': 'd1', 'department_name': 'Dermatology'}]})
+    monkeypatch.setattr(supabase_service, '_reference_cache', TTLCache(maxsize=64, ttl=60))
+
+    def lookups():
+        return [q.filter_value('id') for q in fake.queries('select', 'departments')]
+
+    depts = supabase_service.list_departments()
+    assert depts[0]['id'] == 'd1' and depts[0]['name'] == 'Dermatology'
+    depts[0]['name'] = 'changed by a caller'
+    assert supabase_service.get_department('d1')['name'] == 'Dermatology'
+    assert lookups() == [None]
+
+    fake.tables['departments'].append({'id': 'd2', 'name': 'Cardiology'})
+    assert supabase_service.get_department('d2')['name'] == 'Cardiology'
+    assert lookups() == [None, 'd2']
+
+    supabase_service.invalidate_reference_data()
+    assert [d['id'] for d in supabase_service.list_departments()] == ['d1', 'd2']
+    assert lookups() == [None, 'd2', None]
@@ -0,0 +1,44 @@
+from app.services.supabase_service import supabase_service
+from app.utils.ttl_cache import TTLCache
+
+
+def _install(fake_db, monkeypatch, users, with_function=True):
+    def user_counts_by_role(params):
+        counts = {}
+        for row in fake.tables['users']:
+            counts[row['role']] = counts.get(row['role'], 0) + 1
+        return [{'role': r, 'count': c} for r, c in counts.items()]
+
+    fake = fake_db({'users': users}, rpcs={'user_counts_by_role': user_counts_by_role} if with_function else None)
+    monkeypatch.setattr(supabase_service, '_role_counts', TTLCache(maxsize=1, ttl=60))
+    return fake
+
+
+def _as_dict(counts):
+    return {c['role_key']: c['count'] for c in counts}
+
+
+def test_counts_come_from_database_and_follow_writes(fake_db, monkeypatch):
+    fake = _install(fake_db, monkeypatch, [{'id': 'u1', 'role': 'patient'}, {'id': 'u2', 'role': 'patient'},
+                                           {'id': 'u3', 'role': 'doctor'}])
+
+    assert _as_dict(supabase_service.user_counts_by_role()) == {'patient': 2, 'doctor': 1}
+    supabase_service.create_user({'id': 'u4', 'role': 'doctor'})
+    supabase_service.adjust_deleted_role_counts(supabase_service._roles_of(['u1']))
+    counts = supabase_service.user_counts_by_role()
+    assert _as_dict(counts) == {'patient': 1, 'doctor': 2}
+    assert counts[0] == {'role': 'Doctor', 'count': 2, 'role_key': 'doctor'}
+    assert len(fake.queries('rpc')) == 1
+
+
+def test_head_counts_without_database_function(fake_db, monkeypatch):
+    _install(fake_db, monkeypatch, [{'id': 'u1', 'role': 'admin'}, {'id': 'u2', 'role': 'ambulance'},
+                                    {'id': 'u3', 'role': None}, {'id': 'u4', 'role': 'patient'}], with_function=False)
+    assert _as_dict(supabase_service.user_counts_by_role()) == {'admin': 1, 'ambulance': 1, 'patient': 2}
+
+
+def test_writes_do_not_touch_uncached_counts(fake_db, monkeypatch):
+    _install(fake_db, monkeypatch, [])
+    supabase_service.create_user({'id': 'u1', 'role': 'patient'})
+    assert not supabase_service.role_counts_cached()
+    assert _as_dict(supabase_service.user_counts_by_role()) == {'patient': 1}
@@ -0,0 +1,84 @@
+import io
+
+import numpy as np
+from flask import Flask, jsonify
+from PIL import Image
+
+from app.config.config import get_config
+from app.services.ai_service import ai_service
+from app.services.shadow_evaluation import ShadowStats
+
+
+def test_shadow_stats_summary():
+    stats = ShadowStats(window=2)
+    stats.record({'label': 'Acne', 'confidence': 0.8}, {'label': 'Acne', 'confidence': 0.9}, 10.0, 20.0)
+    stats.record({'label': 'Acne', 'confidence': 0.8}, {'label': 'Eczema', 'confidence': 0.6}, 30.0, 40.0)
+    stats.record({'label': 'Eczema', 'confidence': 0.5}, {'label': 'Eczema', 'confidence': 0.5}, 50.0, 60.0)
+    stats.record_dropped()
+    stats.record_error()
+
+    summary = stats.summary()
+    assert summary['samples'] == 3 and summary['dropped'] == 1 and summary['errors'] == 1
+    assert summary['agreement_rate'] == 2 / 3
+    assert abs(summary['mean_abs_confidence_delta'] - 0.1) < 1e-9
+    assert summary['recent_disagreements'] == [{'live': 'Acne', 'candidate': 'Eczema'}]
+    # latency windows keep only the most recent samples
+    assert summary['latency']['live']['mean_ms'] == 40.0
+
+    stats.reset()
+    assert stats.summary()['samples'] == 0
+
+
+class _FakeKerasModel:
+    input_shape = (None, 8, 8, 3)
+
+    def predict(self, arr):
+        assert arr.shape == (1, 8, 8, 3)
+        return np.array([[0.0, 3.0]])
+
+
+def test_shadow_run_compares_with_the_live_model_time(monkeypatch):
+    stats = ShadowStats()
+    monkeypatch.setattr(ai_service, 'shadow_stats', stats)
+    buf = io.BytesIO()
+    Image.new('RGB', (16, 16)).save(buf, 'PNG')
+    candidate = {'kind': 'keras', 'model': _FakeKerasModel(), 'classes': ['Acne', 'Eczema']}
+
+    with ai_service._shadow_lock:
+        ai_service._shadow_pending += 1
+    ai_service._run_shadow(candidate, buf.getvalue(), {'label': 'Acne', 'confidence': 0.7, 'model_used': True}, 12.5)
+
+    summary = stats.summary()
+    assert summary['samples'] == 1 and summary['agreement_rate'] == 0.0
+    assert summary['latency']['live']['mean_ms'] == 12.5
+    assert summary['recent_disagreements'] == [{'live': 'Acne', 'candidate': 'Eczema'}]
+
+
+def test_sampled_detection_is_shadowed_after_the_response(monkeypatch):
+    submitted = []
+
+    def detect(image_bytes, record_case=True, timings=None):
+        timings['model_ms'] = 7.0
+        return {'label': 'Acne', 'confidence': 0.9, 'model_used': True}
+
+    monkeypatch.setattr(ai_service, '_ready', True)
+    monkeypatch.setattr(ai_service, 'near_duplicates', None)
+    monkeypatch.setattr(ai_service, 'candidate', {'kind': 'keras'})
+    monkeypatch.setattr(ai_service, '_detect_uncached', detect)
+    monkeypatch.setattr(ai_service, '_submit_shadow', lambda *args: submitted.append(args))
+    monkeypatch.setattr(get_config(), 'AI_SHADOW_SAMPLE_RATE', 1.0)
+
+    app = Flask(__name__)
+
+    @app.route('/detect')
+    def view():
+        result = ai_service.detect(b'image')
+        assert submitted == []
+        return jsonify(result)
+
+    response = app.test_client().get('/detect')
+    assert response.get_json()['label'] == 'Acne'
+    response.close()
+    assert len(submitted) == 1
+    candidate, image_bytes, live_result, live_ms = submitted[0]
+    assert candidate == {'kind': 'keras'} and image_bytes == b'image' and live_ms == 7.0
@@ -0,0 +1,37 @@
+import numpy as np
+from app.services.similarity_index import SimilarityIndex
+
+
+def test_search_returns_nearest_confirmed_cases(tmp_path):
+    index = SimilarityIndex(str(tmp_path), dim=8, initial_capacity=2)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 8))
+    for i, v in enumerate(vectors):
+        index.add(v, {'case_id': str(i), 'label': 'Acne', 'confirmed': i % 2 == 0})
+
+    results = index.search(vectors[4], k=3)
+    assert results[0]['case_id'] == '4'
+    assert all(r['confirmed'] for r in results)
+    assert results[0]['score'] >= results[-1]['score']
+
+    # unconfirmed rows are only returned when asked for
+    assert index.search(vectors[5], k=1, confirmed_only=False)[0]['case_id'] == '5'
+
+
+def test_second_instance_sees_rows_appended_by_first(tmp_path):
+    writer = SimilarityIndex(str(tmp_path), dim=4)
+    reader = SimilarityIndex(str(tmp_path), dim=4)
+    writer.add([1, 0, 0, 0], {'case_id': 'a', 'confirmed': True})
+    assert len(reader) == 1
+    assert reader.search([1, 0, 0, 0], k=1)[0]['case_id'] == 'a'
+
+
+def test_unconfirmed_rows_are_capped(tmp_path):
+    index = SimilarityIndex(str(tmp_path), dim=4)
+    assert index.add([1, 0, 0, 0], {'case_id': 'a', 'confirmed': False}, max_unconfirmed=2) == 0
+    assert index.add([0, 1, 0, 0], {'case_id': 'b', 'confirmed': False}, max_unconfirmed=2) == 1
+    assert index.add([0, 0, 1, 0], {'case_id': 'c', 'confirmed': False}, max_unconfirmed=2) is None
+    # confirmed cases are never dropped
+    assert index.add([0, 0, 0, 1], {'case_id': 'd', 'confirmed': True}, max_unconfirmed=2) == 2
+    assert len(index) == 3
+
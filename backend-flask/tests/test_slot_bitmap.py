@@ -0,0 +1,134 @@
+from app.services import supabase_service as supabase_module
+from app.services.slot_change_service import SlotChangeLog
+from app.services.supabase_service import supabase_service, next_free_slot
+from app.utils.slot_bitmap import DayBitmap
+from app.utils.ttl_cache import TTLCache
+
+DOCTOR = {'id': 'd1', 'available_from': '09:00:00', 'available_to': '12:00:00', 'slot_duration_minutes': 30}
+# 2024-01-01 is a Monday (day_of_week 0)
+WEEKLY = [{'doctor_id': 'd1', 'day_of_week': 0, 'start_time': None, 'end_time': None}]
+
+
+def _monday(appts=()):
+    return DayBitmap.from_rows('2024-01-01', DOCTOR, [], WEEKLY, list(appts))
+
+
+def test_bitmap_marks_booked_slots():
+    bitmap = _monday([{'appointment_date': '2024-01-01T09:30:00'}, {'appointment_date': '2024-01-01T09:45:00'}])
+    assert bitmap.count == 6
+    # 09:45 is not a slot start, so only 09:30 is cleared
+    assert bitmap.free == 0b111101
+    assert bitmap.free_count() == 5
+    assert bitmap.is_free('2024-01-01T09:00:00')
+    assert not bitmap.is_free('2024-01-01T09:30:00')
+    assert not bitmap.is_free('2024-01-01T12:00:00')
+    assert not bitmap.is_free('2024-01-02T09:00:00')
+    assert bitmap.free_starts('%H:%M') == ['09:00', '10:00', '10:30', '11:00', '11:30']
+
+
+def test_book_returns_a_new_bitmap():
+    bitmap = _monday()
+    booked = bitmap.book('2024-01-01T10:00:00')
+    assert bitmap.is_free('2024-01-01T10:00:00')
+    assert not booked.is_free('2024-01-01T10:00:00')
+    assert bitmap.book('2024-01-01T10:10:00') is bitmap
+
+
+def test_next_free_skips_earlier_and_booked_slots():
+    bitmap = _monday([{'appointment_date': '2024-01-01T10:30:00'}])
+    assert bitmap.next_free() == '2024-01-01T09:00:00'
+    assert bitmap.next_free('2024-01-01T10:01:00') == '2024-01-01T11:00:00'
+    assert bitmap.next_free('2024-01-01T10:00:00') == '2024-01-01T10:00:00'
+    assert bitmap.next_free('2024-01-01T11:31:00') is None
+    assert DayBitmap('2024-01-02').next_free() is None
+
+    tuesday = DayBitmap.from_rows('2024-01-02', DOCTOR, [], [{'doctor_id': 'd1', 'day_of_week': 1}], [])
+    bitmaps = {('d1', '2024-01-01'): bitmap, ('d1', '2024-01-02'): tuesday}
+    assert next_free_slot(bitmaps, 'd1', ['2024-01-01', '2024-01-02'], '2024-01-01T11:45:00') == '2024-01-02T09:00:00'
+
+
+def test_index_loads_missing_doctors_once_and_tracks_bookings(fake_db, monkeypatch):
+    loads = []
+
+    def fake_rows(doctor_ids, days):
+        loads.append((list(doctor_ids), list(days)))
+        return [DOCTOR], [], WEEKLY, [{'doctor_id': 'd1', 'appointment_date': '2024-01-01T09:00:00'}]
+
+    fake = fake_db()
+    monkeypatch.setattr(supabase_service, '_slot_index', TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(supabase_service, '_schedule_rows', fake_rows)
+
+    calendar = supabase_service.get_availability_calendar(['d1', 'missing'], '2024-01-01', '2024-01-02')
+    assert calendar == {'d1': {'2024-01-01': ['09:30', '10:00', '10:30', '11:00', '11:30']}}
+    assert loads == [(['d1', 'missing'], ['2024-01-01', '2024-01-02'])]
+
+    # cached doctor-days are served from the index; unknown doctors are looked up again
+    supabase_service.get_availability_calendar(['d1'], '2024-01-01', '2024-01-02')
+    assert len(loads) == 1
+
+    supabase_service.create_appointment({'doctor_id': 'd1', 'appointment_date': '2024-01-01T09:30:00'})
+    assert fake.tables['appointments']
+    assert supabase_service.find_next_free_slot('d1', '2024-01-01', days=2) == '2024-01-01T10:00:00'
+    assert len(loads) == 1
+
+    supabase_service.invalidate_slot_index()
+    supabase_service.find_next_free_slot('d1', '2024-01-01T11:00:00', days=1)
+    assert loads[-1] == (['d1'], ['2024-01-01'])
+
+
+def _fresh_index(monkeypatch, tmp_path, fake_rows):
+    log = SlotChangeLog(str(tmp_path / 'slot_changes.sqlite3'), sync_interval=0)
+    monkeypatch.setattr(supabase_module, 'slot_changes', log)
+    monkeypatch.setattr(supabase_service, '_slot_index', TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(supabase_service, '_schedule_rows', fake_rows)
+    return log, SlotChangeLog(str(tmp_path / 'slot_changes.sqlite3'), origin='other-worker')
+
+
+def test_bookings_in_another_worker_reach_this_index(monkeypatch, tmp_path):
+    appts = []
+    loads = []
+
+    def fake_rows(doctor_ids, days):
+        loads.append(list(doctor_ids))
+        return [DOCTOR], [], WEEKLY, list(appts)
+
+    _, other_worker = _fresh_index(monkeypatch, tmp_path, fake_rows)
+    assert supabase_service.find_next_free_slot('d1', '2024-01-01', days=1) == '2024-01-01T09:00:00'
+    supabase_service.find_next_free_slot('d1', '2024-01-01', days=1)
+    assert len(loads) == 1
+
+    appts.append({'doctor_id': 'd1', 'appointment_date': '2024-01-01T09:00:00'})
+    other_worker.record('d1')
+    assert supabase_service.find_next_free_slot('d1', '2024-01-01', days=1) == '2024-01-01T09:30:00'
+    assert len(loads) == 2
+
+    # changes to other doctors leave d1 cached
+    other_worker.record('d2')
+    supabase_service.find_next_free_slot('d1', '2024-01-01', days=1)
+    assert len(loads) == 2
+
+
+def test_load_overlapping_a_booking_is_not_cached(monkeypatch, tmp_path):
+    loads = []
+
+    def fake_rows(doctor_ids, days):
+        loads.append(list(doctor_ids))
+        if len(loads) == 1:
+            # booked elsewhere after these rows were read
+            other_worker.record('d1')
+        return [DOCTOR], [], WEEKLY, []
+
+    _, other_worker = _fresh_index(monkeypatch, tmp_path, fake_rows)
+    supabase_service.find_next_free_slot('d1', '2024-01-01', days=1)
+    supabase_service.find_next_free_slot('d1', '2024-01-01', days=1)
+    assert len(loads) == 2
+
+
+def test_deleting_doctors_invalidates_every_worker(fake_db, monkeypatch, tmp_path):
+    log, other_worker = _fresh_index(monkeypatch, tmp_path, lambda doctor_ids, days: ([DOCTOR], [], WEEKLY, []))
+    fake_db(rpcs={'delete_users_cascade': 1})
+    monkeypatch.setattr(supabase_service, 'role_counts_cached', lambda: False)
+
+    seq = log.last_seq()
+    supabase_service.delete_users_cascade(['doctor-user'])
+    assert other_worker.changed_since(seq) == {SlotChangeLog.ALL}
@@ -0,0 +1,36 @@
+import pytest
+
+from app.services.supabase_service import supabase_service, date_range, group_slots
+
+
+def test_range_is_one_rpc(fake_db):
+    fake = fake_db(rpcs={'available_slots': [
+        {'slot_date': '2024-01-01', 'slot_start': '2024-01-01T09:00:00'},
+        {'slot_date': '2024-01-03', 'slot_start': '2024-01-03T10:30:00'},
+    ]})
+
+    assert supabase_service.get_available_slots_range('doc-1', '2024-01-01', '2024-01-03') == {
+        '2024-01-01': ['2024-01-01T09:00:00'], '2024-01-02': [], '2024-01-03': ['2024-01-03T10:30:00'],
+    }
+    assert supabase_service.get_available_slots('doc-1', '2024-01-01') == ['2024-01-01T09:00:00']
+    first = fake.queries('rpc')[0]
+    assert (first.table, first.payload) == ('available_slots', {'p_doctor_id': 'doc-1', 'p_from': '2024-01-01', 'p_to': '2024-01-03'})
+
+
+def test_missing_function_computes_in_python(fake_db, monkeypatch):
+    fake_db()
+    monkeypatch.setattr(supabase_service, '_get_available_slots_legacy', lambda doctor_id, day: [f'{day}T09:00:00'])
+
+    assert supabase_service.get_available_slots_range('doc-1', '2024-01-01', '2024-01-02') == {
+        '2024-01-01': ['2024-01-01T09:00:00'], '2024-01-02': ['2024-01-02T09:00:00'],
+    }
+    assert 'available_slots' in supabase_service._unsupported_rpcs
+
+
+def test_date_range_and_grouping():
+    assert date_range('2024-02-28', '2024-03-01') == ['2024-02-28', '2024-02-29', '2024-03-01']
+    with pytest.raises(ValueError):
+        date_range('2024-01-02', '2024-01-01')
+    with pytest.raises(ValueError):
+        date_range('2024-01-01', '2024-12-31')
+    assert group_slots(['2024-01-01'], []) == {'2024-01-01': []}
@@ -0,0 +1,117 @@
+import uuid
+
+import pytest
+
+from app import create_app
+from app.services.auth_service import auth_service
+from app.services.revocation_service import revocation_list
+from app.services.supabase_service import supabase_service
+
+
+def _user(**overrides):
+    user = {'id': f'user-{uuid.uuid4().hex}', 'role': 'patient', 'is_active': True, 'session_nonce': 0,
+            'email': 'pat@example.com', 'first_name': 'Pat', 'last_name': 'Ient'}
+    user.update(overrides)
+    return user
+
+
+def _no_db(user_id, projection='all'):
+    raise AssertionError('access tokens must not hit the database')
+
+
+def test_access_token_authorizes_without_database(monkeypatch):
+    monkeypatch.setattr(supabase_service, 'find_user_by_id', _no_db)
+    client = create_app().test_client()
+    user = _user()
+    headers = {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 200
+
+    revocation_list.revoke_user(user['id'])
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 401
+
+    # a token issued after the revocation is accepted again
+    headers = {'Authorization': f"Bearer {auth_service.generate_access_token(user)}"}
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 200
+
+
+def test_refresh_token_is_not_an_access_token(monkeypatch):
+    monkeypatch.setattr(supabase_service, 'find_user_by_id', _no_db)
+    client = create_app().test_client()
+    headers = {'Authorization': f"Bearer {auth_service.generate_refresh_token(_user())}"}
+    assert client.get('/api/patient/dashboard', headers=headers).status_code == 401
+
+
+def test_refresh_checks_session_state(monkeypatch):
+    user = _user()
+    monkeypatch.setattr(supabase_service, 'find_user_by_id', lambda user_id, projection='all': dict(user))
+    client = create_app().test_client()
+    refresh_token = auth_service.generate_refresh_token(user)
+
+    res = client.post('/api/auth/refresh', json={'refreshToken': refresh_token})
+    assert res.status_code == 200
+    assert auth_service.verify_token(res.get_json()['data']['token'])['typ'] == 'access'
+
+    user['session_nonce'] = 1
+    assert client.post('/api/auth/refresh', json={'refreshToken': refresh_token}).status_code == 401
+
+    user['session_nonce'] = 0
+    auth_service.logout(refresh_token)
+    assert client.post('/api/auth/refresh', json={'refreshToken': refresh_token}).status_code == 401
+
+
+def test_refresh_rotates_the_refresh_token(monkeypatch):
+    user = _user()
+    monkeypatch.setattr(supabase_service, 'find_user_by_id', lambda user_id, projection='all': dict(user))
+    client = create_app().test_client()
+    first = auth_service.generate_refresh_token(user)
+
+    res = client.post('/api/auth/refresh', json={'refreshToken': first})
+    assert res.status_code == 200
+    second = res.get_json()['data']['refreshToken']
+    assert second != first and auth_service.verify_token(second)['typ'] == 'refresh'
+
+    # the used token is revoked; its replacement works once
+    assert client.post('/api/auth/refresh', json={'refreshToken': first}).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refreshToken': second}).status_code == 200
+    assert client.post('/api/auth/refresh', json={'refreshToken': second}).status_code == 401
+
+
+def test_runtime_files_are_private(tmp_path, monkeypatch):
+    import os
+    from app.utils.sqlite_store import SQLiteStore, private_directory
+
+    directory = tmp_path / 'runtime'
+    directory.mkdir(mode=0o755)
+    store = SQLiteStore(str(directory / 'state.sqlite3'), 'CREATE TABLE IF NOT EXISTS t (x INTEGER);')
+    store.execute('INSERT INTO t VALUES (1)')
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert (directory / 'state.sqlite3').stat().st_mode & 0o777 == 0o600
+    store.close()
+
+    # a directory owned by someone else is refused
+    monkeypatch.setattr(os, 'getuid', lambda: directory.stat().st_uid + 1)
+    with pytest.raises(RuntimeError, match='owned by another user'):
+        private_directory(str(directory))
+
+
+def test_verify_token_checks_signature_once(monkeypatch):
+    import app.services.auth_service as auth_module
+
+    token = auth_service.generate_access_token(_user())
+    decode = auth_module.jwt.decode
+    calls = []
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_module.jwt, 'decode', counting_decode)
+    first = auth_service.verify_token(token)
+    first['role'] = 'admin'  # callers get a copy, not the cached claims
+    assert auth_service.verify_token(token)['role'] == 'patient'
+    assert len(calls) == 1
+
+    with pytest.raises(Exception, match='Invalid token'):
+        auth_service.verify_token(token[:-2] + 'xx')
+    assert len(calls) == 2
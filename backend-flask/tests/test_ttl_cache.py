@@ -0,0 +1,102 @@
+import threading
+import time
+from app.utils.ttl_cache import TTLCache
+
+
+def test_entries_expire_and_evict_lru():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    cache.set('short', 'x', ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get('short') is None
+
+
+def test_get_or_load_caches_and_invalidates():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return {'role': 'patient'}
+
+    assert cache.get_or_load('u1', load) == {'role': 'patient'}
+    assert cache.get_or_load('u1', load) == {'role': 'patient'}
+    assert len(calls) == 1
+
+    cache.invalidate('u1')
+    cache.get_or_load('u1', load)
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['loads'] == 2 and stats['invalidations'] == 1
+    # None results are not cached
+    assert cache.get_or_load('missing', lambda: None) is None
+    assert 'missing' not in cache._data
+
+
+def test_adjust_updates_live_entries_only():
+    cache = TTLCache(ttl=60)
+    assert cache.adjust('n', lambda v: v + 1) is False
+    cache.set('n', 1, ttl=0.05)
+    assert cache.adjust('n', lambda v: v + 1) is True
+    assert cache.get('n') == 2
+    time.sleep(0.06)  # adjusting keeps the original expiry
+    assert cache.adjust('n', lambda v: v + 1) is False
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'value'
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader))) for _ in range(8)]
+    results = []
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ['value'] * 8
+    assert len(calls) == 1
+    assert cache.stats()['coalesced'] == 7
+
+
+def test_load_overlapping_invalidate_is_not_cached():
+    cache = TTLCache(maxsize=10, ttl=60)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow_loader():
+        started.set()
+        release.wait(5)
+        return {'session_nonce': 1}
+
+    loader = threading.Thread(target=lambda: results.append(cache.get_or_load('user', slow_loader)))
+    loader.start()
+    started.wait(5)
+    # logout-all bumps the nonce in the database while the old row is being read
+    cache.invalidate('user')
+    release.set()
+    loader.join()
+
+    assert results == [{'session_nonce': 1}]
+    assert cache.get('user') is None
+    assert cache.get_or_load('user', lambda: {'session_nonce': 2}) == {'session_nonce': 2}
+    assert cache.get('user') == {'session_nonce': 2}
+
+
+def test_contains_does_not_touch_stats():
+    cache = TTLCache(maxsize=4, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=0)
+    assert cache.contains('a') and not cache.contains('b') and not cache.contains('c')
+    assert cache.stats()['hits'] == 0 and cache.stats()['misses'] == 0
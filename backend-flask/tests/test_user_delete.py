@@ -0,0 +1,42 @@
+import pytest
+
+from app.services.revocation_service import revocation_list
+from app.services.supabase_service import supabase_service
+
+TABLES = {
+    'users': [{'id': 'u3', 'role': 'doctor'}, {'id': 'u4', 'role': 'patient'}],
+    'doctors': [{'id': 'doctors-1', 'user_id': 'u3'}],
+}
+
+
+def test_bulk_delete_is_one_rpc(fake_db):
+    fake = fake_db(rpcs={'delete_users_cascade': lambda params: len(params['p_user_ids'])})
+
+    assert supabase_service.delete_users_cascade(['u1', 'u2', 'u1', '']) == 2
+    assert [(q.op, q.table, q.payload) for q in fake.calls] == [('rpc', 'delete_users_cascade', {'p_user_ids': ['u1', 'u2']})]
+    assert revocation_list.is_user_revoked('u2', 0)
+
+
+def test_missing_function_falls_back_to_table_deletes(fake_db):
+    fake = fake_db(TABLES)
+
+    assert supabase_service.delete_user_cascade('u3') is True
+    assert [(q.table, q.filters) for q in fake.queries('delete')] == [
+        ('doctor_availability', [('doctor_id', 'eq', 'doctors-1')]),
+        ('doctor_available_days', [('doctor_id', 'eq', 'doctors-1')]),
+        ('doctors', [('id', 'eq', 'doctors-1')]),
+        ('users', [('id', 'eq', 'u3')]),
+    ]
+    assert fake.tables['users'] == [{'id': 'u4', 'role': 'patient'}]
+
+    # the missing function is not called again
+    fake.calls.clear()
+    supabase_service.delete_user_cascade('u4')
+    assert not fake.queries('rpc')
+
+
+def test_other_rpc_errors_are_not_hidden(fake_db):
+    fake = fake_db(TABLES, rpcs={'delete_users_cascade': Exception('permission denied for function delete_users_cascade')})
+    with pytest.raises(Exception, match='permission denied'):
+        supabase_service.delete_users_cascade(['u5'])
+    assert not fake.queries('delete')
@@ -0,0 +1,63 @@
+import json
+import re
+
+import httpx
+import pytest
+
+from app.services.supabase_service import supabase_service
+from app.utils.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+
+# two users share a created_at so the id tie-break matters
+USERS = [
+    {'id': f'u{i}', 'role': 'doctor' if i % 2 else 'patient', 'created_at': f'2024-01-0{min(i, 5)}T00:00:00+00:00'}
+    for i in range(1, 7)
+]
+
+
+def _handler(seen):
+    def handler(request):
+        params = request.url.params
+        seen.append(params)
+        rows = sorted(USERS, key=lambda u: (u['created_at'], u['id']), reverse=True)
+        if params.get('role'):
+            rows = [u for u in rows if u['role'] == params['role'].split('.', 1)[1]]
+        if params.get('or'):
+            created_at = re.search(r'created_at\.lt\."([^"]+)"', params['or']).group(1)
+            user_id = re.search(r'id\.lt\."([^"]+)"', params['or']).group(1)
+            rows = [u for u in rows if u['created_at'] < created_at or (u['created_at'] == created_at and u['id'] < user_id)]
+        rows = rows[:int(params['limit'])]
+        return httpx.Response(200, content=json.dumps(rows), headers={'content-type': 'application/json'})
+    return handler
+
+
+def test_cursor_walks_every_user_once(postgrest_http):
+    seen = []
+    postgrest_http(_handler(seen))
+    ids, cursor = [], None
+    while True:
+        rows, cursor = supabase_service.list_users_page(limit=4, cursor=cursor)
+        ids += [r['id'] for r in rows]
+        if cursor is None:
+            break
+    assert ids == ['u6', 'u5', 'u4', 'u3', 'u2', 'u1']
+    assert all(p['order'] == 'created_at.desc,id.desc' and p['limit'] == '5' for p in seen)
+
+
+def test_role_filter_and_cursor_validation(postgrest_http):
+    postgrest_http(_handler([]))
+    rows, cursor = supabase_service.list_users_page(role='doctor', limit=2)
+    assert [r['id'] for r in rows] == ['u5', 'u3']
+    rows, cursor = supabase_service.list_users_page(role='doctor', limit=2, cursor=cursor)
+    assert [r['id'] for r in rows] == ['u1'] and cursor is None
+
+    with pytest.raises(InvalidCursor):
+        supabase_service.list_users_page(cursor='not-a-cursor')
+
+
+def test_cursor_and_page_size_helpers():
+    assert decode_cursor(encode_cursor('2024-01-01T00:00:00+00:00', 'u1'), 2) == ['2024-01-01T00:00:00+00:00', 'u1']
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor('only-one'), 2)
+    assert page_size(None) == 50
+    assert page_size('1000') == 200
+    assert page_size('0') == 1
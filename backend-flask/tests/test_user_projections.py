@@ -0,0 +1,63 @@
+from app.services.supabase_service import supabase_service, USER_PROJECTIONS
+
+ROW = {'id': 'u1', 'email': 'a@example.com', 'role': 'patient', 'is_active': True, 'session_nonce': 0,
+       'first_name': 'A', 'last_name': 'B', 'phone': None, 'password_hash': 'hash', 'verification_code': '123456'}
+
+
+def _missing_columns(*missing):
+    def fail(query):
+        for name in query.columns.split(','):
+            if name in missing:
+                return Exception(f'column users.{name} does not exist')
+    return fail
+
+
+def _selects(fake):
+    return [q.columns for q in fake.queries('select', 'users')]
+
+
+def test_projection_selects_only_named_columns(fake_db):
+    fake = fake_db({'users': [ROW]})
+    user = supabase_service.find_user_by_id('u1', projection='auth')
+    assert _selects(fake) == [','.join(USER_PROJECTIONS['auth'])]
+    assert 'password_hash' not in user
+
+
+def test_projection_falls_back_when_column_missing(fake_db, monkeypatch):
+    fake = fake_db({'users': [ROW]}, fail=_missing_columns('phone_verified'))
+    monkeypatch.setattr(supabase_service, '_unsupported_projections', set())
+
+    user = supabase_service.find_user_by_id('u1', projection='profile')
+    assert _selects(fake)[-1] == '*'
+    assert user['email'] == 'a@example.com'
+    assert 'password_hash' not in user and 'verification_code' not in user
+
+    # the failing projection is not retried
+    supabase_service.find_user_by_id('u1', projection='profile')
+    assert _selects(fake)[-1] == '*' and len(_selects(fake)) == 3
+
+
+def test_identifier_lookup_is_one_query_and_prefers_email(fake_db):
+    fake = fake_db({'users': [{'id': 'by-phone', 'email': 'x@example.com', 'phone': 'a@example.com'},
+                              {'id': 'by-email', 'email': 'a@example.com', 'phone': '555'}]})
+
+    def or_filters():
+        return [q.or_expr for q in fake.queries('select', 'users')]
+
+    assert supabase_service.find_user_by_identifier('a@example.com')['id'] == 'by-email'
+    assert or_filters() == ['email.eq."a@example.com",phone.eq."a@example.com"']
+
+    fake.calls.clear()
+    supabase_service.find_user_by_identifier('+1 555-123-4567')
+    assert or_filters() == ['email.eq."+1 555-123-4567",phone.eq."+1 555-123-4567",phone.eq."+15551234567"']
+
+    assert supabase_service.find_existing_identifiers(email='a@example.com', phone='555') == {'email', 'phone'}
+    assert len(or_filters()) == 2
+
+
+def test_identifier_lookup_prefers_the_phone_as_given(fake_db):
+    fake_db({'users': [{'id': 'a-normalized', 'email': None, 'phone': '+15551234567'},
+                       {'id': 'b-raw', 'email': None, 'phone': '+1 555-123-4567'}]})
+
+    assert supabase_service.find_user_by_identifier('+1 555-123-4567')['id'] == 'b-raw'
+    assert supabase_service.find_user_by_identifier('+15551234567')['id'] == 'a-normalized'
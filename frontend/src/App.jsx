@@ -16,7 +16,7 @@ import Reminders from './components/Reminders'
 import AdminUsers from './components/AdminUsers'
 
 function Nav() {
-  const { token, setToken } = useContext(AuthContext)
+  const { token, logout } = useContext(AuthContext)
   const navigate = useNavigate()
   return (
     <div className="nav">
@@ -32,7 +32,7 @@ function Nav() {
       {token && <Link to="/reminders">Reminders</Link>}
       {token && <Link to="/admin/users">Admin</Link>}
       {token && (
-        <button className="small" onClick={() => { setToken(null); navigate('/') }}>Logout</button>
+        <button className="small" onClick={async () => { await logout(); navigate('/') }}>Logout</button>
       )}
     </div>
   )
@@ -1,17 +1,110 @@
-import React, { createContext, useState, useEffect } from 'react'
+import React, { createContext, useState, useEffect, useRef, useCallback } from 'react'
+import { refreshSession, logout as revokeSession, setAccessTokenRenewer } from './api'
 const AuthContext = createContext()
 
+// Renew the short-lived access token this long before it expires
+const REFRESH_MARGIN_MS = 60 * 1000
+// Serializes refreshes across the tabs of this origin (Web Locks API)
+const REFRESH_LOCK = 'healhub-token-refresh'
+
+function tokenExpiry(token) {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')))
+    return payload.exp ? payload.exp * 1000 : null
+  } catch (e) {
+    return null
+  }
+}
+
+function acrossTabs(fn) {
+  if (typeof navigator !== 'undefined' && navigator.locks) return navigator.locks.request(REFRESH_LOCK, fn)
+  return fn()
+}
+
 export function AuthProvider({ children }) {
   const [token, setToken] = useState(() => localStorage.getItem('access_token'))
+  const [refreshToken, setRefreshToken] = useState(() => localStorage.getItem('refresh_token'))
   const [user, setUser] = useState(null)
+  const renewing = useRef(null)
 
   useEffect(() => {
     if (token) localStorage.setItem('access_token', token)
-    else localStorage.removeItem('access_token')
+    else {
+      localStorage.removeItem('access_token')
+      setRefreshToken(null)
+    }
   }, [token])
 
+  useEffect(() => {
+    if (refreshToken) localStorage.setItem('refresh_token', refreshToken)
+    else localStorage.removeItem('refresh_token')
+  }, [refreshToken])
+
+  // Tabs share the tokens through localStorage: follow refreshes and logouts made in other tabs
+  useEffect(() => {
+    function onStorage(e) {
+      if (e.storageArea !== localStorage) return
+      if (e.key === 'refresh_token') setRefreshToken(e.newValue)
+      else if (e.key === 'access_token' || e.key === null) setToken(localStorage.getItem('access_token'))
+    }
+    window.addEventListener('storage', onStorage)
+    return () => window.removeEventListener('storage', onStorage)
+  }, [])
+
+  // Resolves to an access token newer than `stale`, or null if the session is over.
+  // Refresh tokens are single-use, so one refresh runs at a time in this tab
+  // (concurrent 401s share it) and across tabs (under a lock, re-reading what
+  // another tab may already have stored).
+  const renew = useCallback((stale) => {
+    if (!renewing.current) {
+      renewing.current = acrossTabs(async () => {
+        const current = localStorage.getItem('access_token')
+        if (current && current !== stale) return current
+        const stored = localStorage.getItem('refresh_token')
+        if (!stored) return null
+        const res = await refreshSession(stored)
+        if (res && res.data && res.data.token) {
+          // written here as well as by the effects so a tab waiting on the lock sees them
+          if (res.data.refreshToken) {
+            localStorage.setItem('refresh_token', res.data.refreshToken)
+            setRefreshToken(res.data.refreshToken)
+          }
+          localStorage.setItem('access_token', res.data.token)
+          setToken(res.data.token)
+          return res.data.token
+        }
+        if (res && res.statusCode === 401) setToken(null)
+        return null
+      }).finally(() => { renewing.current = null })
+    }
+    return renewing.current
+  }, [])
+
+  useEffect(() => {
+    setAccessTokenRenewer(renew)
+    return () => setAccessTokenRenewer(null)
+  }, [renew])
+
+  useEffect(() => {
+    if (!token || !refreshToken) return
+    const expiry = tokenExpiry(token)
+    if (!expiry) return
+    const timer = setTimeout(() => renew(token), Math.max(0, expiry - Date.now() - REFRESH_MARGIN_MS))
+    return () => clearTimeout(timer)
+  }, [token, refreshToken, renew])
+
+  // Revokes the refresh token on the server before dropping the session locally
+  const logout = useCallback(async () => {
+    let access = token
+    const expiry = access && tokenExpiry(access)
+    if (access && expiry && expiry - Date.now() < REFRESH_MARGIN_MS) access = await renew(access)
+    const stored = localStorage.getItem('refresh_token')
+    if (access && stored) await revokeSession(access, stored)
+    setToken(null)
+  }, [token, renew])
+
   return (
-    <AuthContext.Provider value={{ token, setToken, user, setUser }}>
+    <AuthContext.Provider value={{ token, setToken, refreshToken, setRefreshToken, user, setUser, logout }}>
       {children}
     </AuthContext.Provider>
   )
@@ -24,9 +24,23 @@ async function handleResponse(res) {
   return json || { status: 'success' }
 }
 
-async function safeFetch(url, opts) {
+// Set by AuthProvider: given the access token a request was rejected with, resolves
+// to a fresh one (refreshing the session if needed) or null
+let renewAccessToken = null
+
+export function setAccessTokenRenewer(fn) {
+  renewAccessToken = fn
+}
+
+async function safeFetch(url, opts = {}, { renew = true } = {}) {
   try {
-    const res = await fetch(url, opts)
+    let res = await fetch(url, opts)
+    const auth = opts.headers && opts.headers['Authorization']
+    if (res.status === 401 && auth && renew && renewAccessToken) {
+      // the access token expired or was rotated: renew it once and replay the request
+      const fresh = await renewAccessToken(auth.slice('Bearer '.length))
+      if (fresh) res = await fetch(url, { ...opts, headers: { ...opts.headers, Authorization: `Bearer ${fresh}` } })
+    }
     return await handleResponse(res)
   } catch (err) {
     return { status: 'error', message: err.message || 'Network error' }
@@ -41,6 +55,16 @@ export async function login(payload) {
   return safeFetch(`${BASE}/api/auth/login`, { method: 'POST', headers: jsonHeaders(), body: JSON.stringify(payload) })
 }
 
+export async function refreshSession(refreshToken) {
+  return safeFetch(`${BASE}/api/auth/refresh`, { method: 'POST', headers: jsonHeaders(), body: JSON.stringify({ refreshToken }) })
+}
+
+// Revokes this session's refresh token. Not retried on 401: renewing would rotate the
+// refresh token in the body; callers pass a current access token instead
+export async function logout(token, refreshToken) {
+  return safeFetch(`${BASE}/api/auth/logout`, { method: 'POST', headers: jsonHeaders(token), body: JSON.stringify({ refreshToken }) }, { renew: false })
+}
+
 export async function verifyEmail(payload) {
   return safeFetch(`${BASE}/api/auth/verify-email`, { method: 'POST', headers: jsonHeaders(), body: JSON.stringify(payload) })
 }
@@ -64,67 +88,42 @@ export async function getProfile(token) {
 export async function uploadProfilePicture(token, file) {
   const fd = new FormData();
   fd.append('image', file)
-  try {
-    const headers = {}
-    if (token) headers['Authorization'] = `Bearer ${token}`
-    const res = await fetch(`${BASE}/api/auth/profile-picture`, { method: 'POST', headers, body: fd })
-    return await handleResponse(res)
-  } catch (err) {
-    return { status: 'error', message: err.message || 'Network error' }
-  }
+  const headers = {}
+  if (token) headers['Authorization'] = `Bearer ${token}`
+  return safeFetch(`${BASE}/api/auth/profile-picture`, { method: 'POST', headers, body: fd })
 }
 
 export async function detectImageMultipart(token, file) {
   const fd = new FormData();
   fd.append('image', file)
-  try {
-    const headers = {}
-    if (token) headers['Authorization'] = `Bearer ${token}`
-    const res = await fetch(`${BASE}/api/patient/detect`, { method: 'POST', headers, body: fd })
-    return await handleResponse(res)
-  } catch (err) {
-    return { status: 'error', message: err.message || 'Network error' }
-  }
+  const headers = {}
+  if (token) headers['Authorization'] = `Bearer ${token}`
+  return safeFetch(`${BASE}/api/patient/detect`, { method: 'POST', headers, body: fd })
 }
 
 export async function detectImageAllMultipart(token, file) {
   const fd = new FormData();
   fd.append('image', file)
-  try {
-    const headers = {}
-    if (token) headers['Authorization'] = `Bearer ${token}`
-    const res = await fetch(`${BASE}/api/patient/detect/all`, { method: 'POST', headers, body: fd })
-    return await handleResponse(res)
-  } catch (err) {
-    return { status: 'error', message: err.message || 'Network error' }
-  }
+  const headers = {}
+  if (token) headers['Authorization'] = `Bearer ${token}`
+  return safeFetch(`${BASE}/api/patient/detect/all`, { method: 'POST', headers, body: fd })
 }
 
 export async function submitFeedbackMultipart(token, file, correctLabel) {
   const fd = new FormData();
   fd.append('image', file)
   fd.append('correct_label', correctLabel)
-  try {
-    const headers = {}
-    if (token) headers['Authorization'] = `Bearer ${token}`
-    const res = await fetch(`${BASE}/api/patient/detect/feedback`, { method: 'POST', headers, body: fd })
-    return await handleResponse(res)
-  } catch (err) {
-    return { status: 'error', message: err.message || 'Network error' }
-  }
+  const headers = {}
+  if (token) headers['Authorization'] = `Bearer ${token}`
+  return safeFetch(`${BASE}/api/patient/detect/feedback`, { method: 'POST', headers, body: fd })
 }
 
 export async function detectImageRawMultipart(token, file) {
   const fd = new FormData();
   fd.append('image', file)
-  try {
-    const headers = {}
-    if (token) headers['Authorization'] = `Bearer ${token}`
-    const res = await fetch(`${BASE}/api/patient/detect/raw`, { method: 'POST', headers, body: fd })
-    return await handleResponse(res)
-  } catch (err) {
-    return { status: 'error', message: err.message || 'Network error' }
-  }
+  const headers = {}
+  if (token) headers['Authorization'] = `Bearer ${token}`
+  return safeFetch(`${BASE}/api/patient/detect/raw`, { method: 'POST', headers, body: fd })
 }
 
 export async function detectImageBase64(token, base64) {
@@ -138,6 +137,24 @@ export async function getSlots(token, doctorId, date) {
   return safeFetch(url.toString(), { headers: jsonHeaders(token) })
 }
 
+// Free slots for several doctors over a date range: data.slots[doctorId][date] = ['09:00', ...]
+export async function getAvailabilityCalendar(token, doctorIds, from, to) {
+  const url = new URL(`${BASE}/api/appointment/calendar`)
+  url.searchParams.set('doctorIds', doctorIds.join(','))
+  url.searchParams.set('from', from)
+  if (to) url.searchParams.set('to', to)
+  return safeFetch(url.toString(), { headers: jsonHeaders(token) })
+}
+
+// Earliest free slot at or after `after` (ISO date/datetime, default now): data.slot is an ISO start or null
+export async function getNextFreeSlot(token, doctorId, after, days) {
+  const url = new URL(`${BASE}/api/appointment/next-free`)
+  url.searchParams.set('doctorId', doctorId)
+  if (after) url.searchParams.set('after', after)
+  if (days) url.searchParams.set('days', String(days))
+  return safeFetch(url.toString(), { headers: jsonHeaders(token) })
+}
+
 export async function bookAppointment(token, payload) {
   return safeFetch(`${BASE}/api/appointment/book`, { method: 'POST', headers: jsonHeaders(token), body: JSON.stringify(payload) })
 }
@@ -150,8 +167,13 @@ export async function createReminder(token, payload) {
   return safeFetch(`${BASE}/api/reminder/`, { method: 'POST', headers: jsonHeaders(token), body: JSON.stringify(payload) })
 }
 
-export async function listUsers(token) {
-  return safeFetch(`${BASE}/api/admin/users`, { headers: jsonHeaders(token) })
+export async function listUsers(token, { cursor, limit, role } = {}) {
+  const params = new URLSearchParams()
+  if (cursor) params.set('cursor', cursor)
+  if (limit) params.set('limit', limit)
+  if (role) params.set('role', role)
+  const qs = params.toString()
+  return safeFetch(`${BASE}/api/admin/users${qs ? `?${qs}` : ''}`, { headers: jsonHeaders(token) })
 }
 
 export async function createUser(token, payload) {
@@ -6,12 +6,20 @@ import { useAlert } from '../AlertContext'
 export default function AdminUsers(){
   const { token } = useContext(AuthContext)
   const [users, setUsers] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [email, setEmail] = useState('')
   const [name, setName] = useState('')
   const [role, setRole] = useState('patient')
 
   const { showAlert } = useAlert()
-  useEffect(()=>{ if(token) listUsers(token).then(r=>{ if(r && r.status === 'error') showAlert(r.message,'error'); else setUsers(r.data||[]) }) },[token])
+  async function loadPage(cursor){
+    const r = await listUsers(token, { cursor })
+    if(r && r.status === 'error') { showAlert(r.message,'error'); return }
+    setUsers(prev=> cursor ? [...prev, ...(r.data||[])] : (r.data||[]))
+    setNextCursor((r.pagination && r.pagination.nextCursor) || null)
+  }
+
+  useEffect(()=>{ if(token) loadPage(null) },[token])
 
   async function submit(e){
     e.preventDefault()
@@ -36,6 +44,7 @@ export default function AdminUsers(){
       <ul>
         {users.map(u=> <li key={u.id}>{u.id} — {u.email} — {u.role}</li>)}
       </ul>
+      {nextCursor && <button onClick={()=>loadPage(nextCursor)}>Load more</button>}
     </div>
   )
 }
@@ -8,7 +8,7 @@ export default function Login(){
   const [email, setEmail] = useState('')
   const [password, setPassword] = useState('')
   const [error, setError] = useState(null)
-  const { setToken } = useContext(AuthContext)
+  const { setToken, setRefreshToken } = useContext(AuthContext)
   const navigate = useNavigate()
 
   const { showAlert } = useAlert()
@@ -19,6 +19,7 @@ export default function Login(){
     const res = await login({ identifier: email, password })
     if (res && res.data && res.data.token) {
       setToken(res.data.token)
+      setRefreshToken(res.data.refreshToken || null)
       showAlert('Logged in', 'success')
       navigate('/profile')
     } else {